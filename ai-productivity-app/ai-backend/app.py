@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langchain_groq import ChatGroq
@@ -6,12 +6,36 @@ import uuid
 import json
 import os
 import logging
-from typing import Dict, List
+import time
+import atexit
+import tempfile
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
 from datetime import datetime
-import requests
+from werkzeug.wsgi import wrap_file
 from services.pdf_generator import PDFGenerator
 from services.excel_generator import ExcelGenerator
+from services.response_cache import ResponseCache
+from services.similarity_cache import SimilarityCache
+from services.conversation_memory import ConversationMemory
+from services.channel_index import ChannelIndex
+from services.role_catalogue import RoleCatalogue
+from services.plan_store import create_plan_store
+from services.export_cache import ExportCache, FILE_PREFIXES, FILE_EXTENSIONS, MIME_TYPES
+from services.export_queue import ExportQueue, ExportQueueFull
+from services.outbox import NotificationOutbox
+from services.database_service import DatabaseService
+from services.plan_lookup import PlanLookup
+from services.llm_coalescer import CoalescingLLM
+from services.llm_hedging import HedgedLLM, current_route as llm_route
+from services.llm_scheduler import LLMScheduler, SchedulerBusy
+from services.plan_stream_parser import IncrementalCardParser
+from services.plan_schema import (ActionPlanResponse, RoleSuggestions, StructuredOutputError, PLAN_TOOL, ROLE_TOOL,
+                                  chunk_text, complete_structured, failed_generation, invoke_text, response_text)
+from services.plan_sections import (SECTION_TOOLS, SectionNotFound, action_plan_of, available_sections, get_section,
+                                    merge_section, plan_outline, section_json, section_schema, stored_version)
+from services.sse import sse_event, wants_stream, SSE_HEADERS
+from services.metrics import MetricsRegistry, CONTENT_TYPE as METRICS_CONTENT_TYPE, SIZE_BUCKETS
 
 load_dotenv()
 
@@ -22,14 +46,111 @@ CORS(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Metrics, exposed in Prometheus text format at /metrics
+metrics = MetricsRegistry(namespace="ai_backend")
+request_seconds = metrics.histogram("http_request_duration_seconds", "HTTP request latency by route.",
+                                    ("method", "route", "status"))
+plan_stage_seconds = metrics.histogram("action_plan_stage_duration_seconds",
+                                       "Action-plan generation latency by stage.", ("stage",))
+export_stage_seconds = metrics.histogram("export_stage_duration_seconds",
+                                         "Export latency by stage (cache lookup, render to file or memory).",
+                                         ("format", "stage"))
+export_size_bytes = metrics.histogram("export_size_bytes", "Rendered export size.", ("format",), buckets=SIZE_BUCKETS)
+export_job_seconds = metrics.histogram("export_job_duration_seconds",
+                                       "Background export jobs, submit to finish.", ("format", "status"))
+llm_queue_wait_seconds = metrics.histogram("llm_queue_wait_seconds",
+                                           "Time LLM calls waited for admission.", ("priority",))
+llm_hedges = metrics.counter("llm_hedges_total",
+                             "Hedged LLM calls by route and outcome (primary_won, backup_won, over_budget, no_capacity).",
+                             ("route", "outcome"))
+node_notify_delivery_seconds = metrics.histogram("node_notify_delivery_seconds",
+                                                 "Enqueue-to-delivery latency of Node.js notifications.")
+
 # Initialize services
-conversation_history: Dict[str, List] = {}
 pdf_generator = PDFGenerator()
 excel_generator = ExcelGenerator()
-stored_plans: Dict[str, Dict] = {}  # In-memory storage for generated plans
+plan_store = create_plan_store()  # Memory (per process) or SQLite (shared by workers)
+export_cache = ExportCache()  # Content-addressed artifacts in exports/
+export_queue = ExportQueue(  # Process pool for background PDF/Excel rendering
+    on_complete=lambda fmt, status, seconds: export_job_seconds.observe(seconds, format=fmt, status=status))
+atexit.register(export_queue.shutdown)
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 100))
+BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', 8))
+EXPORT_SPOOL_MAX_BYTES = int(os.getenv('EXPORT_SPOOL_MAX_BYTES', 4 * 1024 * 1024))
+# Plans and role suggestions come back as forced tool calls validated against plan_schema models
+STRUCTURED_OUTPUT = os.getenv('LLM_STRUCTURED_OUTPUT', 'True').lower() == 'true'
+STRUCTURED_OUTPUT_RETRIES = int(os.getenv('LLM_STRUCTURED_OUTPUT_RETRIES', 1))
+PLAN_CALL_KWARGS = PLAN_TOOL if STRUCTURED_OUTPUT else {}
+ROLE_CALL_KWARGS = ROLE_TOOL if STRUCTURED_OUTPUT else {}
+PLAN_MAX_REVISIONS = int(os.getenv('PLAN_MAX_REVISIONS', 10))  # Replaced sections kept per plan for undo
+db_service = DatabaseService()  # Buffered MongoDB writes for plans and AI interactions
+atexit.register(db_service.close)
+plan_lookup = PlanLookup(plan_store, db_service)  # Plan store first, then MongoDB
+notification_outbox = NotificationOutbox(  # Durable, background delivery to the Node.js server
+    on_delivery=lambda seconds: node_notify_delivery_seconds.observe(seconds))
+notification_outbox.start()
+atexit.register(notification_outbox.stop)
+plan_cache = ResponseCache()  # Cache of raw LLM responses for generate-action-plan
+chat_cache = SimilarityCache()  # Answers to near-duplicate chat questions (opt-in)
 
 # Initialize LLM
-llm = ChatGroq(model="llama-3.3-70b-versatile", api_key=os.environ.get("GROQ_API_KEY"))
+LLM_MODEL = "llama-3.3-70b-versatile"
+LLM_HEDGE_MODEL = os.getenv('LLM_HEDGE_MODEL', '')  # Backup model for hedged calls; empty hedges to LLM_MODEL
+chat_model = ChatGroq(model=LLM_MODEL, api_key=os.environ.get("GROQ_API_KEY"))
+llm_scheduler = LLMScheduler(  # Concurrency cap, rate limit and priority queuing for every LLM call
+    on_admit=lambda priority, seconds: llm_queue_wait_seconds.observe(seconds, priority=priority))
+hedged_llm = HedgedLLM(  # Calls past the route's latency percentile race a backup request, if a slot is free
+    chat_model, ChatGroq(model=LLM_HEDGE_MODEL, api_key=os.environ.get("GROQ_API_KEY")) if LLM_HEDGE_MODEL else None,
+    scheduler=llm_scheduler, on_hedge=lambda route, outcome: llm_hedges.inc(route=route, outcome=outcome))
+llm = CoalescingLLM(hedged_llm)  # Concurrent identical calls share one upstream request
+
+CONVERSATION_SUMMARY_PROMPT = """You maintain a running summary of an event-planning chat.
+Merge the new turns into the summary so far. Keep decisions, dates, numbers, budgets, names and open questions;
+drop greetings and repetition. Reply with the updated summary only, in under 150 words."""
+
+def summarize_conversation(summary: str, turns: List) -> str:
+    """Fold rolled-out chat turns into a conversation's running summary."""
+    transcript = "\n".join(f"{'User' if role == 'human' else 'Assistant'}: {text}" for role, text in turns)
+    result = llm_scheduler.invoke(llm, [
+        SystemMessage(content=CONVERSATION_SUMMARY_PROMPT),
+        HumanMessage(content=f"Summary so far:\n{summary or '(none)'}\n\nNew turns:\n{transcript}")
+    ], "batch")
+    return result.content
+
+conversation_history = ConversationMemory(  # Token-budgeted chat memory per channel (or user)
+    summarize=summarize_conversation, load_history=db_service.get_channel_ai_history)
+atexit.register(conversation_history.close)
+channel_index = ChannelIndex(  # BM25 over each channel's past interactions and plans
+    load_history=db_service.get_channel_ai_history, load_plans=db_service.get_channel_event_plans)
+
+def cache_hit_ratios() -> Dict:
+    """Hit ratio of each cache layer, keyed by metric label values."""
+    lookup = plan_lookup.stats()
+    lookups = (lookup["store_hits"] + lookup["db_hits"] + lookup["negative_hits"] + lookup["misses"]
+               + lookup["db_errors"])
+    return {
+        ("plan_response",): plan_cache.stats()["hit_ratio"],
+        ("chat_similarity",): chat_cache.stats()["hit_ratio"],
+        ("role_catalogue",): role_catalogue.stats()["hit_ratio"],
+        ("export",): export_cache.stats()["hit_ratio"],
+        ("plan_store",): round(lookup["store_hits"] / lookups, 4) if lookups else 0.0
+    }
+
+def stored_plans_bytes() -> int:
+    """Approximate bytes held by the plan store (compressed blobs or the SQLite file)."""
+    store_stats = plan_store.stats()
+    return store_stats.get("stored_bytes", store_stats.get("db_bytes", 0))
+
+metrics.gauge("cache_hit_ratio", "Hit ratio by cache layer.", ("cache",), callback=cache_hit_ratios)
+metrics.gauge("llm_in_flight", "LLM calls currently holding an admission slot.", callback=llm_scheduler.in_flight)
+metrics.gauge("llm_queued", "LLM calls waiting for admission by priority.", ("priority",),
+              callback=lambda: {(name,): n for name, n in llm_scheduler.stats()["queued"].items()})
+metrics.gauge("llm_hedge_delay_seconds", "Latency after which an LLM call is hedged, by route and call kind.",
+              ("route", "kind"), callback=hedged_llm.delays)
+metrics.gauge("stored_plans", "Plans held in the plan store.", callback=lambda: len(plan_store))
+metrics.gauge("stored_plans_bytes", "Approximate bytes held by the plan store.", callback=stored_plans_bytes)
+metrics.gauge("outbox_queue_depth", "Node.js notifications waiting for delivery.",
+              callback=lambda: notification_outbox.stats()["queue_depth"])
 
 def load_prompt() -> str:
     """Load the system prompt from file."""
@@ -42,15 +163,313 @@ def load_prompt() -> str:
         logger.error(f"Error loading prompt file: {str(e)}")
         return "You are EventPlanner Pro, an AI assistant for event management and productivity."
 
+def too_many_requests(error: SchedulerBusy):
+    """Build a 429 response (503 when a shared LLM call timed out) with a Retry-After header."""
+    response = jsonify({"error": str(error)})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, error.status
+
+def streaming_response(events, lease=None) -> Response:
+    """Wrap an SSE generator, releasing the scheduler lease even if the client disconnects first."""
+    response = Response(stream_with_context(events), mimetype="text/event-stream", headers=SSE_HEADERS)
+    if lease:
+        response.call_on_close(lease.release)
+    return response
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # Hedge budgets and latency percentiles are kept per route
+    llm_route.set(request.url_rule.rule if request.url_rule else "unmatched")
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    labels = {
+        "method": request.method,
+        # Use the URL rule, not the path, so plan and job IDs don't explode the label set
+        "route": request.url_rule.rule if request.url_rule else "unmatched",
+        "status": str(response.status_code)
+    }
+    # werkzeug never calls on-close hooks for direct_passthrough responses
+    # (send_file), so those are recorded here along with buffered ones
+    if response.is_streamed and not response.direct_passthrough:
+        # Streams finish after this hook; record when the response is closed
+        response.call_on_close(lambda: request_seconds.observe(time.perf_counter() - started, **labels))
+    else:
+        request_seconds.observe(time.perf_counter() - started, **labels)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics for this process."""
+    return Response(metrics.render(), mimetype=METRICS_CONTENT_TYPE)
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
     return jsonify({
         "status": "healthy",
         "service": "AI Backend",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(),
+        "plan_cache": plan_cache.stats(),
+        "chat_cache": chat_cache.stats(),
+        "conversation_memory": conversation_history.stats(),
+        "channel_index": channel_index.stats(),
+        "role_catalogue": role_catalogue.stats(),
+        "plan_store": plan_store.stats(),
+        "export_queue": export_queue.stats(),
+        "export_cache": export_cache.stats(),
+        "outbox": notification_outbox.stats(),
+        "database": db_service.stats(),
+        "plan_lookup": plan_lookup.stats(),
+        "llm_coalescing": llm.stats(),
+        "llm_hedging": hedged_llm.stats(),
+        "llm_scheduler": llm_scheduler.stats()
     })
 
+ACTION_PLAN_JSON_FORMAT = """Please provide a detailed action plan in JSON format with the following structure:
+    {
+        "title": "Action Plan Title",
+        "overview": "Brief overview of the plan",
+        "cards": [
+            {
+                "id": "unique_id",
+                "title": "Action Item Title",
+                "description": "Detailed description",
+                "category": "planning|execution|logistics|marketing|finance",
+                "priority": "high|medium|low",
+                "timeline": "estimated time",
+                "budget_estimate": "cost estimate",
+                "tasks": [
+                    {
+                        "task": "specific task",
+                        "assignee": "role or person"
+                    }
+                ],
+                "resources": ["resource1", "resource2"],
+                "dependencies": ["dependency1", "dependency2"]
+            }
+        ],
+        "timeline": {
+            "total_duration": "overall timeline",
+            "phases": [
+                {
+                    "phase": "phase name",
+                    "duration": "time needed",
+                    "key_activities": ["activity1", "activity2"]
+                }
+            ]
+        },
+        "budget_summary": {
+            "total_estimate": "total cost",
+            "breakdown": [
+                {
+                    "category": "category name",
+                    "amount": "cost",
+                    "percentage": 25
+                }
+            ]
+        },
+        "team_roles": [
+            {
+                "role": "role name",
+                "responsibilities": ["resp1", "resp2"],
+                "skills_required": ["skill1", "skill2"]
+            }
+        ],
+        "success_metrics": ["metric1", "metric2"],
+        "risk_factors": [
+            {
+                "risk": "risk description",
+                "impact": "high|medium|low",
+                "mitigation": "mitigation strategy"
+            }
+        ]
+    }
+    Make sure the response is valid JSON."""
+
+def build_action_plan_prompt(user_request: str, event_type: str, ai_context: Dict, history: str = "") -> str:
+    """Render the action-plan prompt for a request and its channel context."""
+    # Build context from channel AI context
+    context_info = ""
+    if ai_context:
+        context_info = f"""
+        
+    Channel Context:
+    - Objective: {ai_context.get('objective', 'Not specified')}
+    - Target Audience: {ai_context.get('targetAudience', 'Not specified')}
+    - Budget: {ai_context.get('budget', 'Not specified')}
+    - Timeline: {ai_context.get('timeline', 'Not specified')}
+    - Key Challenges: {ai_context.get('challenges', 'Not specified')}
+    """
+    
+    if STRUCTURED_OUTPUT:
+        # The schema travels as the tool definition, not in the prompt
+        format_instructions = "Return the plan by calling the ActionPlanResponse tool."
+    else:
+        format_instructions = ACTION_PLAN_JSON_FORMAT
+    
+    # Prepare detailed prompt for action planning
+    prompt = f"""
+    Generate a comprehensive action plan for the following request:
+    
+    Request: {user_request}
+    Event Type: {event_type}{context_info}{history}
+    
+    {format_instructions}
+    
+    Make sure the plan is comprehensive. Use the channel context to make the plan more specific and relevant.
+    Make sure to provide at least 5-8 actionable cards with specific, practical steps.
+    Use Indian Rupee (₹) for all monetary values and Indian number formatting.
+    """
+    return prompt
+
+def build_chat_system_prompt(event_type: str, ai_context: Dict) -> str:
+    """Render the chat system prompt for an event type and its channel context."""
+    return f"""You are an expert AI assistant specializing in {event_type} event planning and management. 
+        
+        Channel Context:
+        - Event Type: {event_type}
+        - Objective: {ai_context.get('objective', 'Not specified')}
+        - Target Audience: {ai_context.get('targetAudience', 'Not specified')}
+        - Budget: {ai_context.get('budget', 'Not specified')}
+        - Timeline: {ai_context.get('timeline', 'Not specified')}
+        - Key Challenges: {ai_context.get('challenges', 'Not specified')}
+        
+        Your role:
+        1. Provide specific, actionable advice for this {event_type}
+        2. Ask relevant follow-up questions to gather more details
+        3. Suggest task breakdowns and team assignments
+        4. Offer budget and timeline recommendations
+        5. Help solve specific challenges mentioned
+        6. Be conversational and helpful
+        
+        Always provide practical, implementable suggestions. Use Indian context and currency (₹) when discussing costs."""
+
+def build_role_prompt(event_type: str, team_size: int, event_scale: str) -> str:
+    """Render the role-suggestion prompt."""
+    if STRUCTURED_OUTPUT:
+        format_instructions = "Return the roles by calling the RoleSuggestions tool."
+    else:
+        format_instructions = ('Respond with JSON only: {"roles": [{"title", "priority", "responsibilities", '
+                               '"skills", "experience", "time_commitment"}]}')
+    return f"""
+        Suggest optimal team roles for a {event_type} event with {team_size} team members.
+        Event scale: {event_scale}
+        
+        Provide role suggestions with:
+        1. Role title and priority level
+        2. Key responsibilities
+        3. Required skills
+        4. Recommended experience level
+        5. Time commitment
+        
+        Consider the team size and suggest the most essential roles first.
+        {format_instructions}
+        """
+
+def generate_role_suggestions(event_type: str, team_size: int, event_scale: str, priority: str = "interactive",
+                              user_id: Optional[str] = None) -> List:
+    """Ask the LLM for team roles; raises StructuredOutputError if the reply never validates."""
+    messages = [
+        SystemMessage(content=load_prompt()),
+        HumanMessage(content=build_role_prompt(event_type, team_size, event_scale))
+    ]
+    
+    def invoke_roles(role_messages: List):
+        return llm_scheduler.invoke(llm, role_messages, priority, user_id, **ROLE_CALL_KWARGS)
+    
+    return complete_structured(RoleSuggestions, messages, invoke_roles, STRUCTURED_OUTPUT_RETRIES)["roles"]
+
+role_catalogue = RoleCatalogue(generate_role_suggestions)  # Role suggestions per event type, size bucket and scale
+role_catalogue.start()
+atexit.register(role_catalogue.stop)
+
+def relevant_history(channel_id: Optional[str], query: str, exclude: Optional[List[str]] = None) -> str:
+    """Prompt section with the channel's past interactions and plans most relevant to query."""
+    snippets = channel_index.search(channel_id, query, exclude or ())
+    if not snippets:
+        return ""
+    return "\n\n    Relevant Channel History:\n" + "\n".join(f"    - {' '.join(snippet.split())}" for snippet in snippets)
+
+def prepare_action_plan(user_request: str, event_type: str, ai_context: Dict, channel_id: Optional[str],
+                        system_prompt: str) -> tuple:
+    """Plan cache key, cached response (or None) and LLM messages for a plan request.
+
+    The key covers the prompt without channel history: every generated plan is
+    indexed, so retrieval returns something different for a repeated request
+    and would otherwise never hit the cache. History is retrieved only on a miss.
+    """
+    prompt = build_action_plan_prompt(user_request, event_type, ai_context)
+    cache_key = plan_cache.make_key(system_prompt, prompt)
+    cached_response = plan_cache.get(cache_key)
+    if cached_response is None:
+        history = relevant_history(channel_id, user_request)
+        if history:
+            prompt = build_action_plan_prompt(user_request, event_type, ai_context, history)
+    return cache_key, cached_response, [SystemMessage(content=system_prompt), HumanMessage(content=prompt)]
+
+def build_chat_messages(memory_key: Optional[str], channel_id: Optional[str], system_prompt: str,
+                        message: str) -> tuple:
+    """Chat messages with remembered turns and relevant channel history.
+
+    Returns (messages, context): context is everything the prompt carries
+    beyond the system prompt and the message (summary, earlier turns,
+    channel history), or "" when there is none.
+    """
+    # Earlier turns in this channel (or with this user) that fit the memory token budget
+    messages = conversation_history.build_messages(memory_key, system_prompt, message)
+    # Older channel history relevant to this message, skipping turns already in the prompt
+    recent = [turn.content for turn in messages[1:-1] if isinstance(turn, HumanMessage)]
+    history = relevant_history(channel_id, message, recent)
+    if history:
+        messages[0] = SystemMessage(content=messages[0].content + history)
+    context = [messages[0].content[len(system_prompt):]] + [turn.content for turn in messages[1:-1]]
+    return messages, "\x1e".join(context) if any(context) else ""
+
+def record_chat_turn(memory_key: Optional[str], channel_id: Optional[str], user_id: Optional[str],
+                     message: str, ai_response: str) -> None:
+    """Remember a chat exchange in conversation memory, the channel index and MongoDB."""
+    conversation_history.record(memory_key, message, ai_response)
+    if channel_id:
+        channel_index.add_interaction(channel_id, message, ai_response)
+        db_service.store_ai_interaction(channel_id, user_id, message, {"response": ai_response})
+
+def store_generated_plan(parsed_plan: Dict, user_request: str, event_type: str,
+                         channel_id: str, user_id: str) -> str:
+    """Register a newly generated plan and notify the Node.js server. Returns the plan ID."""
+    # Generate unique plan ID
+    plan_id = str(uuid.uuid4())
+    
+    # Store plan for later export
+    plan_data = {
+        "plan_id": plan_id,
+        "user_id": user_id,
+        "channel_id": channel_id,
+        "user_request": user_request,
+        "event_type": event_type,
+        "ai_response": parsed_plan,
+        "created_at": datetime.now().isoformat(),
+        "status": "generated"
+    }
+    
+    with plan_stage_seconds.time(stage="store"):
+        plan_store.put(plan_id, plan_data)
+        db_service.store_event_plan(plan_data)
+        channel_index.add_plan(channel_id, user_request, parsed_plan.get("action_plan", {}))
+    
+    # Queue plan data for the Node.js server; delivery happens off the request path
+    try:
+        with plan_stage_seconds.time(stage="node_notify"):
+            notification_outbox.enqueue("/api/ai/store-plan", plan_data)
+    except Exception as e:
+        logger.warning(f"Failed to queue Node.js notification: {e}")
+    
+    return plan_id
+
 @app.route('/api/ai/generate-action-plan', methods=['POST'])
 def generate_action_plan():
     """Generate comprehensive action plan based on user request and channel context."""
@@ -65,146 +484,269 @@ def generate_action_plan():
         if not user_request:
             return jsonify({"error": "Request is required"}), 400
         
-        # Build context from channel AI context
-        context_info = ""
-        if ai_context:
-            context_info = f"""
-            
-        Channel Context:
-        - Objective: {ai_context.get('objective', 'Not specified')}
-        - Target Audience: {ai_context.get('targetAudience', 'Not specified')}
-        - Budget: {ai_context.get('budget', 'Not specified')}
-        - Timeline: {ai_context.get('timeline', 'Not specified')}
-        - Key Challenges: {ai_context.get('challenges', 'Not specified')}
-        """
+        with plan_stage_seconds.time(stage="prompt_build"):
+            cache_key, ai_response, messages = prepare_action_plan(user_request, event_type, ai_context, channel_id,
+                                                                   load_prompt())
+        cached = ai_response is not None
         
-        # Prepare detailed prompt for action planning
-        prompt = f"""
-        Generate a comprehensive action plan for the following request:
-        
-        Request: {user_request}
-        Event Type: {event_type}{context_info}
-        
-        Please provide a detailed action plan in JSON format with the following structure:
-        {{
-            "title": "Action Plan Title",
-            "overview": "Brief overview of the plan",
-            "cards": [
-                {{
-                    "id": "unique_id",
-                    "title": "Action Item Title",
-                    "description": "Detailed description",
-                    "category": "planning|execution|logistics|marketing|finance",
-                    "priority": "high|medium|low",
-                    "timeline": "estimated time",
-                    "budget_estimate": "cost estimate",
-                    "tasks": [
-                        {{
-                            "task": "specific task",
-                            "assignee": "role or person"
-                        }}
-                    ],
-                    "resources": ["resource1", "resource2"],
-                    "dependencies": ["dependency1", "dependency2"]
-                }}
-            ],
-            "timeline": {{
-                "total_duration": "overall timeline",
-                "phases": [
-                    {{
-                        "phase": "phase name",
-                        "duration": "time needed",
-                        "key_activities": ["activity1", "activity2"]
-                    }}
-                ]
-            }},
-            "budget_summary": {{
-                "total_estimate": "total cost",
-                "breakdown": [
-                    {{
-                        "category": "category name",
-                        "amount": "cost",
-                        "percentage": 25
-                    }}
-                ]
-            }},
-            "team_roles": [
-                {{
-                    "role": "role name",
-                    "responsibilities": ["resp1", "resp2"],
-                    "skills_required": ["skill1", "skill2"]
-                }}
-            ],
-            "success_metrics": ["metric1", "metric2"],
-            "risk_factors": [
-                {{
-                    "risk": "risk description",
-                    "impact": "high|medium|low",
-                    "mitigation": "mitigation strategy"
-                }}
-            ]
-        }}
+        if wants_stream(request, data):
+            lease = None if cached else llm_scheduler.acquire("standard", user_id)
+            return stream_action_plan(messages, cache_key, ai_response, {
+                "user_request": user_request,
+                "event_type": event_type,
+                "channel_id": channel_id,
+                "user_id": user_id
+            }, lease)
         
-        Make sure the response is valid JSON and comprehensive. Use the channel context to make the plan more specific and relevant.
-        Make sure to provide at least 5-8 actionable cards with specific, practical steps.
-        Use Indian Rupee (₹) for all monetary values and Indian number formatting.
-        """
+        def invoke_plan(plan_messages: List):
+            return llm_scheduler.invoke(llm, plan_messages, "standard", user_id, **PLAN_CALL_KWARGS)
         
         # Generate AI response
-        result = llm.invoke([
-            SystemMessage(content=load_prompt()),
-            HumanMessage(content=prompt)
-        ])
-        
-        ai_response = result.content
+        if not cached:
+            with plan_stage_seconds.time(stage="llm_call"):
+                ai_response = invoke_text(invoke_plan, messages)
         
         try:
-            # Parse the JSON response
-            parsed_plan = json.loads(ai_response)
+            # Validate against the plan schema, repairing or re-asking on malformed output
+            with plan_stage_seconds.time(stage="json_parse"):
+                parsed_plan = complete_structured(ActionPlanResponse, messages, invoke_plan,
+                                                  STRUCTURED_OUTPUT_RETRIES, text=ai_response)
+            if not cached:
+                plan_cache.set(cache_key, json.dumps(parsed_plan, ensure_ascii=False))
             
-            # Generate unique plan ID
-            plan_id = str(uuid.uuid4())
-            
-            # Store plan in memory for later export
-            plan_data = {
-                "plan_id": plan_id,
-                "user_id": user_id,
-                "channel_id": channel_id,
-                "user_request": user_request,
-                "event_type": event_type,
-                "ai_response": parsed_plan,
-                "created_at": datetime.now().isoformat(),
-                "status": "generated"
-            }
-            
-            stored_plans[plan_id] = plan_data
-            
-            # Send plan data to Node.js server for database storage
-            try:
-                node_server_url = os.getenv('NODE_SERVER_URL', 'http://localhost:5000')
-                requests.post(f"{node_server_url}/api/ai/store-plan", json=plan_data, timeout=5)
-            except Exception as e:
-                logger.warning(f"Failed to notify Node.js server: {e}")
+            plan_id = store_generated_plan(parsed_plan, user_request, event_type, channel_id, user_id)
             
             return jsonify({
                 "success": True,
                 "plan_id": plan_id,
                 "action_plan": parsed_plan.get("action_plan", {}),
+                "cached": cached,
                 "message": "Action plan generated successfully"
             })
             
-        except json.JSONDecodeError:
-            logger.error("Failed to parse AI response as JSON")
+        except StructuredOutputError as e:
+            logger.error(f"Failed to parse AI response as an action plan: {str(e).splitlines()[0]}")
             return jsonify({
                 "success": False,
                 "error": "Failed to generate structured action plan",
-                "raw_response": ai_response[:500]  # First 500 chars for debugging
+                "raw_response": e.text[:500]  # First 500 chars for debugging
             }), 500
             
+    except SchedulerBusy as e:
+        return too_many_requests(e)
     except Exception as e:
         logger.error(f"Generate action plan error: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
+def stream_action_plan(messages: List, cache_key: str, cached_response, plan_info: Dict,
+                       lease=None) -> Response:
+    """Stream action-plan cards as Server-Sent Events as soon as each one is complete."""
+    def generate():
+        parser = IncrementalCardParser()
+        card_index = 0
+        try:
+            started = time.perf_counter()
+            if cached_response is not None:
+                chunks = [cached_response]
+            else:
+                chunks = (chunk_text(chunk) for chunk in llm.stream(messages, **PLAN_CALL_KWARGS))
+            
+            ai_response = None
+            try:
+                for content in chunks:
+                    if not content:
+                        continue
+                    for card in parser.feed(content):
+                        yield sse_event({"index": card_index, "card": card}, event="card")
+                        card_index += 1
+            except Exception as e:
+                # The provider rejected malformed tool arguments; repair what it generated
+                ai_response = failed_generation(e)
+                if ai_response is None:
+                    raise
+            if cached_response is None:
+                # Includes time spent writing cards to the client between chunks
+                plan_stage_seconds.observe(time.perf_counter() - started, stage="llm_call")
+            if lease:
+                lease.release()  # A retry below is admitted on its own
+            
+            if ai_response is None:
+                ai_response = parser.text
+            try:
+                with plan_stage_seconds.time(stage="json_parse"):
+                    parsed_plan = complete_structured(
+                        ActionPlanResponse, messages,
+                        lambda plan_messages: llm_scheduler.invoke(llm, plan_messages, "standard", plan_info["user_id"],
+                                                                   **PLAN_CALL_KWARGS),
+                        STRUCTURED_OUTPUT_RETRIES, text=ai_response)
+            except StructuredOutputError as e:
+                logger.error(f"Failed to parse streamed AI response as an action plan: {str(e).splitlines()[0]}")
+                yield sse_event({
+                    "success": False,
+                    "error": "Failed to generate structured action plan",
+                    "raw_response": e.text[:500]
+                }, event="error")
+                return
+            
+            if cached_response is None:
+                plan_cache.set(cache_key, json.dumps(parsed_plan, ensure_ascii=False))
+            plan_id = store_generated_plan(
+                parsed_plan, plan_info["user_request"], plan_info["event_type"],
+                plan_info["channel_id"], plan_info["user_id"]
+            )
+            
+            yield sse_event({
+                "success": True,
+                "plan_id": plan_id,
+                "action_plan": parsed_plan.get("action_plan", {}),
+                "cards_streamed": card_index,
+                "cached": cached_response is not None,
+                "message": "Action plan generated successfully"
+            }, event="plan")
+        except Exception as e:
+            logger.error(f"Generate action plan stream error: {str(e)}")
+            yield sse_event({"success": False, "error": "Internal server error"}, event="error")
+        finally:
+            if lease:
+                lease.release()
+    
+    return streaming_response(generate(), lease)
+
+@app.route('/api/ai/generate-action-plans/batch', methods=['POST'])
+def generate_action_plans_batch():
+    """Generate action plans for many requests concurrently."""
+    try:
+        data = request.get_json()
+        items = data.get('items')
+        
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "Items are required"}), 400
+        if len(items) > BATCH_MAX_ITEMS:
+            return jsonify({"error": f"At most {BATCH_MAX_ITEMS} items per batch"}), 400
+        
+        max_concurrency = min(int(data.get('maxConcurrency', BATCH_MAX_CONCURRENCY)), BATCH_MAX_CONCURRENCY)
+        system_prompt = load_prompt()
+        results: List = [None] * len(items)
+        pending = []  # (index, item_info, messages) still needing an LLM call
+        
+        for index, item in enumerate(items):
+            item = item if isinstance(item, dict) else {}
+            item_info = {
+                "user_request": item.get('request', ''),
+                "event_type": item.get('eventType', 'general'),
+                "channel_id": item.get('channelId'),
+                "user_id": item.get('userId')
+            }
+            if not item_info["user_request"]:
+                results[index] = {"index": index, "success": False, "error": "Request is required"}
+                continue
+            
+            # Same cache key and history rule as the single-plan route
+            item_info["cache_key"], cached_response, messages = prepare_action_plan(
+                item_info["user_request"], item_info["event_type"], item.get('aiContext', {}), item_info["channel_id"],
+                system_prompt)
+            if cached_response is not None:
+                results[index] = finish_batch_item(index, item_info, cached_response, cached=True)
+            else:
+                pending.append((index, item_info, messages))
+        
+        config = {"max_concurrency": max(1, max_concurrency)}
+        inputs = [{"messages": messages, "user_id": item_info["user_id"]} for _, item_info, messages in pending]
+        # Batch items run at the lowest priority, each admitted separately
+        batch_llm = llm_scheduler.as_runnable(llm, "batch", **PLAN_CALL_KWARGS)
+        
+        if wants_stream(request, data):
+            return stream_batch_results(batch_llm, results, pending, inputs, config)
+        
+        if inputs:
+            outputs = batch_llm.batch(inputs, config=config, return_exceptions=True)
+            for (index, item_info, messages), output in zip(pending, outputs):
+                results[index] = batch_output_result(index, item_info, output, messages)
+        
+        succeeded = sum(1 for result in results if result["success"])
+        return jsonify({
+            "success": True,
+            "total": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "results": results
+        })
+        
+    except Exception as e:
+        logger.error(f"Batch action plan error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+def batch_output_result(index: int, item_info: Dict, output, messages: List) -> Dict:
+    """Turn one LLM batch output (or exception) into a per-item result."""
+    if isinstance(output, SchedulerBusy):
+        return {"index": index, "success": False, "error": str(output), "retry_after": output.retry_after}
+    if isinstance(output, Exception):
+        ai_response = failed_generation(output)
+        if ai_response is None:
+            logger.error(f"Batch item {index} failed: {output}")
+            return {"index": index, "success": False, "error": "Failed to generate action plan"}
+    else:
+        ai_response = response_text(output)
+    return finish_batch_item(index, item_info, ai_response, cached=False, messages=messages)
+
+def finish_batch_item(index: int, item_info: Dict, ai_response: str, cached: bool,
+                      messages: Optional[List] = None) -> Dict:
+    """Validate, cache and store one batch item's plan; malformed output is re-asked if messages are given."""
+    try:
+        parsed_plan = complete_structured(
+            ActionPlanResponse, messages or [],
+            lambda plan_messages: llm_scheduler.invoke(llm, plan_messages, "batch", item_info["user_id"],
+                                                       **PLAN_CALL_KWARGS),
+            STRUCTURED_OUTPUT_RETRIES if messages else 0, text=ai_response)
+    except StructuredOutputError:
+        return {"index": index, "success": False, "error": "Failed to generate structured action plan"}
+    except SchedulerBusy as e:
+        return {"index": index, "success": False, "error": str(e), "retry_after": e.retry_after}
+    
+    if not cached:
+        plan_cache.set(item_info["cache_key"], json.dumps(parsed_plan, ensure_ascii=False))
+    plan_id = store_generated_plan(parsed_plan, item_info["user_request"], item_info["event_type"],
+                                   item_info["channel_id"], item_info["user_id"])
+    return {
+        "index": index,
+        "success": True,
+        "plan_id": plan_id,
+        "action_plan": parsed_plan.get("action_plan", {}),
+        "cached": cached
+    }
+
+def stream_batch_results(batch_llm, results: List, pending: List, inputs: List, config: Dict) -> Response:
+    """Stream per-item batch results as Server-Sent Events in completion order."""
+    def generate():
+        completed = 0
+        total = len(results)
+        try:
+            for result in results:
+                if result is not None:
+                    completed += 1
+                    yield sse_event({**result, "completed": completed, "total": total}, event="item")
+            
+            if inputs:
+                for position, output in batch_llm.batch_as_completed(inputs, config=config, return_exceptions=True):
+                    index, item_info, messages = pending[position]
+                    results[index] = batch_output_result(index, item_info, output, messages)
+                    completed += 1
+                    yield sse_event({**results[index], "completed": completed, "total": total}, event="item")
+        except Exception as e:
+            logger.error(f"Batch action plan stream error: {str(e)}")
+            yield sse_event({"success": False, "error": "Internal server error"}, event="error")
+            return
+        
+        succeeded = sum(1 for result in results if result and result["success"])
+        yield sse_event({
+            "success": True,
+            "total": total,
+            "succeeded": succeeded,
+            "failed": total - succeeded
+        }, event="done")
+    
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=SSE_HEADERS)
+
 @app.route('/api/ai/chat', methods=['POST'])
 def ai_chat():
     """Dynamic AI chat for event planning assistance."""
@@ -220,44 +762,97 @@ def ai_chat():
             return jsonify({"error": "Message is required"}), 400
         
         # Build context-aware system prompt
-        context_prompt = f"""You are an expert AI assistant specializing in {event_type} event planning and management. 
+        context_prompt = build_chat_system_prompt(event_type, ai_context)
         
-        Channel Context:
-        - Event Type: {event_type}
-        - Objective: {ai_context.get('objective', 'Not specified')}
-        - Target Audience: {ai_context.get('targetAudience', 'Not specified')}
-        - Budget: {ai_context.get('budget', 'Not specified')}
-        - Timeline: {ai_context.get('timeline', 'Not specified')}
-        - Key Challenges: {ai_context.get('challenges', 'Not specified')}
+        memory_key = conversation_history.key(channel_id, user_id)
+        messages, conversation_context = build_chat_messages(memory_key, channel_id, context_prompt, message)
         
-        Your role:
-        1. Provide specific, actionable advice for this {event_type}
-        2. Ask relevant follow-up questions to gather more details
-        3. Suggest task breakdowns and team assignments
-        4. Offer budget and timeline recommendations
-        5. Help solve specific challenges mentioned
-        6. Be conversational and helpful
+        # Near-duplicate questions in the same event type, AI context and conversation context
+        # reuse an earlier answer
+        cache_scope = chat_cache.make_scope(event_type, ai_context, conversation_context)
+        cached = chat_cache.get(cache_scope, message)
         
-        Always provide practical, implementable suggestions. Use Indian context and currency (₹) when discussing costs."""
+        if wants_stream(request, data):
+            lease = None if cached else llm_scheduler.acquire("interactive", user_id)
+            return stream_chat_response(messages, {
+                "channel_id": channel_id,
+                "user_id": user_id,
+                "event_type": event_type
+            }, message, lease, cache_scope, cached, memory_key)
         
-        # Generate AI response
-        result = llm.invoke([
-            SystemMessage(content=context_prompt),
-            HumanMessage(content=message)
-        ])
+        if cached:
+            ai_response, similarity = cached
+        else:
+            # Generate AI response
+            result = llm_scheduler.invoke(llm, messages, "interactive", user_id)
+            ai_response = result.content
+            chat_cache.set(cache_scope, message, ai_response)
         
-        ai_response = result.content
+        record_chat_turn(memory_key, channel_id, user_id, message, ai_response)
         
-        return jsonify({
+        response = {
             "success": True,
             "response": ai_response,
             "timestamp": datetime.now().isoformat()
-        })
+        }
+        if cached:
+            response["cached"] = True
+            response["similarity"] = round(similarity, 3)
+        return jsonify(response)
         
+    except SchedulerBusy as e:
+        return too_many_requests(e)
     except Exception as e:
         logger.error(f"AI chat error: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
+def stream_chat_response(messages: List, metadata: Dict, message: str, lease=None, cache_scope: Optional[str] = None,
+                         cached=None, memory_key: Optional[str] = None) -> Response:
+    """Stream an LLM completion, or a cached answer in one token, as Server-Sent Events."""
+    def generate():
+        started = time.perf_counter()
+        first_token_ms = None
+        chunk_count = 0
+        parts = []
+        chunks = [cached[0]] if cached else (chunk.content for chunk in llm.stream(messages))
+        try:
+            for content in chunks:
+                if not content:
+                    continue
+                if first_token_ms is None:
+                    first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+                chunk_count += 1
+                parts.append(content)
+                yield sse_event({"token": content}, event="token")
+        except Exception as e:
+            logger.error(f"AI chat stream error: {str(e)}")
+            yield sse_event({"success": False, "error": "Internal server error"}, event="error")
+            return
+        finally:
+            if lease:
+                lease.release()
+        
+        ai_response = "".join(parts)
+        if not cached and cache_scope:
+            chat_cache.set(cache_scope, message, ai_response)
+        record_chat_turn(memory_key, metadata.get("channel_id"), metadata.get("user_id"), message, ai_response)
+        
+        yield sse_event({
+            "success": True,
+            "timestamp": datetime.now().isoformat(),
+            "metadata": {
+                **metadata,
+                "model": LLM_MODEL,
+                "cached": bool(cached),
+                "similarity": round(cached[1], 3) if cached else None,
+                "chunks": chunk_count,
+                "time_to_first_token_ms": first_token_ms,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+            }
+        }, event="done")
+    
+    return streaming_response(generate(), lease)
+
 @app.route('/api/ai/suggest-roles', methods=['POST'])
 def suggest_roles():
     """Suggest roles based on event type and team size."""
@@ -267,41 +862,124 @@ def suggest_roles():
         team_size = data.get('teamSize', 5)
         event_scale = data.get('eventScale', 'medium')
         
-        prompt = f"""
-        Suggest optimal team roles for a {event_type} event with {team_size} team members.
-        Event scale: {event_scale}
-        
-        Provide role suggestions with:
-        1. Role title and priority level
-        2. Key responsibilities
-        3. Required skills
-        4. Recommended experience level
-        5. Time commitment
-        
-        Consider the team size and suggest the most essential roles first.
-        """
-        
-        result = llm.invoke([
-            SystemMessage(content=load_prompt()),
-            HumanMessage(content=prompt)
-        ])
-        
         try:
-            role_suggestions = json.loads(result.content)
+            # Served from the catalogue; only a key's first request waits on the LLM
+            roles, cached = role_catalogue.get_or_generate(event_type, team_size, event_scale)
             return jsonify({
                 "success": True,
-                "roles": role_suggestions
+                "roles": roles,
+                "cached": cached
             })
-        except json.JSONDecodeError:
+        except StructuredOutputError:
             return jsonify({
                 "success": False,
                 "error": "Failed to parse role suggestions"
             }), 500
             
+    except SchedulerBusy as e:
+        return too_many_requests(e)
     except Exception as e:
         logger.error(f"Suggest roles error: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
+def build_section_prompt(action_plan: Dict, section: str, current, instruction: str) -> str:
+    """Render the prompt that regenerates one section of a plan, with only an outline of the rest."""
+    schema = section_schema(section)
+    wrapper = next(iter(schema.model_fields))
+    if STRUCTURED_OUTPUT:
+        format_instructions = f"Return the complete revised {wrapper.replace('_', ' ')} by calling the {schema.__name__} tool."
+    else:
+        format_instructions = f'Respond with JSON only: {{"{wrapper}": <the complete revised {wrapper.replace("_", " ")}>}}'
+    return f"""
+    Revise one section of an existing event action plan. Leave everything you are not asked to change as it is.
+    
+    Plan outline:
+    {plan_outline(action_plan, section)}
+    
+    Current {wrapper.replace('_', ' ')}:
+    {section_json(current)}
+    
+    Instruction: {instruction}
+    
+    {format_instructions}
+    Use Indian Rupee (₹) for all monetary values and Indian number formatting.
+    """
+
+@app.route('/api/ai/regenerate-section', methods=['POST'])
+def regenerate_section():
+    """Regenerate one card or section of a stored plan and save it as a new version."""
+    try:
+        data = request.get_json()
+        plan_id = data.get('planId')
+        section = data.get('section')
+        instruction = data.get('instruction')
+        
+        if not plan_id or not section or not instruction:
+            return jsonify({"error": "Plan ID, section and instruction are required"}), 400
+        
+        # Another worker may have saved a newer version than this process has cached
+        plan_data = plan_lookup.get(plan_id, fresh=True)
+        if not plan_data:
+            return jsonify({"error": "Plan not found"}), 404
+        
+        version = stored_version(plan_data)
+        if data.get('version') is not None and int(data['version']) != version:
+            return jsonify({"error": "Plan has changed", "version": version}), 409
+        
+        action_plan = action_plan_of(plan_data)
+        try:
+            current = get_section(action_plan, section)
+        except SectionNotFound:
+            return jsonify({"error": "Unknown section", "sections": available_sections(action_plan)}), 400
+        
+        schema = section_schema(section)
+        call_kwargs = SECTION_TOOLS[schema] if STRUCTURED_OUTPUT else {}
+        messages = [
+            SystemMessage(content=load_prompt()),
+            HumanMessage(content=build_section_prompt(action_plan, section, current, instruction))
+        ]
+        
+        def invoke_section(section_messages: List):
+            return llm_scheduler.invoke(llm, section_messages, "standard", data.get('userId'), **call_kwargs)
+        
+        try:
+            with plan_stage_seconds.time(stage="section_llm_call"):
+                revised = complete_structured(schema, messages, invoke_section, STRUCTURED_OUTPUT_RETRIES)
+        except StructuredOutputError as e:
+            logger.error(f"Failed to parse regenerated section: {str(e).splitlines()[0]}")
+            return jsonify({
+                "success": False,
+                "error": "Failed to regenerate section",
+                "raw_response": e.text[:500]
+            }), 500
+        
+        updated = merge_section(plan_data, section, next(iter(revised.values())), instruction, PLAN_MAX_REVISIONS)
+        with plan_stage_seconds.time(stage="store"):
+            # Compare-and-set, so an edit saved while the model was running is never overwritten
+            if not plan_store.put_if_version(plan_id, updated, version):
+                return jsonify({"error": "Plan has changed",
+                                "version": stored_version(plan_lookup.get(plan_id, ("version",), fresh=True))}), 409
+            db_service.update_event_plan(plan_id, {
+                field: updated[field] for field in ("ai_response", "version", "revisions", "updated_at")
+            })
+        # Exports are content-addressed, so old artifacts would never be served again; reclaim the space now
+        export_cache.invalidate_plan(plan_id)
+        
+        return jsonify({
+            "success": True,
+            "plan_id": plan_id,
+            "version": updated["version"],
+            "section": section,
+            "value": get_section(action_plan_of(updated), section),
+            "action_plan": action_plan_of(updated)
+        })
+        
+    except SchedulerBusy as e:
+        return too_many_requests(e)
+    except Exception as e:
+        logger.error(f"Regenerate section error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
 @app.route('/api/ai/export-plan/<format>', methods=['POST'])
 def export_plan(format):
     """Export action plan as PDF or Excel."""
@@ -312,18 +990,53 @@ def export_plan(format):
         if not plan_id:
             return jsonify({"error": "Plan ID is required"}), 400
         
-        # Get plan from in-memory storage
-        plan_data = stored_plans.get(plan_id)
+        # Get plan from the plan store, falling back to the database
+        plan_data = plan_lookup.get(plan_id)
         if not plan_data:
             return jsonify({"error": "Plan not found"}), 404
         
-        if format.lower() == 'pdf':
-            file_path = pdf_generator.generate_plan_pdf(plan_data)
-        elif format.lower() == 'excel':
-            file_path = excel_generator.generate_plan_excel(plan_data)
-        else:
+        export_format = format.lower()
+        if export_format not in ('pdf', 'excel'):
             return jsonify({"error": "Invalid format. Use 'pdf' or 'excel'"}), 400
         
+        direct_download = request.args.get('download', str(data.get('download', ''))).lower() in ('1', 'true', 'yes')
+        
+        # Reuse an existing artifact for identical plan content
+        with export_stage_seconds.time(format=export_format, stage="cache_lookup"):
+            file_path = export_cache.lookup(plan_data, export_format)
+        if file_path and direct_download:
+            from flask import send_file
+            return send_file(os.path.abspath(file_path), mimetype=MIME_TYPES[export_format], as_attachment=True)
+        if file_path:
+            return jsonify({
+                "success": True,
+                "downloadUrl": f"/api/ai/download/{os.path.basename(file_path)}",
+                "fileName": os.path.basename(file_path),
+                "cached": True
+            })
+        
+        # Render straight into the response without touching exports/
+        if direct_download:
+            return stream_export(plan_data, export_format)
+        
+        # Render in the background and let the client poll the job
+        if request.args.get('async', str(data.get('async', ''))).lower() in ('1', 'true', 'yes'):
+            try:
+                job_id = export_queue.submit(export_format, plan_data)
+            except ExportQueueFull as e:
+                response = jsonify({"error": str(e)})
+                response.headers['Retry-After'] = '5'
+                return response, 429
+            
+            return jsonify({
+                "success": True,
+                "jobId": job_id,
+                "statusUrl": f"/api/ai/export-jobs/{job_id}",
+                "resultUrl": f"/api/ai/export-jobs/{job_id}/result"
+            }), 202
+        
+        file_path = export_cache.get_or_render(plan_data, export_format, export_renderer(export_format, "render_file"))
+        
         return jsonify({
             "success": True,
             "downloadUrl": f"/api/ai/download/{os.path.basename(file_path)}",
@@ -334,6 +1047,81 @@ def export_plan(format):
         logger.error(f"Export plan error: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
+def export_renderer(export_format: str, stage: str):
+    """Return render(plan_data, output) for a format, recording render time and output size."""
+    generate = pdf_generator.generate_plan_pdf if export_format == 'pdf' else excel_generator.generate_plan_excel
+    
+    def render(plan_data: Dict, output) -> None:
+        with export_stage_seconds.time(format=export_format, stage=stage):
+            generate(plan_data, output)
+        size = os.path.getsize(output) if isinstance(output, str) else output.seek(0, os.SEEK_END)
+        export_size_bytes.observe(size, format=export_format)
+    
+    return render
+
+def stream_export(plan_data: Dict, export_format: str) -> Response:
+    """Render an export into memory (spilling to a temp file when large) and stream it back."""
+    buffer = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES)
+    try:
+        export_renderer(export_format, "render_memory")(plan_data, buffer)
+        content_length = buffer.seek(0, os.SEEK_END)
+        buffer.seek(0)
+    except Exception:
+        buffer.close()
+        raise
+    
+    file_name = f"{FILE_PREFIXES[export_format]}_{plan_data.get('plan_id', 'unknown')}.{FILE_EXTENSIONS[export_format]}"
+    return Response(
+        wrap_file(request.environ, buffer),
+        mimetype=MIME_TYPES[export_format],
+        direct_passthrough=True,
+        headers={
+            "Content-Length": str(content_length),
+            "Content-Disposition": f'attachment; filename="{file_name}"'
+        }
+    )
+
+@app.route('/api/ai/export-jobs/<job_id>', methods=['GET'])
+def export_job_status(job_id):
+    """Get the status of a background export job."""
+    job = export_queue.get(job_id)
+    if not job:
+        return jsonify({"error": "Export job not found"}), 404
+    
+    response = {
+        "success": True,
+        "jobId": job_id,
+        "planId": job["plan_id"],
+        "format": job["format"],
+        "status": job["status"]
+    }
+    if job["status"] == "done":
+        file_name = os.path.basename(job["file_path"])
+        response["downloadUrl"] = f"/api/ai/download/{file_name}"
+        response["fileName"] = file_name
+    elif job["status"] == "failed":
+        response["error"] = "Export failed"
+    return jsonify(response)
+
+@app.route('/api/ai/export-jobs/<job_id>/result', methods=['GET'])
+def export_job_result(job_id):
+    """Download the file produced by a background export job."""
+    try:
+        from flask import send_file
+        job = export_queue.get(job_id)
+        if not job:
+            return jsonify({"error": "Export job not found"}), 404
+        if job["status"] == "failed":
+            return jsonify({"error": "Export failed"}), 500
+        if job["status"] != "done":
+            response = jsonify({"status": job["status"]})
+            response.headers['Retry-After'] = '1'
+            return response, 202
+        return send_file(os.path.abspath(job["file_path"]), as_attachment=True)
+    except Exception as e:
+        logger.error(f"Export job result error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
 @app.route('/api/ai/download/<filename>')
 def download_file(filename):
     """Download generated files."""
@@ -341,7 +1129,8 @@ def download_file(filename):
         from flask import send_file
         file_path = os.path.join('exports', filename)
         if os.path.exists(file_path):
-            return send_file(file_path, as_attachment=True)
+            # send_file resolves relative paths against the app root, not the working directory
+            return send_file(os.path.abspath(file_path), as_attachment=True)
         else:
             return jsonify({"error": "File not found"}), 404
     except Exception as e:
@@ -352,7 +1141,7 @@ def download_file(filename):
 def get_plan(plan_id):
     """Get stored action plan by ID."""
     try:
-        plan_data = stored_plans.get(plan_id)
+        plan_data = plan_lookup.get(plan_id)
         if not plan_data:
             return jsonify({"error": "Plan not found"}), 404
         
@@ -368,6 +1157,7 @@ def get_plan(plan_id):
 if __name__ == '__main__':
     # Create exports directory if it doesn't exist
     os.makedirs('exports', exist_ok=True)
+    export_cache.sweep()
     
     port = int(os.getenv('FLASK_PORT', 5001))
     debug = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
@@ -0,0 +1,513 @@
+"""ASGI entry point: LLM-bound routes run as coroutines, the rest is served by the Flask app.
+
+    hypercorn asgi:application --bind 0.0.0.0:5001
+
+Action-plan generation, chat and role suggestions await ainvoke/astream, so a
+multi-second Groq completion holds a coroutine instead of an OS thread. Export
+rendering is awaited on the export process pool. Every other route, and CORS
+preflights, fall through to app.app on a thread pool. Both halves share the
+services created in app.py.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+from quart import Quart, Response, g, jsonify, request, send_file
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from werkzeug.exceptions import HTTPException
+from langchain_core.messages import HumanMessage, SystemMessage
+
+import app as backend
+from services.export_cache import MIME_TYPES
+from services.export_queue import ExportQueueFull
+from services.llm_hedging import current_route as llm_route
+from services.llm_scheduler import SchedulerBusy
+from services.plan_stream_parser import IncrementalCardParser
+from services.plan_schema import (ActionPlanResponse, RoleSuggestions, StructuredOutputError,
+                                  acomplete_structured, ainvoke_text, chunk_text, failed_generation)
+from services.sse import sse_event, wants_stream, SSE_HEADERS
+
+logger = logging.getLogger(__name__)
+
+ASGI_MAX_BODY_BYTES = int(os.getenv('ASGI_MAX_BODY_BYTES', 16 * 1024 * 1024))
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', 32))  # Blocking I/O and the Flask fallback
+
+async_app = Quart(__name__)
+async_app.config['MAX_CONTENT_LENGTH'] = ASGI_MAX_BODY_BYTES
+
+async def run_sync(fn, *args, **kwargs):
+    """Run blocking work (SQLite, MongoDB, disk) on the thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+def too_many_requests(error: SchedulerBusy):
+    """Build a 429 response (503 when a shared LLM call timed out) with a Retry-After header."""
+    response = jsonify({"error": str(error)})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, error.status
+
+def route_labels(status: int) -> Dict[str, str]:
+    return {"method": request.method, "route": request.url_rule.rule, "status": str(status)}
+
+def streaming_response(events: AsyncIterator[str]) -> Response:
+    """Wrap an SSE generator; request latency is recorded when the stream ends."""
+    labels = route_labels(200)
+    started = g.pop('request_started', time.perf_counter())
+    
+    async def timed():
+        try:
+            async for event in events:
+                yield event
+        finally:
+            backend.request_seconds.observe(time.perf_counter() - started, **labels)
+    
+    return Response(timed(), mimetype="text/event-stream", headers=SSE_HEADERS)
+
+async def llm_chunks(messages: List, cached_response: Optional[str] = None, **kwargs) -> AsyncIterator[str]:
+    """Yield completion text (or tool-call arguments) as it streams, or the cached response in one piece."""
+    if cached_response is not None:
+        yield cached_response
+        return
+    async for chunk in backend.llm.astream(messages, **kwargs):
+        text = chunk_text(chunk)
+        if text:
+            yield text
+
+def plan_invoker(user_id: Optional[str]):
+    """Coroutine function that makes one admitted plan-generation call."""
+    async def invoke(messages: List):
+        return await backend.llm_scheduler.ainvoke(backend.llm, messages, "standard", user_id,
+                                                   **backend.PLAN_CALL_KWARGS)
+    return invoke
+
+@async_app.before_serving
+async def start_background_work():
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix="asgi-sync"))
+    os.makedirs('exports', exist_ok=True)
+    await run_sync(backend.export_cache.sweep)
+    # Deliver Node.js notifications from the event loop instead of the worker thread
+    async_app.outbox_task = asyncio.ensure_future(backend.notification_outbox.run_async())
+
+@async_app.after_serving
+async def stop_background_work():
+    backend.notification_outbox.stop()
+    try:
+        await asyncio.wait_for(async_app.outbox_task, 5)
+    except asyncio.TimeoutError:
+        logger.warning("Outbox delivery task did not stop in time")
+
+@async_app.before_request
+async def start_request_timer():
+    g.request_started = time.perf_counter()
+    llm_route.set(request.url_rule.rule)
+
+@async_app.after_request
+async def finish_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        backend.request_seconds.observe(time.perf_counter() - started, **route_labels(response.status_code))
+    # Same policy as flask_cors defaults on the Flask app
+    if request.headers.get('Origin'):
+        response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
+@async_app.route('/api/ai/generate-action-plan', methods=['POST'])
+async def generate_action_plan():
+    """Generate an action plan; same contract as the Flask route."""
+    try:
+        data = await request.get_json()
+        user_request = data.get('request', '')
+        event_type = data.get('eventType', 'general')
+        channel_id = data.get('channelId')
+        user_id = data.get('userId')
+        ai_context = data.get('aiContext', {})
+        
+        if not user_request:
+            return jsonify({"error": "Request is required"}), 400
+        
+        with backend.plan_stage_seconds.time(stage="prompt_build"):
+            cache_key, ai_response, messages = await run_sync(backend.prepare_action_plan, user_request, event_type,
+                                                              ai_context, channel_id, backend.load_prompt())
+        cached = ai_response is not None
+        
+        if wants_stream(request, data):
+            lease = None if cached else await backend.llm_scheduler.aacquire("standard", user_id)
+            return streaming_response(stream_action_plan(messages, cache_key, ai_response, {
+                "user_request": user_request,
+                "event_type": event_type,
+                "channel_id": channel_id,
+                "user_id": user_id
+            }, lease))
+        
+        invoke_plan = plan_invoker(user_id)
+        if not cached:
+            with backend.plan_stage_seconds.time(stage="llm_call"):
+                ai_response = await ainvoke_text(invoke_plan, messages)
+        
+        try:
+            with backend.plan_stage_seconds.time(stage="json_parse"):
+                parsed_plan = await acomplete_structured(ActionPlanResponse, messages, invoke_plan,
+                                                         backend.STRUCTURED_OUTPUT_RETRIES, text=ai_response)
+            if not cached:
+                backend.plan_cache.set(cache_key, json.dumps(parsed_plan, ensure_ascii=False))
+            
+            plan_id = await run_sync(backend.store_generated_plan, parsed_plan, user_request, event_type,
+                                     channel_id, user_id)
+            
+            return jsonify({
+                "success": True,
+                "plan_id": plan_id,
+                "action_plan": parsed_plan.get("action_plan", {}),
+                "cached": cached,
+                "message": "Action plan generated successfully"
+            })
+        
+        except StructuredOutputError as e:
+            logger.error(f"Failed to parse AI response as an action plan: {str(e).splitlines()[0]}")
+            return jsonify({
+                "success": False,
+                "error": "Failed to generate structured action plan",
+                "raw_response": e.text[:500]
+            }), 500
+    
+    except SchedulerBusy as e:
+        return too_many_requests(e)
+    except Exception as e:
+        logger.error(f"Generate action plan error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+async def stream_action_plan(messages: List, cache_key: str, cached_response, plan_info: Dict,
+                             lease=None) -> AsyncIterator[str]:
+    """Stream action-plan cards as Server-Sent Events as soon as each one is complete."""
+    parser = IncrementalCardParser()
+    card_index = 0
+    try:
+        started = time.perf_counter()
+        ai_response = None
+        try:
+            async for content in llm_chunks(messages, cached_response, **backend.PLAN_CALL_KWARGS):
+                for card in parser.feed(content):
+                    yield sse_event({"index": card_index, "card": card}, event="card")
+                    card_index += 1
+        except Exception as e:
+            # The provider rejected malformed tool arguments; repair what it generated
+            ai_response = failed_generation(e)
+            if ai_response is None:
+                raise
+        if cached_response is None:
+            backend.plan_stage_seconds.observe(time.perf_counter() - started, stage="llm_call")
+        if lease:
+            lease.release()
+        
+        if ai_response is None:
+            ai_response = parser.text
+        try:
+            with backend.plan_stage_seconds.time(stage="json_parse"):
+                parsed_plan = await acomplete_structured(ActionPlanResponse, messages,
+                                                         plan_invoker(plan_info["user_id"]),
+                                                         backend.STRUCTURED_OUTPUT_RETRIES, text=ai_response)
+        except StructuredOutputError as e:
+            logger.error(f"Failed to parse streamed AI response as an action plan: {str(e).splitlines()[0]}")
+            yield sse_event({
+                "success": False,
+                "error": "Failed to generate structured action plan",
+                "raw_response": e.text[:500]
+            }, event="error")
+            return
+        
+        if cached_response is None:
+            backend.plan_cache.set(cache_key, json.dumps(parsed_plan, ensure_ascii=False))
+        plan_id = await run_sync(
+            backend.store_generated_plan, parsed_plan, plan_info["user_request"], plan_info["event_type"],
+            plan_info["channel_id"], plan_info["user_id"]
+        )
+        
+        yield sse_event({
+            "success": True,
+            "plan_id": plan_id,
+            "action_plan": parsed_plan.get("action_plan", {}),
+            "cards_streamed": card_index,
+            "cached": cached_response is not None,
+            "message": "Action plan generated successfully"
+        }, event="plan")
+    except Exception as e:
+        logger.error(f"Generate action plan stream error: {str(e)}")
+        yield sse_event({"success": False, "error": "Internal server error"}, event="error")
+    finally:
+        # Also runs when the client disconnects and the generator is closed
+        if lease:
+            lease.release()
+
+@async_app.route('/api/ai/chat', methods=['POST'])
+async def ai_chat():
+    """Chat for event planning assistance; same contract as the Flask route."""
+    try:
+        data = await request.get_json()
+        message = data.get('message')
+        user_id = data.get('userId')
+        channel_id = data.get('channelId')
+        ai_context = data.get('aiContext', {})
+        event_type = data.get('eventType', 'general')
+        
+        if not message:
+            return jsonify({"error": "Message is required"}), 400
+        
+        # The first use of a channel may load its history from MongoDB
+        memory_key = backend.conversation_history.key(channel_id, user_id)
+        messages, conversation_context = await run_sync(backend.build_chat_messages, memory_key, channel_id,
+                                                        backend.build_chat_system_prompt(event_type, ai_context),
+                                                        message)
+        
+        cache_scope = backend.chat_cache.make_scope(event_type, ai_context, conversation_context)
+        cached = backend.chat_cache.get(cache_scope, message)
+        
+        if wants_stream(request, data):
+            lease = None if cached else await backend.llm_scheduler.aacquire("interactive", user_id)
+            return streaming_response(stream_chat_response(messages, {
+                "channel_id": channel_id,
+                "user_id": user_id,
+                "event_type": event_type
+            }, message, lease, cache_scope, cached, memory_key))
+        
+        if cached:
+            ai_response, similarity = cached
+        else:
+            result = await backend.llm_scheduler.ainvoke(backend.llm, messages, "interactive", user_id)
+            ai_response = result.content
+            backend.chat_cache.set(cache_scope, message, ai_response)
+        
+        backend.record_chat_turn(memory_key, channel_id, user_id, message, ai_response)
+        
+        response = {
+            "success": True,
+            "response": ai_response,
+            "timestamp": datetime.now().isoformat()
+        }
+        if cached:
+            response["cached"] = True
+            response["similarity"] = round(similarity, 3)
+        return jsonify(response)
+    
+    except SchedulerBusy as e:
+        return too_many_requests(e)
+    except Exception as e:
+        logger.error(f"AI chat error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+async def stream_chat_response(messages: List, metadata: Dict, message: str, lease=None,
+                               cache_scope: Optional[str] = None, cached=None,
+                               memory_key: Optional[str] = None) -> AsyncIterator[str]:
+    """Stream an LLM completion, or a cached answer in one token, as Server-Sent Events."""
+    started = time.perf_counter()
+    first_token_ms = None
+    chunk_count = 0
+    parts = []
+    try:
+        async for content in llm_chunks(messages, cached[0] if cached else None):
+            if first_token_ms is None:
+                first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+            chunk_count += 1
+            parts.append(content)
+            yield sse_event({"token": content}, event="token")
+    except Exception as e:
+        logger.error(f"AI chat stream error: {str(e)}")
+        yield sse_event({"success": False, "error": "Internal server error"}, event="error")
+        return
+    finally:
+        if lease:
+            lease.release()
+    
+    ai_response = "".join(parts)
+    if not cached and cache_scope:
+        backend.chat_cache.set(cache_scope, message, ai_response)
+    backend.record_chat_turn(memory_key, metadata.get("channel_id"), metadata.get("user_id"), message, ai_response)
+    
+    yield sse_event({
+        "success": True,
+        "timestamp": datetime.now().isoformat(),
+        "metadata": {
+            **metadata,
+            "model": backend.LLM_MODEL,
+            "cached": bool(cached),
+            "similarity": round(cached[1], 3) if cached else None,
+            "chunks": chunk_count,
+            "time_to_first_token_ms": first_token_ms,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+    }, event="done")
+
+@async_app.route('/api/ai/suggest-roles', methods=['POST'])
+async def suggest_roles():
+    """Suggest roles based on event type and team size."""
+    try:
+        data = await request.get_json()
+        event_type = data.get('eventType', 'general')
+        team_size = data.get('teamSize', 5)
+        event_scale = data.get('eventScale', 'medium')
+        
+        catalogue = backend.role_catalogue
+        roles = catalogue.get(event_type, team_size, event_scale)
+        if roles is not None:
+            return jsonify({"success": True, "roles": roles, "cached": True})
+        if catalogue.enabled:
+            # Generate the catalogue entry itself so the rest of the size bucket is served from it
+            event_type, team_size, event_scale = catalogue.parse_key(catalogue.key(event_type, team_size, event_scale))
+        
+        prompt = backend.build_role_prompt(event_type, team_size, event_scale)
+        messages = [
+            SystemMessage(content=backend.load_prompt()),
+            HumanMessage(content=prompt)
+        ]
+        
+        async def invoke_roles(role_messages: List):
+            return await backend.llm_scheduler.ainvoke(backend.llm, role_messages, "interactive", data.get('userId'),
+                                                       **backend.ROLE_CALL_KWARGS)
+        
+        try:
+            role_suggestions = await acomplete_structured(RoleSuggestions, messages, invoke_roles,
+                                                          backend.STRUCTURED_OUTPUT_RETRIES)
+            await run_sync(catalogue.put, event_type, team_size, event_scale, role_suggestions["roles"])
+            return jsonify({
+                "success": True,
+                "roles": role_suggestions["roles"],
+                "cached": False
+            })
+        except StructuredOutputError:
+            return jsonify({
+                "success": False,
+                "error": "Failed to parse role suggestions"
+            }), 500
+    
+    except SchedulerBusy as e:
+        return too_many_requests(e)
+    except Exception as e:
+        logger.error(f"Suggest roles error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@async_app.route('/api/ai/export-plan/<format>', methods=['POST'])
+async def export_plan(format):
+    """Export an action plan as PDF or Excel.
+
+    Rendering always runs on the export process pool and is awaited, so the
+    event loop never renders. Direct downloads (?download=1) are served from
+    the rendered cache file instead of an in-memory buffer.
+    """
+    try:
+        data = await request.get_json()
+        plan_id = data.get('planId')
+        
+        if not plan_id:
+            return jsonify({"error": "Plan ID is required"}), 400
+        
+        plan_data = await run_sync(backend.plan_lookup.get, plan_id)
+        if not plan_data:
+            return jsonify({"error": "Plan not found"}), 404
+        
+        export_format = format.lower()
+        if export_format not in ('pdf', 'excel'):
+            return jsonify({"error": "Invalid format. Use 'pdf' or 'excel'"}), 400
+        
+        direct_download = request.args.get('download', str(data.get('download', ''))).lower() in ('1', 'true', 'yes')
+        background = request.args.get('async', str(data.get('async', ''))).lower() in ('1', 'true', 'yes')
+        
+        with backend.export_stage_seconds.time(format=export_format, stage="cache_lookup"):
+            file_path = await run_sync(backend.export_cache.lookup, plan_data, export_format)
+        cached = file_path is not None
+        
+        if not cached:
+            try:
+                job_id = backend.export_queue.submit(export_format, plan_data)
+            except ExportQueueFull as e:
+                response = jsonify({"error": str(e)})
+                response.headers['Retry-After'] = '5'
+                return response, 429
+            
+            if background and not direct_download:
+                return jsonify({
+                    "success": True,
+                    "jobId": job_id,
+                    "statusUrl": f"/api/ai/export-jobs/{job_id}",
+                    "resultUrl": f"/api/ai/export-jobs/{job_id}/result"
+                }), 202
+            file_path = await asyncio.wrap_future(backend.export_queue.future(job_id))
+        
+        if direct_download:
+            return await send_file(os.path.abspath(file_path), mimetype=MIME_TYPES[export_format], as_attachment=True)
+        
+        response = {
+            "success": True,
+            "downloadUrl": f"/api/ai/download/{os.path.basename(file_path)}",
+            "fileName": os.path.basename(file_path)
+        }
+        if cached:
+            response["cached"] = True
+        return jsonify(response)
+    
+    except Exception as e:
+        logger.error(f"Export plan error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+def with_body_chunk(wsgi_app):
+    """Make every WSGI response yield at least one chunk.
+
+    hypercorn's WSGI adapter sends the status line with the first body chunk,
+    so bodiless responses (CORS preflights, 204s) would otherwise fail.
+    """
+    def app(environ, start_response):
+        body = wsgi_app(environ, start_response)
+        
+        def chunks():
+            try:
+                empty = True
+                for chunk in body:
+                    empty = False
+                    yield chunk
+                if empty:
+                    yield b""
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+        
+        return chunks()
+    
+    return app
+
+class RouteDispatcher:
+    """Send requests for routes async_app defines to it, and everything else to the WSGI app."""
+
+    def __init__(self, asgi_app: Quart, wsgi_app, max_body_size: int):
+        self.asgi_app = asgi_app
+        self.wsgi_app = AsyncioWSGIMiddleware(with_body_chunk(wsgi_app), max_body_size)
+        self._routes = asgi_app.url_map.bind('')
+    
+    async def __call__(self, scope, receive, send):
+        # Lifespan events go to Quart so before_serving/after_serving run
+        if scope["type"] != "http" or self._is_async_route(scope):
+            await self.asgi_app(scope, receive, send)
+        else:
+            await self.wsgi_app(scope, receive, send)
+    
+    def _is_async_route(self, scope) -> bool:
+        if scope["method"] == "OPTIONS":
+            return False  # flask_cors answers preflights
+        try:
+            self._routes.match(scope["path"], method=scope["method"])
+            return True
+        except HTTPException:
+            return False
+
+application = RouteDispatcher(async_app, backend.app, ASGI_MAX_BODY_BYTES)
+
+if __name__ == '__main__':
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+    
+    config = Config()
+    config.bind = [f"0.0.0.0:{int(os.getenv('FLASK_PORT', 5001))}"]
+    asyncio.run(serve(application, config))
@@ -0,0 +1,79 @@
+"""Compare the regular and write-only ExcelGenerator paths on synthetic plans.
+
+Usage (from ai-backend/):
+    python -m benchmarks.bench_excel [--sizes 10,1000,50000] [--repeat 3] [--memory]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.excel_generator import ExcelGenerator
+
+
+def synthetic_plan(task_count: int, tasks_per_phase: int = 50) -> dict:
+    """Build a plan with task_count checklist tasks spread over phases."""
+    phases = []
+    for start in range(0, task_count, tasks_per_phase):
+        index = len(phases) + 1
+        phases.append({
+            "phase": f"Phase {index}",
+            "duration": f"{index} weeks",
+            "tasks": [f"Task {n} for phase {index}" for n in range(start, min(start + tasks_per_phase, task_count))],
+            "dependencies": [f"Phase {index - 1}"] if index > 1 else []
+        })
+    return {
+        "plan_id": f"bench-{task_count}",
+        "event_type": "conference",
+        "ai_plan": {
+            "timeline": phases,
+            "roles": [{"title": f"Role {n}", "responsibilities": ["plan", "execute"], "skills": ["coordination"]}
+                      for n in range(max(1, task_count // 100))],
+            "budget_breakdown": {"categories": [{"category": f"Category {n}", "amount": f"₹{n * 1000}", "percentage": 5}
+                                                for n in range(20)]}
+        }
+    }
+
+
+def measure(generator: ExcelGenerator, plan: dict, write_only: bool, repeat: int, memory: bool):
+    timings = []
+    peak = 0
+    size = 0
+    for _ in range(repeat):
+        buffer = io.BytesIO()
+        if memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        generator.generate_plan_excel(plan, buffer, write_only=write_only)
+        timings.append(time.perf_counter() - started)
+        if memory:
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        size = buffer.tell()
+    return min(timings), peak, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10,1000,50000', help='comma-separated task counts')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement (best is reported)')
+    parser.add_argument('--memory', action='store_true', help='also trace peak Python memory (slows rendering)')
+    args = parser.parse_args()
+    
+    generator = ExcelGenerator()
+    print(f"{'tasks':>8} {'mode':>10} {'best ms':>10} {'peak MiB':>10} {'bytes':>10}")
+    for task_count in (int(size) for size in args.sizes.split(',')):
+        plan = synthetic_plan(task_count)
+        for write_only in (False, True):
+            best, peak, size = measure(generator, plan, write_only, args.repeat, args.memory)
+            mode = 'write-only' if write_only else 'regular'
+            peak_text = f"{peak / 1048576:.1f}" if args.memory else "-"
+            print(f"{task_count:>8} {mode:>10} {best * 1000:>10.1f} {peak_text:>10} {size:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Micro-benchmark PDFGenerator and ExcelGenerator over plan sizes.
+
+Usage (from ai-backend/):
+    python -m benchmarks.bench_exports [--sizes 10,100,1000] [--repeat 5] [--save baseline.json]
+    python -m benchmarks.bench_exports --compare baseline.json [--tolerance 0.25]
+
+--compare exits with status 1 when any median is more than --tolerance slower
+than the baseline, so it can gate a deploy.
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_excel import synthetic_plan
+from benchmarks.fake_llm import canned_action_plan
+from services.excel_generator import ExcelGenerator
+from services.pdf_generator import PDFGenerator
+
+
+def export_plan(size: int) -> dict:
+    """A stored plan carrying both the PDF (ai_response) and Excel (ai_plan) shapes at the given size."""
+    plan = synthetic_plan(size)
+    plan["user_request"] = f"Benchmark plan with {size} items"
+    plan["ai_response"] = canned_action_plan(card_count=size)
+    return plan
+
+
+def measure(render, plan: dict, repeat: int):
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        buffer = io.BytesIO()
+        started = time.perf_counter()
+        render(plan, buffer)
+        timings.append(time.perf_counter() - started)
+        size = buffer.tell()
+    return statistics.median(timings), min(timings), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10,100,1000', help='comma-separated plan sizes (cards and tasks)')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement')
+    parser.add_argument('--formats', default='pdf,excel', help='comma-separated formats to run')
+    parser.add_argument('--save', help='write results to this JSON file as a baseline')
+    parser.add_argument('--compare', help='compare against a baseline JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed median slowdown for --compare')
+    args = parser.parse_args()
+
+    renderers = {"pdf": PDFGenerator().generate_plan_pdf, "excel": ExcelGenerator().generate_plan_excel}
+    formats = [fmt.strip() for fmt in args.formats.split(',') if fmt.strip()]
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+
+    results = {}
+    regressions = []
+    print(f"{'format':>6} {'size':>7} {'median ms':>10} {'best ms':>10} {'bytes':>10} {'vs base':>8}")
+    for size in (int(size) for size in args.sizes.split(',')):
+        plan = export_plan(size)
+        for fmt in formats:
+            median, best, output_bytes = measure(renderers[fmt], plan, args.repeat)
+            key = f"{fmt}:{size}"
+            results[key] = {"median_ms": round(median * 1000, 2), "best_ms": round(best * 1000, 2), "bytes": output_bytes}
+            change = "-"
+            if key in baseline:
+                ratio = results[key]["median_ms"] / baseline[key]["median_ms"] - 1
+                change = f"{ratio:+.0%}"
+                if ratio > args.tolerance:
+                    regressions.append(key)
+            print(f"{fmt:>6} {size:>7} {median * 1000:>10.1f} {best * 1000:>10.1f} {output_bytes:>10} {change:>8}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    if regressions:
+        print(f"\nSlower than baseline by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
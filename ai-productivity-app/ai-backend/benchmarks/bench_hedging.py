@@ -0,0 +1,106 @@
+"""Measure LLM tail latency with and without hedging, against fake models with an injected slow tail.
+
+Usage (from ai-backend/):
+    python -m benchmarks.bench_hedging [--calls 400] [--concurrency 8] [--latency 0.1] [--jitter 0.3]
+        [--tail-probability 0.02] [--tail-multiplier 10] [--backup-latency 0.05] [--budget 0.1] [--mode invoke]
+
+Each configuration draws from the same seeded latency distribution: no hedging, hedging to
+the same model, and hedging to a faster backup model. Reported per run:
+p50/p95/p99/max latency (time to first chunk for --mode stream), hedges as
+a fraction of calls (the extra upstream spend) and how many hedges the
+backup won.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import HumanMessage
+
+from benchmarks.fake_llm import FakePlanLLM
+from services.llm_hedging import HedgedLLM
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def make_models(args, hedge: str):
+    primary = FakePlanLLM(latency=args.latency, latency_jitter=args.jitter, latency_distribution='lognormal',
+                          tail_probability=args.tail_probability, tail_multiplier=args.tail_multiplier,
+                          tokens_per_second=0, chat_words=20, seed=args.seed)
+    if hedge == 'backup model':
+        backup = FakePlanLLM(latency=args.backup_latency, latency_jitter=args.jitter, latency_distribution='lognormal',
+                             tokens_per_second=0, chat_words=20, seed=args.seed + 1)
+    else:
+        backup = None
+    hedger = HedgedLLM(primary, backup, percentile=args.percentile, budget=args.budget)
+    hedger.enabled = hedge != 'off'
+    hedger.route_budgets = {}  # Calls here carry the default "background" route label
+    hedger.min_samples = args.min_samples
+    return hedger
+
+
+def timed_call(hedger: HedgedLLM, mode: str, n: int) -> float:
+    messages = [HumanMessage(content=f"Benchmark question {n}")]
+    started = time.perf_counter()
+    if mode == 'stream':
+        next(iter(hedger.stream(messages)))
+    else:
+        hedger.invoke(messages)
+    return time.perf_counter() - started
+
+
+async def run_async(hedger: HedgedLLM, calls: int, concurrency: int) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(n: int) -> float:
+        async with semaphore:
+            started = time.perf_counter()
+            await hedger.ainvoke([HumanMessage(content=f"Benchmark question {n}")])
+            return time.perf_counter() - started
+
+    return list(await asyncio.gather(*(call(n) for n in range(calls))))
+
+
+def run(hedger: HedgedLLM, args) -> list:
+    if args.mode == 'ainvoke':
+        return asyncio.run(run_async(hedger, args.calls, args.concurrency))
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        return list(pool.map(lambda n: timed_call(hedger, args.mode, n), range(args.calls)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--mode', choices=('invoke', 'stream', 'ainvoke'), default='invoke')
+    parser.add_argument('--latency', type=float, default=0.1, help='median primary time to first token, seconds')
+    parser.add_argument('--jitter', type=float, default=0.3, help='sigma of log latency')
+    parser.add_argument('--tail-probability', type=float, default=0.02, help='fraction of primary calls that stall')
+    parser.add_argument('--tail-multiplier', type=float, default=10.0)
+    parser.add_argument('--backup-latency', type=float, default=0.05, help='median latency of the faster backup model')
+    parser.add_argument('--percentile', type=float, default=0.95, help='hedge after this latency percentile')
+    parser.add_argument('--budget', type=float, default=0.1, help='hedges earned per call')
+    parser.add_argument('--min-samples', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{'hedging':>14} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'hedged':>7} {'backup won':>10}")
+    for hedge in ('off', 'same model', 'backup model'):
+        hedger = make_models(args, hedge)
+        timings = run(hedger, args)
+        routes = hedger.stats()["routes"]
+        route = routes.get("background", {"hedges": 0, "backup_won": 0})
+        print(f"{hedge:>14} {percentile(timings, 0.5) * 1000:>8.1f} {percentile(timings, 0.95) * 1000:>8.1f} "
+              f"{percentile(timings, 0.99) * 1000:>8.1f} {max(timings) * 1000:>8.1f} "
+              f"{route['hedges'] / args.calls:>7.1%} {route['backup_won']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Measure ChannelIndex indexing and BM25 search latency on synthetic channel history.
+
+Usage (from ai-backend/):
+    python -m benchmarks.bench_retrieval [--sizes 1000,10000,100000] [--queries 200] [--seed 7] [--memory]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.channel_index import ChannelIndex
+
+TOPIC_WORDS = """
+venue catering budget sponsors volunteers stage sound lighting tickets registration marketing posters
+instagram schedule speakers workshop hackathon prizes judges security parking transport accommodation
+decoration photography videography permits insurance food drinks vendors contracts rehearsal timeline
+guests invitations seating tents generator wifi badges merchandise feedback survey logistics rain backup
+""".split()
+
+
+def vocabulary(size: int, rng: random.Random) -> list:
+    """Topic words followed by random filler words; earlier words are drawn more often."""
+    filler = {"".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(4, 9)))
+              for _ in range(size)}
+    return TOPIC_WORDS + sorted(filler)
+
+
+def zipf_weights(count: int) -> list:
+    return [1 / (rank + 1) for rank in range(count)]
+
+
+def sentence(words: list, weights: list, rng: random.Random, length: int) -> str:
+    return " ".join(rng.choices(words, weights=weights, k=length))
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000', help='comma-separated interactions per channel')
+    parser.add_argument('--queries', type=int, default=200, help='searches timed per size')
+    parser.add_argument('--vocabulary', type=int, default=20000, help='distinct words in the synthetic history')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--memory', action='store_true', help='also trace peak Python memory while indexing')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    words = vocabulary(args.vocabulary, rng)
+    weights = zipf_weights(len(words))
+
+    print(f"{'docs':>8} {'index s':>8} {'us/add':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'snippets':>8} {'peak MiB':>9}")
+    for size in (int(value) for value in args.sizes.split(',')):
+        documents = [(sentence(words, weights, rng, rng.randint(6, 20)), sentence(words, weights, rng, rng.randint(30, 120)))
+                     for _ in range(size)]
+        index = ChannelIndex(max_docs=size)
+        index.enabled = True
+        index.load_limit = 0
+
+        if args.memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        for message, response in documents:
+            index.add_interaction("bench-channel", message, response)
+        elapsed = time.perf_counter() - started
+        peak = 0
+        if args.memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        timings = []
+        found = 0
+        for _ in range(args.queries):
+            query = sentence(words, weights, rng, rng.randint(5, 15))
+            started = time.perf_counter()
+            snippets = index.search("bench-channel", query)
+            timings.append(time.perf_counter() - started)
+            found += len(snippets)
+
+        peak_text = f"{peak / 1048576:.1f}" if args.memory else "-"
+        print(f"{size:>8} {elapsed:>8.2f} {elapsed / size * 1e6:>8.1f} {percentile(timings, 0.5) * 1000:>8.2f} "
+              f"{percentile(timings, 0.95) * 1000:>8.2f} {percentile(timings, 0.99) * 1000:>8.2f} "
+              f"{found / args.queries:>8.1f} {peak_text:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""Deterministic stand-in for ChatGroq so benchmarks never spend provider quota.
+
+The model sleeps for a configurable time-to-first-token (optionally drawn
+from a uniform or lognormal distribution with an injected slow tail), then
+emits canned output at a fixed token rate. Plan prompts get action-plan JSON with
+card_count cards, role prompts get a role list, section prompts get the
+matching section of that plan and anything else gets a short chat reply. Calls that force a tool (tools=[...]) get the same JSON
+back as the tool call's arguments.
+"""
+import asyncio
+import json
+import random
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+
+def canned_action_plan(card_count: int = 8, tasks_per_card: int = 4) -> Dict[str, Any]:
+    """Build an action plan shaped like the generate-action-plan prompt asks for."""
+    cards = []
+    for n in range(1, card_count + 1):
+        cards.append({
+            "id": f"card_{n}",
+            "title": f"Action item {n}",
+            "description": f"Coordinate workstream {n} with the relevant team leads and vendors.",
+            "category": ("planning", "execution", "logistics", "marketing", "finance")[n % 5],
+            "priority": ("high", "medium", "low")[n % 3],
+            "timeline": f"{n % 4 + 1} weeks",
+            "budget_estimate": f"₹{n * 5000}",
+            "tasks": [{"task": f"Task {t} of item {n}", "assignee": f"Role {t % 3 + 1}"}
+                      for t in range(1, tasks_per_card + 1)],
+            "resources": ["venue", "volunteers"],
+            "dependencies": [f"card_{n - 1}"] if n > 1 else []
+        })
+    return {
+        "action_plan": {
+            "title": "Benchmark Event Plan",
+            "overview": "Synthetic plan produced by the benchmark fake LLM.",
+            "cards": cards,
+            "timeline": {
+                "total_duration": "8 weeks",
+                "phases": [{"phase": f"Phase {p}", "duration": "2 weeks",
+                            "key_activities": [f"Activity {p}.{a}" for a in range(1, 4)]}
+                           for p in range(1, 5)]
+            },
+            "budget_summary": {
+                "total_estimate": f"₹{card_count * 5000}",
+                "breakdown": [{"category": f"Category {c}", "amount": f"₹{c * 10000}", "percentage": 20}
+                              for c in range(1, 6)]
+            },
+            "team_roles": [{"role": f"Role {r}", "responsibilities": ["plan", "execute"],
+                            "skills_required": ["coordination"]} for r in range(1, 4)],
+            "success_metrics": ["attendance", "budget adherence"],
+            "risk_factors": [{"risk": "vendor delay", "impact": "medium", "mitigation": "backup vendor"}]
+        }
+    }
+
+
+def canned_roles(role_count: int = 5) -> List[Dict[str, Any]]:
+    """Build a role list like the suggest-roles prompt asks for."""
+    return [{"title": f"Role {n}", "priority": "high" if n < 3 else "medium",
+             "responsibilities": ["coordinate", "report"], "skills": ["communication"],
+             "experience": "intermediate", "time_commitment": "5 hours/week"}
+            for n in range(1, role_count + 1)]
+
+
+class FakePlanLLM(BaseChatModel):
+    """Chat model with scripted latency and canned, prompt-dependent output."""
+
+    latency: float = 0.5
+    """Seconds before the first token."""
+    latency_jitter: float = 0.0
+    """Spread of latency, drawn from a seeded RNG: a +/- fraction, or sigma for lognormal."""
+    latency_distribution: str = "uniform"
+    """Shape of the jitter: "uniform" around latency, or "lognormal" with median latency."""
+    tail_probability: float = 0.0
+    """Fraction of calls that stall before the first token, modelling a provider's latency tail."""
+    tail_multiplier: float = 10.0
+    """Time to first token of a stalled call, as a multiple of its drawn latency."""
+    tokens_per_second: float = 200.0
+    """Output rate once generation starts; 0 disables the delay."""
+    card_count: int = 8
+    """Cards in canned action plans (controls response size)."""
+    chat_words: int = 60
+    """Words in canned chat replies."""
+    seed: int = 0
+    
+    _rng: Optional[random.Random] = PrivateAttr(default=None)
+    
+    @property
+    def _llm_type(self) -> str:
+        return "fake-plan-llm"
+    
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"latency": self.latency, "tokens_per_second": self.tokens_per_second, "card_count": self.card_count}
+    
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        tokens = self._tokens(messages)
+        time.sleep(self._first_token_delay() + self._token_delay() * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=self._message("".join(tokens), kwargs))])
+    
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self._first_token_delay())
+        delay = self._token_delay()
+        started = time.perf_counter()
+        for index, token in enumerate(self._tokens(messages)):
+            # Sleep to a schedule rather than per token so timer overhead doesn't accumulate
+            behind = started + index * delay - time.perf_counter()
+            if behind > 0.001:
+                time.sleep(behind)
+            chunk = ChatGenerationChunk(message=self._chunk(token, index, kwargs))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+    
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self._first_token_delay() + self._token_delay() * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=self._message("".join(tokens), kwargs))])
+    
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self._first_token_delay())
+        delay = self._token_delay()
+        started = time.perf_counter()
+        for index, token in enumerate(self._tokens(messages)):
+            behind = started + index * delay - time.perf_counter()
+            if behind > 0.001:
+                await asyncio.sleep(behind)
+            chunk = ChatGenerationChunk(message=self._chunk(token, index, kwargs))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+    
+    def response_text(self, messages: List[BaseMessage]) -> str:
+        """Return the canned response for a prompt."""
+        prompt = " ".join(str(message.content) for message in messages if message.type == "human")
+        if "Generate a comprehensive action plan" in prompt:
+            return json.dumps(canned_action_plan(self.card_count), ensure_ascii=False)
+        if "Suggest optimal team roles" in prompt:
+            return json.dumps({"roles": canned_roles()}, ensure_ascii=False)
+        if "Revise one section of an existing event action plan" in prompt:
+            plan = canned_action_plan(self.card_count)["action_plan"]
+            for section in ("timeline", "budget_summary", "risk_factors"):
+                if f"Current {section.replace('_', ' ')}:" in prompt:
+                    return json.dumps({section: plan[section]}, ensure_ascii=False)
+            return json.dumps({"card": plan["cards"][0]}, ensure_ascii=False)
+        return " ".join(f"word{n}" for n in range(self.chat_words))
+    
+    @staticmethod
+    def _tool_name(kwargs: Dict[str, Any]) -> Optional[str]:
+        # Forced tool calls (tools=[...] with tool_choice) answer through the tool's arguments
+        tools = kwargs.get("tools") or []
+        return tools[0]["function"]["name"] if tools else None
+    
+    def _message(self, text: str, kwargs: Dict[str, Any]) -> AIMessage:
+        name = self._tool_name(kwargs)
+        if name is None:
+            return AIMessage(content=text)
+        return AIMessage(content="", tool_calls=[{"name": name, "args": json.loads(text), "id": "call_0"}])
+    
+    def _chunk(self, token: str, index: int, kwargs: Dict[str, Any]) -> AIMessageChunk:
+        name = self._tool_name(kwargs)
+        if name is None:
+            return AIMessageChunk(content=token)
+        first = index == 0
+        return AIMessageChunk(content="", tool_call_chunks=[
+            {"name": name if first else None, "args": token, "id": "call_0" if first else None, "index": 0}])
+    
+    def _tokens(self, messages: List[BaseMessage]) -> List[str]:
+        # Roughly four characters per token, like the real tokenizer
+        text = self.response_text(messages)
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+    
+    def _first_token_delay(self) -> float:
+        if not (self.latency_jitter or self.tail_probability):
+            return self.latency
+        if self._rng is None:
+            self._rng = random.Random(self.seed)
+        if self.latency_distribution == "lognormal":
+            delay = self.latency * self._rng.lognormvariate(0.0, self.latency_jitter)
+        else:
+            delay = self.latency * (1 + self._rng.uniform(-self.latency_jitter, self.latency_jitter))
+        if self.tail_probability and self._rng.random() < self.tail_probability:
+            delay *= self.tail_multiplier
+        return max(0.0, delay)
+    
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
@@ -0,0 +1,378 @@
+"""Load-test every AI backend route offline, against a fake LLM and a stub Node.js server.
+
+Usage (from ai-backend/):
+    python -m benchmarks.load_test [--routes generate,chat_stream] [--concurrency 8] [--requests 100]
+        [--latency 0.5] [--tokens-per-second 200] [--cards 8] [--node-latency 0] [--json results.json]
+        [--latency-distribution lognormal --latency-jitter 0.3 --tail-probability 0.02 --backup-latency 0.2]
+
+The app runs in-process on a threaded WSGI server. ChatGroq is replaced with
+benchmarks.fake_llm.FakePlanLLM and NODE_SERVER_URL points at
+benchmarks.stub_node_server, so no provider quota or external service is used.
+Each route is driven separately; throughput and p50/p95/p99 latency are
+reported per route, followed by the hedged-call outcomes of each route.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_llm import FakePlanLLM
+from benchmarks.stub_node_server import start_stub_server
+
+
+class Context:
+    """Shared state for scenarios: server URL, per-thread sessions and seeded plans."""
+
+    def __init__(self, base_url: str, users: int, prompt_pool: int):
+        self.base_url = base_url
+        self.users = users
+        self.prompt_pool = prompt_pool
+        self.plan_ids: List[str] = []
+        self.file_names: List[str] = []
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}{path}"
+
+    def user(self, n: int) -> str:
+        return f"bench-user-{n % self.users}"
+
+    def prompt(self, n: int) -> int:
+        """Prompt number for request n; a pool makes requests repeat and hit the caches."""
+        return n % self.prompt_pool if self.prompt_pool else n
+
+    def plan(self, n: int) -> str:
+        return self.plan_ids[n % len(self.plan_ids)]
+
+
+def check(response: requests.Response, expected: Optional[int] = 200) -> requests.Response:
+    body = response.content  # Read streams to the end
+    if expected is not None and response.status_code != expected:
+        raise RuntimeError(f"HTTP {response.status_code}: {body[:200]!r}")
+    if response.headers.get('Content-Type', '').startswith('text/event-stream') and b'event: error' in body:
+        raise RuntimeError(f"stream error: {body[-200:]!r}")
+    return response
+
+
+def plan_request(ctx: Context, n: int) -> dict:
+    return {"request": f"Plan a college tech fest, variant {ctx.prompt(n)}", "eventType": "festival",
+            "channelId": "bench-channel", "userId": ctx.user(n)}
+
+
+def chat_request(ctx: Context, n: int) -> dict:
+    return {"message": f"How should we staff the registration desk? ({ctx.prompt(n)})", "eventType": "festival",
+            "userId": ctx.user(n)}
+
+
+def run_health(ctx: Context, n: int) -> None:
+    check(ctx.session.get(ctx.url('/health')))
+
+
+def run_metrics(ctx: Context, n: int) -> None:
+    check(ctx.session.get(ctx.url('/metrics')))
+
+
+def run_generate(ctx: Context, n: int) -> None:
+    check(ctx.session.post(ctx.url('/api/ai/generate-action-plan'), json=plan_request(ctx, n)))
+
+
+def run_generate_stream(ctx: Context, n: int) -> None:
+    check(ctx.session.post(ctx.url('/api/ai/generate-action-plan?stream=1'), json=plan_request(ctx, n), stream=True))
+
+
+def run_batch(ctx: Context, n: int) -> None:
+    items = [plan_request(ctx, n * 4 + offset) for offset in range(4)]
+    response = check(ctx.session.post(ctx.url('/api/ai/generate-action-plans/batch'), json={"items": items}))
+    if response.json().get('failed'):
+        raise RuntimeError(f"batch items failed: {response.json()['failed']}")
+
+
+def run_chat(ctx: Context, n: int) -> None:
+    check(ctx.session.post(ctx.url('/api/ai/chat'), json=chat_request(ctx, n)))
+
+
+def run_chat_stream(ctx: Context, n: int) -> None:
+    check(ctx.session.post(ctx.url('/api/ai/chat?stream=1'), json=chat_request(ctx, n), stream=True))
+
+
+def run_suggest_roles(ctx: Context, n: int) -> None:
+    payload = {"eventType": "festival", "teamSize": ctx.prompt(n) % 20 + 2, "userId": ctx.user(n)}
+    check(ctx.session.post(ctx.url('/api/ai/suggest-roles'), json=payload))
+
+
+def run_get_plan(ctx: Context, n: int) -> None:
+    check(ctx.session.get(ctx.url(f'/api/ai/get-plan/{ctx.plan(n)}')))
+
+
+def run_export_pdf(ctx: Context, n: int) -> None:
+    check(ctx.session.post(ctx.url('/api/ai/export-plan/pdf'), json={"planId": ctx.plan(n)}))
+
+
+def run_export_excel(ctx: Context, n: int) -> None:
+    check(ctx.session.post(ctx.url('/api/ai/export-plan/excel'), json={"planId": ctx.plan(n)}))
+
+
+def run_export_download(ctx: Context, n: int) -> None:
+    export_format = 'pdf' if n % 2 == 0 else 'excel'
+    check(ctx.session.post(ctx.url(f'/api/ai/export-plan/{export_format}?download=1'), json={"planId": ctx.plan(n)}))
+
+
+def run_export_async(ctx: Context, n: int) -> None:
+    """Submit a background export, poll it and fetch the result."""
+    export_format = 'pdf' if n % 2 == 0 else 'excel'
+    response = check(ctx.session.post(ctx.url(f'/api/ai/export-plan/{export_format}?async=1'),
+                                      json={"planId": ctx.plan(n)}), expected=None)
+    if response.status_code == 200:
+        return  # Already cached; served synchronously
+    if response.status_code != 202:
+        raise RuntimeError(f"HTTP {response.status_code}")
+    job_id = response.json()['jobId']
+    while True:
+        status = check(ctx.session.get(ctx.url(f'/api/ai/export-jobs/{job_id}'))).json()['status']
+        if status == 'done':
+            break
+        if status == 'failed':
+            raise RuntimeError(f"export job {job_id} failed")
+        time.sleep(0.01)
+    check(ctx.session.get(ctx.url(f'/api/ai/export-jobs/{job_id}/result')))
+
+
+def run_download(ctx: Context, n: int) -> None:
+    check(ctx.session.get(ctx.url(f'/api/ai/download/{ctx.file_names[n % len(ctx.file_names)]}')))
+
+
+def run_regenerate_section(ctx: Context, n: int) -> None:
+    """Regenerate one section of a seeded plan; a concurrent edit of the same plan may 409."""
+    section = ("card_1", "timeline", "budget_summary", "risk_factors")[n % 4]
+    payload = {"planId": ctx.plan(n), "section": section, "instruction": "Tighten this up", "userId": ctx.user(n)}
+    response = check(ctx.session.post(ctx.url('/api/ai/regenerate-section'), json=payload), expected=None)
+    if response.status_code not in (200, 409):
+        raise RuntimeError(f"HTTP {response.status_code}: {response.content[:200]!r}")
+
+
+SCENARIOS: Dict[str, Callable[[Context, int], None]] = {
+    "health": run_health,
+    "metrics": run_metrics,
+    "generate": run_generate,
+    "generate_stream": run_generate_stream,
+    "batch": run_batch,
+    "chat": run_chat,
+    "chat_stream": run_chat_stream,
+    "suggest_roles": run_suggest_roles,
+    "get_plan": run_get_plan,
+    "export_pdf": run_export_pdf,
+    "export_excel": run_export_excel,
+    "export_download": run_export_download,
+    "export_async": run_export_async,
+    "download": run_download,
+    # Last: a new plan version deletes the plan's cached exports that download relies on
+    "regenerate_section": run_regenerate_section,
+}
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def drive(ctx: Context, scenario: Callable[[Context, int], None], requests_total: int, concurrency: int,
+          start: int = 0) -> dict:
+    """Run requests_total calls of scenario on concurrency threads and summarize them.
+
+    Requests are numbered from start, so routes given different starts send
+    different prompts and don't answer each other from the response cache.
+    """
+    latencies: List[float] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+
+    def one(n: int) -> None:
+        started = time.perf_counter()
+        try:
+            scenario(ctx, n)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+            return
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(start, start + requests_total)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests_total,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1) if latencies else 0.0
+    }
+
+
+def configure_environment(args, workdir: str, node_url: str) -> None:
+    """Point the app at the stub server and scratch storage before it is imported.
+
+    Values set here win over .env, so benchmark traffic never reaches a real
+    database or Node.js server.
+    """
+    os.environ['GROQ_API_KEY'] = 'benchmark'
+    os.environ['NODE_SERVER_URL'] = node_url
+    os.environ['MONGODB_URI'] = args.mongodb_uri
+    os.environ['MONGODB_SERVER_SELECTION_TIMEOUT_MS'] = os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', '500')
+    os.environ['OUTBOX_DB_PATH'] = os.path.join(workdir, 'outbox.db')
+    os.environ['PLAN_STORE_SQLITE_PATH'] = os.path.join(workdir, 'plans.db')
+    os.environ['EXPORT_JOBS_DB_PATH'] = os.path.join(workdir, 'export_jobs.db')
+    os.environ['LLM_CACHE_DIR'] = ''
+    os.environ['FLASK_DEBUG'] = 'False'
+    # Admission control defaults match the Groq quota; lift them unless asked not to
+    os.environ.setdefault('LLM_RATE_PER_MINUTE', str(args.llm_rate))
+    os.environ.setdefault('LLM_RATE_BURST', str(args.llm_rate))
+    os.environ.setdefault('LLM_MAX_QUEUE_DEPTH', '100000')
+
+
+def start_app(fake_llm: FakePlanLLM, backup_llm: Optional[FakePlanLLM] = None):
+    """Import the app with the fake models swapped in and serve it on a free port."""
+    from werkzeug.serving import make_server
+    import app as backend
+    from services.llm_coalescer import CoalescingLLM
+
+    backend.chat_model = fake_llm
+    # Keep the app's hedging wrapper (and its metrics) around the fake models
+    backend.hedged_llm.primary = fake_llm
+    backend.hedged_llm.backup = backup_llm or fake_llm
+    backend.llm = CoalescingLLM(backend.hedged_llm)
+    server = make_server('127.0.0.1', 0, backend.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-app-server", daemon=True).start()
+    return backend, server
+
+
+def seed(ctx: Context, plan_count: int, concurrency: int) -> None:
+    """Generate plans and export files for the read and export scenarios."""
+    def generate(n: int) -> str:
+        payload = plan_request(ctx, n)
+        payload["request"] = f"Seed plan {n}"
+        return check(ctx.session.post(ctx.url('/api/ai/generate-action-plan'), json=payload)).json()['plan_id']
+
+    def export(n: int) -> str:
+        export_format = 'pdf' if n % 2 == 0 else 'excel'
+        response = check(ctx.session.post(ctx.url(f'/api/ai/export-plan/{export_format}'), json={"planId": ctx.plan(n)}))
+        return response.json()['fileName']
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        ctx.plan_ids = list(pool.map(generate, range(plan_count)))
+        ctx.file_names = list(pool.map(export, range(plan_count)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--routes', default=','.join(SCENARIOS), help=f"comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads per route')
+    parser.add_argument('--requests', type=int, default=100, help='requests per route')
+    parser.add_argument('--latency', type=float, default=0.5, help='fake LLM time to first token, seconds')
+    parser.add_argument('--latency-jitter', type=float, default=0.0,
+                        help='+/- fraction of --latency (uniform) or sigma of its log (lognormal)')
+    parser.add_argument('--latency-distribution', choices=('uniform', 'lognormal'), default='uniform')
+    parser.add_argument('--tail-probability', type=float, default=0.0,
+                        help='fraction of fake LLM calls that stall before the first token')
+    parser.add_argument('--tail-multiplier', type=float, default=10.0, help='stalled calls wait this many times longer')
+    parser.add_argument('--backup-latency', type=float,
+                        help='hedge to a separate fake model with this latency and no tail (default: the same model)')
+    parser.add_argument('--tokens-per-second', type=float, default=200.0, help='fake LLM output rate (0 = instant)')
+    parser.add_argument('--cards', type=int, default=8, help='cards per canned plan (response size)')
+    parser.add_argument('--node-latency', type=float, default=0.0, help='stub Node.js server response delay, seconds')
+    parser.add_argument('--users', type=int, default=16, help='distinct user IDs to spread requests over')
+    parser.add_argument('--prompt-pool', type=int, default=0,
+                        help='repeat prompts from a pool of this size to exercise caches (0 = all unique)')
+    parser.add_argument('--seed-plans', type=int, default=20, help='plans generated up front for read/export routes')
+    parser.add_argument('--llm-rate', type=int, default=100000, help='LLM_RATE_PER_MINUTE unless set in the environment')
+    parser.add_argument('--mongodb-uri', default='mongodb://127.0.0.1:1/benchmark',
+                        help='MongoDB for the run; the default is unreachable so writes are buffered and dropped')
+    parser.add_argument('--json', help='also write results to this file')
+    parser.add_argument('--verbose', action='store_true', help='keep app and request logging')
+    args = parser.parse_args()
+
+    routes = [route.strip() for route in args.routes.split(',') if route.strip()]
+    unknown = [route for route in routes if route not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(unknown)}")
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    workdir = tempfile.mkdtemp(prefix='ai-backend-bench-')
+    stub = start_stub_server(latency=args.node_latency)
+    configure_environment(args, workdir, stub.url)
+    os.chdir(workdir)  # exports/, cache/ and data/ land in the scratch directory
+    if not args.verbose:
+        logging.disable(logging.ERROR)  # Failures are counted in the report instead
+
+    fake_llm = FakePlanLLM(latency=args.latency, latency_jitter=args.latency_jitter,
+                           latency_distribution=args.latency_distribution, tail_probability=args.tail_probability,
+                           tail_multiplier=args.tail_multiplier, tokens_per_second=args.tokens_per_second,
+                           card_count=args.cards)
+    backup_llm = None
+    if args.backup_latency is not None:
+        backup_llm = FakePlanLLM(latency=args.backup_latency, tokens_per_second=args.tokens_per_second,
+                                 card_count=args.cards, seed=1)
+    backend, server = start_app(fake_llm, backup_llm)
+    ctx = Context(f"http://127.0.0.1:{server.server_port}", args.users, args.prompt_pool)
+
+    print(f"Seeding {args.seed_plans} plans in {workdir} ...")
+    seed(ctx, max(1, args.seed_plans), args.concurrency)
+
+    results = {}
+    print(f"{'route':>16} {'reqs':>6} {'errs':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for index, route in enumerate(routes):
+        result = drive(ctx, SCENARIOS[route], args.requests, args.concurrency, start=index * args.requests * 4)
+        results[route] = result
+        print(f"{route:>16} {result['requests']:>6} {result['errors']:>5} {result['throughput_rps']:>8.1f} "
+              f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f} {result['max_ms']:>9.1f}")
+        if result['first_error']:
+            print(f"{'':>16} first error: {result['first_error']}")
+
+    backend.notification_outbox.flush()
+    print(f"\nStub Node.js server received {stub.received} notifications")
+
+    hedging = backend.hedged_llm.stats()
+    print(f"\n{'hedged route':>36} {'calls':>6} {'hedges':>6} {'backup':>6} {'primary':>7} {'no budget':>9} {'no slot':>7}")
+    for name, route in sorted(hedging["routes"].items()):
+        print(f"{name:>36} {route['calls']:>6} {route['hedges']:>6} {route['backup_won']:>6} "
+              f"{route['primary_won']:>7} {route['over_budget']:>9} {route['no_capacity']:>7}")
+
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as file:
+            json.dump({"config": vars(args), "results": results, "hedging": hedging}, file, indent=2)
+
+    server.shutdown()
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Local stand-in for the Node.js server's store-plan endpoint.
+
+Usage (from ai-backend/):
+    python -m benchmarks.stub_node_server [--port 5000] [--latency 0.02]
+
+Point NODE_SERVER_URL at it to exercise the outbox without a real server.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+
+
+class StubNodeServer(ThreadingHTTPServer):
+    """Threaded HTTP server that accepts any JSON POST and counts deliveries.
+
+    The first fail_first POSTs get a 503, to exercise retries. Deliveries
+    are de-duplicated on the Idempotency-Key header, like the Node.js server.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], latency: float = 0.0, status: int = 200, fail_first: int = 0):
+        super().__init__(address, StubNodeHandler)
+        self.latency = latency
+        self.status = status
+        self.fail_first = fail_first
+        self.received = 0
+        self.duplicates = 0
+        self.bytes_received = 0
+        self.keys = set()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            if self.fail_first > 0:
+                self.fail_first -= 1
+                return True
+            return False
+
+    def record(self, size: int, key: Optional[str] = None) -> None:
+        with self._lock:
+            if key is not None and key in self.keys:
+                self.duplicates += 1
+                return
+            if key is not None:
+                self.keys.add(key)
+            self.received += 1
+            self.bytes_received += size
+
+
+class StubNodeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like Express
+    # Buffer writes so headers and body leave in one segment; unbuffered writes
+    # trip Nagle plus delayed ACK and add ~40 ms per response
+    wbufsize = -1
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        try:
+            json.loads(body or b'{}')
+        except ValueError:
+            self._reply(400, {"success": False, "error": "invalid JSON"})
+            return
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.should_fail():
+            self._reply(503, {"success": False, "error": "unavailable"})
+            return
+        self.server.record(length, self.headers.get('Idempotency-Key'))
+        self._reply(self.server.status, {"success": self.server.status < 400})
+
+    def do_GET(self):
+        self._reply(200, {"received": self.server.received, "duplicates": self.server.duplicates,
+                          "bytes": self.server.bytes_received})
+
+    def _reply(self, status: int, payload: dict):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(host: str = '127.0.0.1', port: int = 0, latency: float = 0.0, status: int = 200,
+                      fail_first: int = 0) -> StubNodeServer:
+    """Start a stub server on a background thread; port 0 picks a free port."""
+    server = StubNodeServer((host, port), latency=latency, status=status, fail_first=fail_first)
+    threading.Thread(target=server.serve_forever, name="stub-node-server", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to wait before answering')
+    parser.add_argument('--status', type=int, default=200, help='HTTP status to answer with')
+    args = parser.parse_args()
+
+    server = StubNodeServer((args.host, args.port), latency=args.latency, status=args.status)
+    print(f"Stub Node.js server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nReceived {server.received} notifications ({server.bytes_received} bytes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+import os
+import math
+import time
+import heapq
+import logging
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from services.similarity_cache import TOKEN_PATTERN, STOP_WORDS
+from services.conversation_memory import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+MAX_POSTINGS_PER_QUERY = 20000  # Postings scored per search, bounding lookup cost
+SNIPPET_CHARS = 600  # Stored text per document; the full text is indexed
+
+def index_terms(text: str) -> Counter:
+    """Word counts of a text, without stop words."""
+    return Counter(token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS)
+
+def plan_text(action_plan: Dict[str, Any]) -> str:
+    """Searchable text of a generated plan: title, overview and card titles."""
+    cards = action_plan.get("cards") or []
+    card_titles = "; ".join(str(card.get("title", "")) for card in cards if isinstance(card, dict))
+    return f"{action_plan.get('title', '')}. {action_plan.get('overview', '')} Cards: {card_titles}"
+
+class _Channel:
+    def __init__(self):
+        self.offset = 0  # Document id of sources[0]
+        self.first_live = 0  # Documents before this id have been evicted
+        self.sources: List[str] = []  # Question or plan request per document, for exclusion
+        self.snippets: List[str] = []
+        self.lengths = array('I')
+        # term -> (document ids ascending, term frequencies)
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.total_length = 0
+        self.loaded = False
+        self.last_used = time.monotonic()  # Guarded by the index lock
+        self.lock = threading.Lock()  # Guards everything else
+    
+    def __len__(self) -> int:
+        return self.offset + len(self.sources) - self.first_live
+
+class ChannelIndex:
+    """Per-channel BM25 index over past chat interactions and generated plans.
+
+    Documents are added as they are produced, so the index is always current
+    without re-reading MongoDB. search() returns the snippets most relevant to
+    a message within a token cap, ready to paste into a prompt. Each channel
+    keeps at most max_docs documents, evicting the oldest, and channels are
+    LRU-bounded and evicted when idle. Evicted documents are dropped from the
+    postings lazily, in one pass once they make up half the channel.
+
+    The index lock only guards the channel map; adding to and scoring a
+    channel hold that channel's own lock, and text is tokenized before any
+    lock is taken, so seeding or searching one channel never blocks another.
+
+    With persistence on, a channel's stored interactions (load_history) and
+    plans (load_plans) are indexed in the background the first time it is
+    used; searches answer from whatever is indexed until then.
+    """
+
+    def __init__(self, load_history: Optional[Callable[[str, int], List[Dict[str, Any]]]] = None,
+                 max_docs: Optional[int] = None, max_channels: Optional[int] = None,
+                 idle_seconds: Optional[float] = None,
+                 load_plans: Optional[Callable[[str, int], List[Dict[str, Any]]]] = None):
+        self.enabled = os.getenv('CHANNEL_INDEX_ENABLED', 'True').lower() == 'true'
+        self.max_docs = max_docs if max_docs is not None else int(os.getenv('CHANNEL_INDEX_MAX_DOCS', 5000))
+        self.max_channels = max_channels if max_channels is not None else int(os.getenv('CHANNEL_INDEX_MAX_CHANNELS', 200))
+        self.idle_seconds = idle_seconds if idle_seconds is not None else float(os.getenv('CHANNEL_INDEX_IDLE_SECONDS', 3600))
+        self.top_k = int(os.getenv('CHANNEL_INDEX_TOP_K', 4))
+        self.token_budget = int(os.getenv('CHANNEL_INDEX_TOKEN_BUDGET', 400))
+        # Stored interactions (and as many plans) seeding a channel the first time it is searched; 0 disables
+        self.load_limit = int(os.getenv('CHANNEL_INDEX_LOAD_LIMIT', 200))
+        # Stored history only seeds the index when persistence is switched on
+        persistence = os.getenv('CHANNEL_INDEX_PERSISTENCE', 'False').lower() == 'true'
+        self.load_history = load_history if persistence else None
+        self.load_plans = load_plans if persistence else None
+        self._loader = ThreadPoolExecutor(max_workers=int(os.getenv('CHANNEL_INDEX_LOAD_WORKERS', 2)),
+                                          thread_name_prefix="channel-index-load")
+        self._channels: "OrderedDict[str, _Channel]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.searches = 0
+        self.hits = 0
+        self.evictions = 0
+    
+    def add_interaction(self, channel_id: Optional[str], message: str, response: str) -> None:
+        """Index a chat exchange."""
+        self.add(channel_id, message, f"Q: {message}\nA: {response}")
+    
+    def add_plan(self, channel_id: Optional[str], user_request: str, action_plan: Dict[str, Any]) -> None:
+        """Index a generated plan's request, title, overview and card titles."""
+        self.add(channel_id, user_request, f"Plan for \"{user_request}\": {plan_text(action_plan)}")
+    
+    def add(self, channel_id: Optional[str], source: str, text: str) -> None:
+        """Index a document; source is the message or request that produced it."""
+        if not self.enabled or not channel_id:
+            return
+        self.add_many(channel_id, [(source, text)])
+    
+    def add_many(self, channel_id: str, documents: Iterable[Tuple[str, str]]) -> None:
+        """Index (source, text) documents in order, oldest first."""
+        documents = [(source, text, index_terms(text)) for source, text in documents]
+        with self._lock:
+            channel = self._touch(channel_id)
+        with channel.lock:
+            for source, text, counts in documents:
+                self._add(channel, source, text, counts)
+    
+    def load(self, channel_id: Optional[str]) -> None:
+        """Queue seeding a channel from stored history the first time it is used."""
+        if not self.enabled or not channel_id:
+            return
+        with self._lock:
+            channel = self._touch(channel_id)
+            if channel.loaded:
+                return
+            channel.loaded = True
+        
+        if (self.load_history is None and self.load_plans is None) or self.load_limit <= 0:
+            return
+        # The database may be slow or unreachable; never make a request wait for it
+        self._loader.submit(self._load, channel_id)
+    
+    def search(self, channel_id: Optional[str], query: str, exclude: Iterable[str] = (),
+               top_k: Optional[int] = None, token_budget: Optional[int] = None) -> List[str]:
+        """Snippets most relevant to query, best first, within the token budget.
+
+        Documents whose source is in exclude (turns already in the prompt)
+        are skipped.
+        """
+        if not self.enabled or not channel_id:
+            return []
+        self.load(channel_id)
+        
+        top_k = top_k if top_k is not None else self.top_k
+        token_budget = token_budget if token_budget is not None else self.token_budget
+        terms = set(index_terms(query))
+        exclude = set(exclude)
+        if not terms or top_k <= 0:
+            return []
+        
+        with self._lock:
+            channel = self._channels.get(channel_id)
+            self.searches += 1
+        if channel is None:
+            return []
+        with channel.lock:
+            if not len(channel):
+                return []
+            scores = self._score(channel, terms)
+            ranked = heapq.nlargest(top_k + len(exclude), scores.items(), key=lambda item: item[1])
+            documents = [(channel.sources[doc_id - channel.offset], channel.snippets[doc_id - channel.offset])
+                         for doc_id, _ in ranked]
+        
+        snippets = []
+        remaining = token_budget
+        for source, snippet in documents:
+            if source in exclude:
+                continue
+            cost = estimate_tokens(snippet)
+            if cost > remaining:
+                # Trim the last snippet to fit if enough room is left to be useful
+                if remaining < 32:
+                    break
+                snippet = snippet[:remaining * 4 - 4].rstrip() + "…"
+                cost = remaining
+            snippets.append(snippet)
+            remaining -= cost
+            if len(snippets) == top_k or remaining <= 0:
+                break
+        if snippets:
+            with self._lock:
+                self.hits += 1
+        return snippets
+    
+    def forget(self, channel_id: str) -> None:
+        """Drop a channel's index."""
+        with self._lock:
+            self._channels.pop(channel_id, None)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Report index size and search counters."""
+        with self._lock:
+            channels = list(self._channels.values())
+            return {
+                "enabled": self.enabled,
+                "channels": len(channels),
+                # Read without the channel locks; a concurrent add may be missed
+                "documents": sum(len(channel) for channel in channels),
+                "max_docs_per_channel": self.max_docs,
+                "searches": self.searches,
+                "hits": self.hits,
+                "evictions": self.evictions
+            }
+    
+    def _load(self, channel_id: str) -> None:
+        documents = []  # (timestamp, source, text)
+        try:
+            for interaction in self.load_history(channel_id, self.load_limit) if self.load_history else []:
+                reply = interaction.get("ai_response")
+                reply = reply.get("response") if isinstance(reply, dict) else reply
+                if interaction.get("message") and isinstance(reply, str):
+                    documents.append((str(interaction.get("timestamp", "")), interaction["message"],
+                                      f"Q: {interaction['message']}\nA: {reply}"))
+            for plan in self.load_plans(channel_id, self.load_limit) if self.load_plans else []:
+                action_plan = (plan.get("ai_response") or {}).get("action_plan") or {}
+                if plan.get("user_request") and action_plan:
+                    documents.append((str(plan.get("created_at", "")), plan["user_request"],
+                                      f"Plan for \"{plan['user_request']}\": {plan_text(action_plan)}"))
+        except Exception as e:
+            logger.warning(f"Failed to load channel history for {channel_id}: {e}")
+            return
+        
+        documents.sort(key=lambda document: document[0])
+        documents = [(source, text, index_terms(text)) for _, source, text in documents]
+        with self._lock:
+            channel = self._channels.get(channel_id)
+        if channel is None:
+            return  # Evicted while loading
+        with channel.lock:
+            # Documents indexed since the channel was first used may already be stored
+            indexed = set(channel.sources[channel.first_live - channel.offset:])
+            for source, text, counts in documents:
+                if source not in indexed:
+                    self._add(channel, source, text, counts)
+    
+    def _touch(self, channel_id: str) -> _Channel:
+        # Caller holds the index lock
+        now = time.monotonic()
+        while self._channels:
+            oldest_id, oldest = next(iter(self._channels.items()))
+            if oldest_id == channel_id or now - oldest.last_used <= self.idle_seconds:
+                break
+            del self._channels[oldest_id]
+            self.evictions += 1
+        
+        channel = self._channels.get(channel_id)
+        if channel is None:
+            channel = self._channels[channel_id] = _Channel()
+            while len(self._channels) > self.max_channels:
+                self._channels.popitem(last=False)
+                self.evictions += 1
+        channel.last_used = now
+        self._channels.move_to_end(channel_id)
+        return channel
+    
+    def _add(self, channel: _Channel, source: str, text: str, counts: Counter) -> None:
+        # Caller holds the channel lock; counts is index_terms(text)
+        if not counts:
+            return
+        doc_id = channel.offset + len(channel.sources)
+        length = sum(counts.values())
+        channel.sources.append(source)
+        channel.snippets.append(text[:SNIPPET_CHARS])
+        channel.lengths.append(length)
+        channel.total_length += length
+        for term, count in counts.items():
+            posting = channel.postings.get(term)
+            if posting is None:
+                posting = channel.postings[term] = (array('I'), array('H'))
+            posting[0].append(doc_id)
+            posting[1].append(min(count, 0xFFFF))
+        
+        while len(channel) > self.max_docs:
+            channel.total_length -= channel.lengths[channel.first_live - channel.offset]
+            channel.first_live += 1
+        if channel.first_live - channel.offset > max(1024, len(channel)):
+            self._compact(channel)
+    
+    def _compact(self, channel: _Channel) -> None:
+        # Drop evicted documents from the per-document lists and every posting list
+        dead = channel.first_live - channel.offset
+        del channel.sources[:dead]
+        del channel.snippets[:dead]
+        del channel.lengths[:dead]
+        channel.offset = channel.first_live
+        for term in list(channel.postings):
+            ids, frequencies = channel.postings[term]
+            start = bisect_left(ids, channel.first_live)
+            if start == len(ids):
+                del channel.postings[term]
+            elif start:
+                del ids[:start]
+                del frequencies[:start]
+    
+    def _score(self, channel: _Channel, terms: set) -> Dict[int, float]:
+        # Caller holds the channel lock
+        size = len(channel)
+        average_length = channel.total_length / size
+        lengths, offset = channel.lengths, channel.offset
+        norm = K1 * (1 - B)
+        scale = K1 * B / average_length
+        
+        postings = []
+        for term in terms:
+            posting = channel.postings.get(term)
+            if posting is not None:
+                start = bisect_left(posting[0], channel.first_live)
+                if start < len(posting[0]):
+                    postings.append((len(posting[0]) - start, posting))
+        # Rarest (most discriminating) terms first; the postings budget is split evenly over
+        # the terms still to score, so very common terms only score their newest documents
+        postings.sort(key=lambda item: item[0])
+        
+        scores: Dict[int, float] = {}
+        budget = MAX_POSTINGS_PER_QUERY
+        for position, (frequency, (ids, frequencies)) in enumerate(postings):
+            allowance = min(frequency, budget // (len(postings) - position))
+            budget -= allowance
+            idf = math.log(1 + (size - frequency + 0.5) / (frequency + 0.5))
+            weight = idf * (K1 + 1)
+            start = len(ids) - allowance
+            get = scores.get
+            for doc_id, tf in zip(ids[start:], frequencies[start:]):
+                scores[doc_id] = get(doc_id, 0.0) + weight * tf / (tf + norm + scale * lengths[doc_id - offset])
+        return scores
@@ -0,0 +1,243 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+logger = logging.getLogger(__name__)
+
+# (role, text) where role is "human" or "ai"
+Turn = Tuple[str, str]
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: about four characters per token."""
+    return len(text) // 4 + 1
+
+def interaction_turns(interactions: List[Dict[str, Any]]) -> List[Turn]:
+    """Turns, oldest first, from stored AI interactions listed newest first."""
+    turns = []
+    for interaction in reversed(interactions):
+        reply = interaction.get("ai_response")
+        reply = reply.get("response") if isinstance(reply, dict) else reply
+        if interaction.get("message") and isinstance(reply, str) and reply:
+            turns.extend((("human", interaction["message"]), ("ai", reply)))
+    return turns
+
+class _Conversation:
+    def __init__(self):
+        self.summary = ""
+        self.turns: deque = deque()
+        self.turn_tokens = 0
+        self.pending: List[Turn] = []  # Rolled out of turns, waiting to be summarized
+        self.summarizing = False
+        self.loaded = False
+        self.last_used = time.monotonic()
+
+class ConversationMemory:
+    """Per-conversation chat memory held to a fixed token budget.
+
+    A conversation is keyed by channel, or by user when there is no channel.
+    Recent turns are kept verbatim. When they outgrow the budget, the oldest
+    are rolled out and folded into a running summary by summarize(summary,
+    turns) on a background thread, so the prompt stays the same size however
+    long the conversation runs. Conversations idle for longer than
+    idle_seconds are evicted, and the count is LRU-bounded. With a
+    load_history(channel_id) callable, a channel's recent interactions are
+    loaded from the database the first time it is seen. load_history(channel_id,
+    limit) returns stored interactions newest first, as
+    DatabaseService.get_channel_ai_history does.
+    """
+
+    def __init__(self, summarize: Optional[Callable[[str, List[Turn]], str]] = None,
+                 load_history: Optional[Callable[[str, int], List[Dict[str, Any]]]] = None,
+                 token_budget: Optional[int] = None, summary_tokens: Optional[int] = None,
+                 idle_seconds: Optional[float] = None, max_conversations: Optional[int] = None):
+        self.enabled = os.getenv('CHAT_MEMORY_ENABLED', 'True').lower() == 'true'
+        self.token_budget = token_budget if token_budget is not None else int(os.getenv('CHAT_MEMORY_TOKEN_BUDGET', 1500))
+        self.summary_tokens = summary_tokens if summary_tokens is not None else int(os.getenv('CHAT_MEMORY_SUMMARY_TOKENS', 300))
+        self.idle_seconds = idle_seconds if idle_seconds is not None else float(os.getenv('CHAT_MEMORY_IDLE_SECONDS', 1800))
+        self.max_conversations = max_conversations if max_conversations is not None else int(os.getenv('CHAT_MEMORY_MAX_CONVERSATIONS', 1000))
+        self.load_limit = int(os.getenv('CHAT_MEMORY_LOAD_LIMIT', 20))
+        self.summarize = summarize
+        # Stored interactions only seed memory when persistence is switched on
+        persistence = os.getenv('CHAT_MEMORY_PERSISTENCE', 'False').lower() == 'true'
+        self.load_history = load_history if persistence else None
+        self._conversations: "OrderedDict[str, _Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=int(os.getenv('CHAT_MEMORY_SUMMARY_WORKERS', 2)),
+                                            thread_name_prefix="chat-summary")
+        self.summaries = 0
+        self.summary_failures = 0
+        self.evictions = 0
+        self.dropped_turns = 0
+    
+    @staticmethod
+    def key(channel_id: Optional[str], user_id: Optional[str]) -> Optional[str]:
+        """Conversation key for a request, or None when it cannot be attributed."""
+        if channel_id:
+            return f"channel:{channel_id}"
+        if user_id:
+            return f"user:{user_id}"
+        return None
+    
+    def has_history(self, key: Optional[str]) -> bool:
+        """Whether the conversation has earlier turns or a summary."""
+        if not self.enabled or key is None:
+            return False
+        self.load(key)
+        with self._lock:
+            conversation = self._conversations.get(key)
+            return bool(conversation and (conversation.turns or conversation.summary or conversation.pending))
+    
+    def load(self, key: str) -> None:
+        """Seed a channel conversation from load_history the first time it is used."""
+        if not self.enabled or key is None:
+            return
+        with self._lock:
+            conversation = self._touch(key)
+            if conversation.loaded:
+                return
+            conversation.loaded = True
+        
+        if self.load_history is None or not key.startswith("channel:"):
+            return
+        try:
+            turns = interaction_turns(self.load_history(key[len("channel:"):], self.load_limit))
+        except Exception as e:
+            logger.warning(f"Failed to load chat history for {key}: {e}")
+            return
+        
+        with self._lock:
+            # Loaded turns predate anything recorded while the load was running
+            for role, text in reversed(turns):
+                conversation.turns.appendleft((role, text))
+                conversation.turn_tokens += estimate_tokens(text)
+            self._roll_over(key, conversation)
+    
+    def build_messages(self, key: Optional[str], system_prompt: str, message: str) -> List:
+        """Messages for an LLM call: system prompt with summary, recent turns that fit, then message."""
+        if not self.enabled or key is None:
+            return [SystemMessage(content=system_prompt), HumanMessage(content=message)]
+        
+        self.load(key)
+        with self._lock:
+            conversation = self._touch(key)
+            summary = conversation.summary
+            turns = list(conversation.turns)
+        
+        remaining = self.token_budget - estimate_tokens(message)
+        if summary:
+            system_prompt = f"{system_prompt}\n\nSummary of the conversation so far:\n{summary}"
+            remaining -= estimate_tokens(summary)
+        
+        # Newest turns first until the budget runs out. Turns waiting on the summarizer are
+        # briefly in neither the summary nor the prompt
+        kept: List[Turn] = []
+        for role, text in reversed(turns):
+            remaining -= estimate_tokens(text)
+            if remaining < 0:
+                break
+            kept.append((role, text))
+        # Never open the history with an assistant turn whose question was cut
+        if kept and kept[-1][0] == "ai":
+            kept.pop()
+        
+        history = [HumanMessage(content=text) if role == "human" else AIMessage(content=text)
+                   for role, text in reversed(kept)]
+        return [SystemMessage(content=system_prompt), *history, HumanMessage(content=message)]
+    
+    def record(self, key: Optional[str], message: str, response: str) -> None:
+        """Append an exchange; turns that no longer fit are summarized in the background."""
+        if not self.enabled or key is None:
+            return
+        with self._lock:
+            conversation = self._touch(key)
+            for role, text in (("human", message), ("ai", response)):
+                conversation.turns.append((role, text))
+                conversation.turn_tokens += estimate_tokens(text)
+            self._roll_over(key, conversation)
+    
+    def forget(self, key: str) -> None:
+        """Drop a conversation."""
+        with self._lock:
+            self._conversations.pop(key, None)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Report conversation counts and summarization activity."""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "conversations": len(self._conversations),
+                "turns": sum(len(conversation.turns) for conversation in self._conversations.values()),
+                "token_budget": self.token_budget,
+                "summarizing": sum(1 for conversation in self._conversations.values() if conversation.summarizing),
+                "summaries": self.summaries,
+                "summary_failures": self.summary_failures,
+                "dropped_turns": self.dropped_turns,
+                "evictions": self.evictions
+            }
+    
+    def close(self) -> None:
+        """Stop the summary workers."""
+        self._executor.shutdown(wait=False)
+    
+    def _touch(self, key: str) -> _Conversation:
+        # Caller holds the lock
+        now = time.monotonic()
+        while self._conversations:
+            oldest_key, oldest = next(iter(self._conversations.items()))
+            if oldest_key == key or now - oldest.last_used <= self.idle_seconds:
+                break
+            del self._conversations[oldest_key]
+            self.evictions += 1
+        
+        conversation = self._conversations.get(key)
+        if conversation is None:
+            conversation = self._conversations[key] = _Conversation()
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+                self.evictions += 1
+        conversation.last_used = now
+        self._conversations.move_to_end(key)
+        return conversation
+    
+    def _roll_over(self, key: str, conversation: _Conversation) -> None:
+        # Caller holds the lock. Keep the verbatim turns within the budget left after the summary,
+        # always keeping the latest exchange
+        turn_budget = self.token_budget - self.summary_tokens
+        while conversation.turn_tokens > turn_budget and len(conversation.turns) > 2:
+            role, text = conversation.turns.popleft()
+            conversation.turn_tokens -= estimate_tokens(text)
+            if self.summarize is None:
+                self.dropped_turns += 1
+            else:
+                conversation.pending.append((role, text))
+        
+        if conversation.pending and not conversation.summarizing:
+            conversation.summarizing = True
+            batch, conversation.pending = conversation.pending, []
+            self._executor.submit(self._summarize, key, conversation, conversation.summary, batch)
+    
+    def _summarize(self, key: str, conversation: _Conversation, summary: str, turns: List[Turn]) -> None:
+        try:
+            new_summary = self.summarize(summary, turns).strip()
+            # Hard cap so a verbose summary cannot eat the turn budget
+            new_summary = new_summary[:self.summary_tokens * 4]
+        except Exception as e:
+            logger.warning(f"Failed to summarize conversation {key}: {e}")
+            new_summary = None
+        
+        with self._lock:
+            conversation.summarizing = False
+            if new_summary is None:
+                self.summary_failures += 1
+                self.dropped_turns += len(turns)
+            else:
+                conversation.summary = new_summary
+                self.summaries += 1
+            # Turns rolled out while this summary ran go in the next one
+            if self._conversations.get(key) is conversation:
+                self._roll_over(key, conversation)
@@ -1,71 +1,205 @@
 import os
 import logging
-from pymongo import MongoClient
+import threading
+from pymongo import MongoClient, UpdateOne, ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, PyMongoError
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 logger = logging.getLogger(__name__)
 
 class DatabaseService:
     def __init__(self):
         self.mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/ai-productivity-app')
+        # Write-behind buffer: documents are flushed with insert_many by size or interval
+        self.flush_size = int(os.getenv('MONGODB_FLUSH_SIZE', 100))
+        self.flush_interval = float(os.getenv('MONGODB_FLUSH_INTERVAL', 1.0))
+        self.max_buffered = int(os.getenv('MONGODB_MAX_BUFFERED', 10000))
+        self._buffers: Dict[str, List[Dict[str, Any]]] = {"ai_interactions": [], "event_plans": []}
+        # plan_id -> fields to $set, coalesced per plan and applied after the buffered inserts
+        self._plan_updates: Dict[str, Dict[str, Any]] = {}
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self.dropped_writes = 0
         try:
-            self.client = MongoClient(self.mongodb_uri)
+            self.client = MongoClient(
+                self.mongodb_uri,
+                maxPoolSize=int(os.getenv('MONGODB_MAX_POOL_SIZE', 50)),
+                minPoolSize=int(os.getenv('MONGODB_MIN_POOL_SIZE', 0)),
+                serverSelectionTimeoutMS=int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+                connectTimeoutMS=int(os.getenv('MONGODB_CONNECT_TIMEOUT_MS', 5000)),
+                socketTimeoutMS=int(os.getenv('MONGODB_SOCKET_TIMEOUT_MS', 10000))
+            )
             self.db = self.client.get_database()
             logger.info("Connected to MongoDB successfully")
         except Exception as e:
             logger.error(f"Failed to connect to MongoDB: {e}")
             self.client = None
             self.db = None
+        
+        if self.db is not None:
+            # Index creation waits on server selection, so keep it off the startup path
+            threading.Thread(target=self.ensure_indexes, name="mongodb-indexes", daemon=True).start()
     
-    def store_ai_interaction(self, channel_id: str, user_id: str, message: str, response: Dict[str, Any]) -> bool:
-        """Store AI interaction in database."""
-        if not self.db:
+    def ensure_indexes(self) -> bool:
+        """Create the indexes the read paths rely on."""
+        if self.db is None:
             return False
         
         try:
-            interaction_data = {
-                "channel_id": channel_id,
-                "user_id": user_id,
-                "message": message,
-                "ai_response": response,
-                "timestamp": datetime.now(),
-                "type": "ai_interaction"
-            }
-            
-            result = self.db.ai_interactions.insert_one(interaction_data)
-            return bool(result.inserted_id)
+            self.db.event_plans.create_index([("plan_id", ASCENDING)], unique=True)
+            self.db.ai_interactions.create_index([("channel_id", ASCENDING), ("timestamp", DESCENDING)])
+            self.db.event_plans.create_index([("channel_id", ASCENDING), ("created_at", DESCENDING)])
+            logger.info("MongoDB indexes ensured")
+            return True
         except Exception as e:
-            logger.error(f"Failed to store AI interaction: {e}")
+            logger.error(f"Failed to create MongoDB indexes: {e}")
+            return False
+    
+    def store_ai_interaction(self, channel_id: str, user_id: str, message: str, response: Dict[str, Any]) -> bool:
+        """Queue an AI interaction for a buffered write."""
+        if self.db is None:
             return False
+        
+        interaction_data = {
+            "channel_id": channel_id,
+            "user_id": user_id,
+            "message": message,
+            "ai_response": response,
+            "timestamp": datetime.now(),
+            "type": "ai_interaction"
+        }
+        return self._buffer("ai_interactions", interaction_data)
     
     def store_event_plan(self, plan_data: Dict[str, Any]) -> bool:
-        """Store event plan in database."""
-        if not self.db:
+        """Queue an event plan for a buffered write."""
+        if self.db is None:
             return False
         
-        try:
-            result = self.db.event_plans.insert_one(plan_data)
-            return bool(result.inserted_id)
-        except Exception as e:
-            logger.error(f"Failed to store event plan: {e}")
+        # Copy so the _id added by insert_many doesn't leak into the caller's dict
+        queued = self._buffer("event_plans", dict(plan_data))
+        # Flush now rather than at the next interval: other workers look new plans up in MongoDB.
+        # Plans stored while a flush is running still go out together in the next one
+        self._wake.set()
+        return queued
+    
+    def update_event_plan(self, plan_id: str, updates: Dict[str, Any]) -> bool:
+        """Queue a buffered $set of fields on a stored event plan."""
+        if self.db is None:
             return False
+        
+        with self._buffer_lock:
+            self._plan_updates.setdefault(plan_id, {}).update(updates)
+            self._ensure_flusher()
+        self._wake.set()
+        return True
     
-    def get_event_plan(self, plan_id: str) -> Optional[Dict[str, Any]]:
-        """Retrieve event plan by ID."""
-        if not self.db:
+    def flush(self) -> int:
+        """Write buffered documents with unordered insert_many, then plan updates. Returns the number written."""
+        if self.db is None:
+            return 0
+        
+        with self._flush_lock:
+            with self._buffer_lock:
+                pending = {name: docs for name, docs in self._buffers.items() if docs}
+                for name in pending:
+                    self._buffers[name] = []
+                plan_updates, self._plan_updates = self._plan_updates, {}
+            
+            written = 0
+            for name, docs in pending.items():
+                try:
+                    result = self.db[name].insert_many(docs, ordered=False)
+                    written += len(result.inserted_ids)
+                except BulkWriteError as e:
+                    written += e.details.get("nInserted", 0)
+                    logger.error(f"Partial bulk write to {name}: {len(e.details.get('writeErrors', []))} errors")
+                except PyMongoError as e:
+                    logger.error(f"Failed to flush {len(docs)} documents to {name}: {e}")
+            
+            # After the inserts, so an update always finds a plan that was still buffered
+            if plan_updates:
+                try:
+                    result = self.db.event_plans.bulk_write(
+                        [UpdateOne({"plan_id": plan_id}, {"$set": updates}) for plan_id, updates in plan_updates.items()],
+                        ordered=False)
+                    written += result.modified_count
+                except PyMongoError as e:
+                    logger.error(f"Failed to flush {len(plan_updates)} plan updates: {e}")
+            return written
+    
+    def close(self) -> None:
+        """Flush remaining writes and stop the background flusher."""
+        self._stop.set()
+        self._wake.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+        self.flush()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Report write-buffer depth and shed writes."""
+        with self._buffer_lock:
+            return {
+                "connected": self.db is not None,
+                "buffered": {name: len(docs) for name, docs in self._buffers.items()},
+                "buffered_plan_updates": len(self._plan_updates),
+                "dropped_writes": self.dropped_writes
+            }
+    
+    def _buffer(self, collection: str, document: Dict[str, Any]) -> bool:
+        with self._buffer_lock:
+            buffer = self._buffers[collection]
+            buffer.append(document)
+            if len(buffer) > self.max_buffered:
+                # Database is unreachable or far behind; shed the oldest writes
+                del buffer[0]
+                self.dropped_writes += 1
+            should_flush = len(buffer) >= self.flush_size
+            self._ensure_flusher()
+        if should_flush:
+            self._wake.set()
+        return True
+    
+    def _ensure_flusher(self) -> None:
+        # Caller holds the buffer lock
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._run_flusher, name="mongodb-flusher", daemon=True)
+            self._flusher.start()
+    
+    def _run_flusher(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"MongoDB flusher error: {e}")
+    
+    def get_event_plan(self, plan_id: str, projection: Optional[Dict[str, Any]] = None,
+                       raise_errors: bool = False) -> Optional[Dict[str, Any]]:
+        """Retrieve event plan by ID, optionally limited to the projected fields.
+
+        Database errors also return None unless raise_errors is set, for
+        callers that must tell a missing plan from a failed read.
+        """
+        if self.db is None:
             return None
         
         try:
-            plan = self.db.event_plans.find_one({"plan_id": plan_id})
+            plan = self.db.event_plans.find_one({"plan_id": plan_id}, projection)
             return plan
         except Exception as e:
+            if raise_errors:
+                raise
             logger.error(f"Failed to retrieve event plan: {e}")
             return None
     
     def get_channel_ai_history(self, channel_id: str, limit: int = 50) -> list:
         """Get AI interaction history for a channel."""
-        if not self.db:
+        if self.db is None:
             return []
         
         try:
@@ -78,9 +212,25 @@ class DatabaseService:
             logger.error(f"Failed to retrieve AI history: {e}")
             return []
     
+    def get_channel_event_plans(self, channel_id: str, limit: int = 50) -> list:
+        """Get a channel's most recent event plans (request, plan and creation time only)."""
+        if self.db is None:
+            return []
+        
+        try:
+            plans = self.db.event_plans.find(
+                {"channel_id": channel_id},
+                {"_id": 0, "user_request": 1, "ai_response.action_plan": 1, "created_at": 1}
+            ).sort("created_at", -1).limit(limit)
+            
+            return list(plans)
+        except Exception as e:
+            logger.error(f"Failed to retrieve channel plans: {e}")
+            return []
+    
     def update_plan_status(self, plan_id: str, status: str) -> bool:
         """Update event plan status."""
-        if not self.db:
+        if self.db is None:
             return False
         
         try:
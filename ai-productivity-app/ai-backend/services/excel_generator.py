@@ -1,7 +1,8 @@
 import os
 import logging
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.cell import Cell, WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
 from openpyxl.utils.dataframe import dataframe_to_rows
 from datetime import datetime
 import json
@@ -9,6 +10,11 @@ import json
 logger = logging.getLogger(__name__)
 
 class ExcelGenerator:
+    TIMELINE_HEADERS = ['Phase', 'Duration', 'Tasks', 'Dependencies']
+    ROLES_HEADERS = ['Role Title', 'Responsibilities', 'Required Skills', 'Priority']
+    BUDGET_HEADERS = ['Category', 'Amount', 'Percentage', 'Notes']
+    TASK_HEADERS = ['Task', 'Assigned Role', 'Priority', 'Deadline', 'Status', 'Notes']
+    
     def __init__(self):
         self.header_font = Font(bold=True, color="FFFFFF")
         self.header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
@@ -18,40 +24,52 @@ class ExcelGenerator:
             top=Side(style='thin'),
             bottom=Side(style='thin')
         )
+        # Plans with at least this many tasks are rendered in write-only mode
+        self.write_only_threshold = int(os.getenv('EXCEL_WRITE_ONLY_THRESHOLD', 500))
     
-    def generate_plan_excel(self, plan_data):
+    def generate_plan_excel(self, plan_data, output=None, write_only=None):
         """Generate Excel file for event plan."""
         try:
-            # Create exports directory if it doesn't exist
-            os.makedirs('exports', exist_ok=True)
-            
-            filename = f"event_plan_{plan_data.get('plan_id', 'unknown')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            filepath = os.path.join('exports', filename)
-            
-            wb = Workbook()
-            
-            # Remove default sheet
-            wb.remove(wb.active)
-            
-            # Event Details Sheet
-            self._create_event_details_sheet(wb, plan_data)
-            
-            # Timeline Sheet
-            self._create_timeline_sheet(wb, plan_data)
+            # output may be a path or a writable binary file object
+            filepath = output
+            if not filepath:
+                # Create exports directory if it doesn't exist
+                os.makedirs('exports', exist_ok=True)
+                
+                filename = f"event_plan_{plan_data.get('plan_id', 'unknown')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+                filepath = os.path.join('exports', filename)
             
-            # Roles Sheet
-            self._create_roles_sheet(wb, plan_data)
+            if write_only is None:
+                write_only = self._count_tasks(plan_data) >= self.write_only_threshold
             
-            # Budget Sheet
-            self._create_budget_sheet(wb, plan_data)
-            
-            # Tasks Sheet
-            self._create_tasks_sheet(wb, plan_data)
+            if write_only:
+                wb = self._build_write_only_workbook(plan_data)
+            else:
+                wb = Workbook()
+                
+                # Remove default sheet
+                wb.remove(wb.active)
+                
+                # Event Details Sheet
+                self._create_event_details_sheet(wb, plan_data)
+                
+                # Timeline Sheet
+                self._create_timeline_sheet(wb, plan_data)
+                
+                # Roles Sheet
+                self._create_roles_sheet(wb, plan_data)
+                
+                # Budget Sheet
+                self._create_budget_sheet(wb, plan_data)
+                
+                # Tasks Sheet
+                self._create_tasks_sheet(wb, plan_data)
             
             # Save workbook
             wb.save(filepath)
             
-            logger.info(f"Excel file generated successfully: {filepath}")
+            if isinstance(filepath, str):
+                logger.info(f"Excel file generated successfully: {filepath}")
             return filepath
             
         except Exception as e:
@@ -67,20 +85,8 @@ class ExcelGenerator:
         ws['A1'].font = Font(bold=True, size=16)
         ws.merge_cells('A1:B1')
         
-        # Event details
-        event_details = plan_data.get('event_details', {})
-        details = [
-            ['Event Type', plan_data.get('event_type', 'General').title()],
-            ['Date', event_details.get('date', 'TBD')],
-            ['Venue', event_details.get('venue', 'TBD')],
-            ['Expected Attendees', str(event_details.get('attendees', 'TBD'))],
-            ['Duration', event_details.get('duration', 'TBD')],
-            ['Budget', event_details.get('budget', 'TBD')],
-            ['Generated On', datetime.now().strftime('%B %d, %Y at %I:%M %p')]
-        ]
-        
         row = 3
-        for detail in details:
+        for detail in self._event_detail_rows(plan_data):
             ws[f'A{row}'] = detail[0]
             ws[f'B{row}'] = detail[1]
             ws[f'A{row}'].font = Font(bold=True)
@@ -92,10 +98,25 @@ class ExcelGenerator:
     
     def _create_timeline_sheet(self, wb, plan_data):
         """Create timeline sheet."""
-        ws = wb.create_sheet("Timeline")
+        self._create_table_sheet(wb, "Timeline", self.TIMELINE_HEADERS, self._timeline_rows(plan_data), 25)
+    
+    def _create_roles_sheet(self, wb, plan_data):
+        """Create roles sheet."""
+        self._create_table_sheet(wb, "Team Roles", self.ROLES_HEADERS, self._roles_rows(plan_data), 30)
+    
+    def _create_budget_sheet(self, wb, plan_data):
+        """Create budget sheet."""
+        self._create_table_sheet(wb, "Budget", self.BUDGET_HEADERS, self._budget_rows(plan_data), 20)
+    
+    def _create_tasks_sheet(self, wb, plan_data):
+        """Create tasks sheet."""
+        self._create_table_sheet(wb, "Task Checklist", self.TASK_HEADERS, self._task_rows(plan_data), 25)
+    
+    def _create_table_sheet(self, wb, title, headers, rows, width):
+        """Create a bordered table sheet with a styled header row."""
+        ws = wb.create_sheet(title)
         
         # Headers
-        headers = ['Phase', 'Duration', 'Tasks', 'Dependencies']
         for col, header in enumerate(headers, 1):
             cell = ws.cell(row=1, column=col, value=header)
             cell.font = self.header_font
@@ -103,140 +124,138 @@ class ExcelGenerator:
             cell.alignment = Alignment(horizontal='center')
             cell.border = self.border
         
-        # Timeline data
+        for row, values in enumerate(rows, 2):
+            for col, value in enumerate(values, 1):
+                ws.cell(row=row, column=col, value=value).border = self.border
+        
+        # Auto-adjust column widths
+        for col in range(1, len(headers) + 1):
+            ws.column_dimensions[chr(64 + col)].width = width
+    
+    def _build_write_only_workbook(self, plan_data):
+        """Build the same five sheets with write-only worksheets and shared named styles.
+        
+        Rows are streamed to the workbook instead of being addressed cell by
+        cell, which keeps memory flat for plans with thousands of tasks.
+        """
+        wb = Workbook(write_only=True)
+        header_style = NamedStyle(name="plan_header", font=self.header_font, fill=self.header_fill,
+                                  alignment=Alignment(horizontal='center'), border=self.border)
+        body_style = NamedStyle(name="plan_body", border=self.border)
+        label_style = NamedStyle(name="plan_label", font=Font(bold=True))
+        title_style = NamedStyle(name="plan_title", font=Font(bold=True, size=16))
+        for style in (header_style, body_style, label_style, title_style):
+            wb.add_named_style(style)
+        # Resolve each named style once per workbook; cells then share the precomputed style array.
+        # Kept local because the generator is shared by concurrent exports
+        style_arrays = {}
+        
+        # Event Details Sheet (write-only sheets cannot merge cells, so the title spans A1 only)
+        ws = wb.create_sheet("Event Details")
+        ws.column_dimensions['A'].width = 20
+        ws.column_dimensions['B'].width = 30
+        ws.append([self._styled_cell(style_arrays, ws, "Event Management Plan", "plan_title")])
+        ws.append([])
+        for label, value in self._event_detail_rows(plan_data):
+            ws.append([self._styled_cell(style_arrays, ws, label, "plan_label"), value])
+        
+        tables = [
+            ("Timeline", self.TIMELINE_HEADERS, self._timeline_rows(plan_data), 25),
+            ("Team Roles", self.ROLES_HEADERS, self._roles_rows(plan_data), 30),
+            ("Budget", self.BUDGET_HEADERS, self._budget_rows(plan_data), 20),
+            ("Task Checklist", self.TASK_HEADERS, self._task_rows(plan_data), 25)
+        ]
+        for title, headers, rows, width in tables:
+            ws = wb.create_sheet(title)
+            for col in range(1, len(headers) + 1):
+                ws.column_dimensions[chr(64 + col)].width = width
+            ws.append([self._styled_cell(style_arrays, ws, header, "plan_header") for header in headers])
+            for values in rows:
+                ws.append([self._styled_cell(style_arrays, ws, value, "plan_body") for value in values])
+        
+        return wb
+    
+    def _styled_cell(self, style_arrays, ws, value, style):
+        style_array = style_arrays.get(style)
+        if style_array is None:
+            prototype = WriteOnlyCell(ws)
+            prototype.style = style
+            style_array = style_arrays[style] = prototype._style
+        return Cell(ws, row=1, column=1, value=value, style_array=style_array)
+    
+    def _count_tasks(self, plan_data):
+        """Count checklist tasks, used to pick the rendering mode."""
+        timeline = plan_data.get('ai_plan', {}).get('timeline', [])
+        if not isinstance(timeline, list):
+            return 0
+        return sum(len(phase_data.get('tasks', [])) for phase_data in timeline if isinstance(phase_data, dict))
+    
+    def _event_detail_rows(self, plan_data):
+        event_details = plan_data.get('event_details', {})
+        return [
+            ['Event Type', plan_data.get('event_type', 'General').title()],
+            ['Date', event_details.get('date', 'TBD')],
+            ['Venue', event_details.get('venue', 'TBD')],
+            ['Expected Attendees', str(event_details.get('attendees', 'TBD'))],
+            ['Duration', event_details.get('duration', 'TBD')],
+            ['Budget', event_details.get('budget', 'TBD')],
+            ['Generated On', datetime.now().strftime('%B %d, %Y at %I:%M %p')]
+        ]
+    
+    def _timeline_rows(self, plan_data):
         ai_plan = plan_data.get('ai_plan', {})
         timeline = ai_plan.get('timeline', [])
         
-        row = 2
         if isinstance(timeline, list):
             for phase_data in timeline:
                 if isinstance(phase_data, dict):
-                    phase = phase_data.get('phase', 'Phase')
-                    duration = phase_data.get('duration', 'TBD')
                     tasks = phase_data.get('tasks', [])
                     dependencies = phase_data.get('dependencies', [])
-                    
-                    ws.cell(row=row, column=1, value=phase).border = self.border
-                    ws.cell(row=row, column=2, value=duration).border = self.border
-                    ws.cell(row=row, column=3, value='; '.join(tasks) if tasks else 'No tasks').border = self.border
-                    ws.cell(row=row, column=4, value='; '.join(dependencies) if dependencies else 'None').border = self.border
-                    
-                    row += 1
-        
-        # Auto-adjust column widths
-        for col in range(1, 5):
-            ws.column_dimensions[chr(64 + col)].width = 25
+                    yield [
+                        phase_data.get('phase', 'Phase'),
+                        phase_data.get('duration', 'TBD'),
+                        '; '.join(tasks) if tasks else 'No tasks',
+                        '; '.join(dependencies) if dependencies else 'None'
+                    ]
     
-    def _create_roles_sheet(self, wb, plan_data):
-        """Create roles sheet."""
-        ws = wb.create_sheet("Team Roles")
-        
-        # Headers
-        headers = ['Role Title', 'Responsibilities', 'Required Skills', 'Priority']
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = self.header_font
-            cell.fill = self.header_fill
-            cell.alignment = Alignment(horizontal='center')
-            cell.border = self.border
-        
-        # Roles data
+    def _roles_rows(self, plan_data):
         ai_plan = plan_data.get('ai_plan', {})
         roles = ai_plan.get('roles', [])
         
-        row = 2
         if isinstance(roles, list):
             for role_data in roles:
                 if isinstance(role_data, dict):
-                    title = role_data.get('title', 'Role')
                     responsibilities = role_data.get('responsibilities', [])
                     skills = role_data.get('skills', [])
-                    priority = role_data.get('priority', 'Medium')
-                    
-                    ws.cell(row=row, column=1, value=title).border = self.border
-                    ws.cell(row=row, column=2, value='; '.join(responsibilities) if responsibilities else 'TBD').border = self.border
-                    ws.cell(row=row, column=3, value='; '.join(skills) if skills else 'TBD').border = self.border
-                    ws.cell(row=row, column=4, value=priority).border = self.border
-                    
-                    row += 1
-        
-        # Auto-adjust column widths
-        for col in range(1, 5):
-            ws.column_dimensions[chr(64 + col)].width = 30
+                    yield [
+                        role_data.get('title', 'Role'),
+                        '; '.join(responsibilities) if responsibilities else 'TBD',
+                        '; '.join(skills) if skills else 'TBD',
+                        role_data.get('priority', 'Medium')
+                    ]
     
-    def _create_budget_sheet(self, wb, plan_data):
-        """Create budget sheet."""
-        ws = wb.create_sheet("Budget")
-        
-        # Headers
-        headers = ['Category', 'Amount', 'Percentage', 'Notes']
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = self.header_font
-            cell.fill = self.header_fill
-            cell.alignment = Alignment(horizontal='center')
-            cell.border = self.border
-        
-        # Budget data
+    def _budget_rows(self, plan_data):
         ai_plan = plan_data.get('ai_plan', {})
         budget = ai_plan.get('budget_breakdown', {})
         
-        row = 2
-        total_amount = 0
-        
         if isinstance(budget, dict) and 'categories' in budget:
             for category_data in budget['categories']:
                 if isinstance(category_data, dict):
-                    category = category_data.get('category', 'Category')
-                    amount = category_data.get('amount', '₹0')
-                    percentage = category_data.get('percentage', 0)
-                    notes = category_data.get('notes', '')
-                    
-                    ws.cell(row=row, column=1, value=category).border = self.border
-                    ws.cell(row=row, column=2, value=amount).border = self.border
-                    ws.cell(row=row, column=3, value=f"{percentage}%").border = self.border
-                    ws.cell(row=row, column=4, value=notes).border = self.border
-                    
-                    row += 1
-        
-        # Auto-adjust column widths
-        for col in range(1, 5):
-            ws.column_dimensions[chr(64 + col)].width = 20
+                    yield [
+                        category_data.get('category', 'Category'),
+                        category_data.get('amount', '₹0'),
+                        f"{category_data.get('percentage', 0)}%",
+                        category_data.get('notes', '')
+                    ]
     
-    def _create_tasks_sheet(self, wb, plan_data):
-        """Create tasks sheet."""
-        ws = wb.create_sheet("Task Checklist")
-        
-        # Headers
-        headers = ['Task', 'Assigned Role', 'Priority', 'Deadline', 'Status', 'Notes']
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = self.header_font
-            cell.fill = self.header_fill
-            cell.alignment = Alignment(horizontal='center')
-            cell.border = self.border
-        
+    def _task_rows(self, plan_data):
         # Extract tasks from timeline and roles
         ai_plan = plan_data.get('ai_plan', {})
         timeline = ai_plan.get('timeline', [])
         
-        row = 2
         if isinstance(timeline, list):
             for phase_data in timeline:
                 if isinstance(phase_data, dict):
                     phase = phase_data.get('phase', 'Phase')
-                    tasks = phase_data.get('tasks', [])
-                    
-                    for task in tasks:
-                        ws.cell(row=row, column=1, value=task).border = self.border
-                        ws.cell(row=row, column=2, value='TBD').border = self.border
-                        ws.cell(row=row, column=3, value='Medium').border = self.border
-                        ws.cell(row=row, column=4, value='TBD').border = self.border
-                        ws.cell(row=row, column=5, value='Pending').border = self.border
-                        ws.cell(row=row, column=6, value=f'Part of {phase}').border = self.border
-                        
-                        row += 1
-        
-        # Auto-adjust column widths
-        for col in range(1, 7):
-            ws.column_dimensions[chr(64 + col)].width = 25
+                    for task in phase_data.get('tasks', []):
+                        yield [task, 'TBD', 'Medium', 'TBD', 'Pending', f'Part of {phase}']
@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump a format's version whenever its generator output changes so stale
+# artifacts are no longer served.
+RENDERER_VERSIONS = {"pdf": "1", "excel": "1"}
+FILE_PREFIXES = {"pdf": "action_plan", "excel": "event_plan"}
+FILE_EXTENSIONS = {"pdf": "pdf", "excel": "xlsx"}
+MIME_TYPES = {
+    "pdf": "application/pdf",
+    "excel": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+}
+
+class ExportCache:
+    """Content-addressed cache of rendered exports with a size and age quota."""
+
+    def __init__(self, export_dir: str = 'exports', max_bytes: Optional[int] = None,
+                 max_age_seconds: Optional[int] = None, sweep_interval: int = 60):
+        self.export_dir = export_dir
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv('EXPORT_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+        self.max_age_seconds = max_age_seconds if max_age_seconds is not None else int(os.getenv('EXPORT_CACHE_MAX_AGE', 7 * 24 * 3600))
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        # Disk usage as measured by the last sweep; stats() never scans the directory
+        self.files = 0
+        self.bytes = 0
+        self.swept_at: Optional[float] = None
+        self.hits = 0
+        self.misses = 0
+        self.files_evicted = 0
+        self.bytes_reclaimed = 0
+    
+    @staticmethod
+    def content_key(plan_data: Dict[str, Any], export_format: str) -> str:
+        """Hash the plan content together with the format and renderer version."""
+        canonical = json.dumps(plan_data, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+        digest = hashlib.sha256()
+        digest.update(f"{export_format}:{RENDERER_VERSIONS[export_format]}\n".encode('utf-8'))
+        digest.update(canonical.encode('utf-8'))
+        return digest.hexdigest()
+    
+    def path_for(self, plan_data: Dict[str, Any], export_format: str) -> str:
+        """Return the artifact path for a plan in the given format."""
+        key = self.content_key(plan_data, export_format)
+        plan_id = plan_data.get('plan_id', 'unknown')
+        filename = f"{FILE_PREFIXES[export_format]}_{plan_id}_{key[:16]}.{FILE_EXTENSIONS[export_format]}"
+        return os.path.join(self.export_dir, filename)
+    
+    def lookup(self, plan_data: Dict[str, Any], export_format: str) -> Optional[str]:
+        """Return the path of an existing artifact, or None if it must be rendered."""
+        path = self.path_for(plan_data, export_format)
+        if os.path.exists(path):
+            try:
+                # Refresh mtime so the quota sweep treats it as recently used
+                os.utime(path, None)
+            except OSError:
+                pass
+            with self._lock:
+                self.hits += 1
+            return path
+        with self._lock:
+            self.misses += 1
+        return None
+    
+    def get_or_render(self, plan_data: Dict[str, Any], export_format: str,
+                      render: Callable[[Dict[str, Any], str], str]) -> str:
+        """Return a cached artifact or render one with render(plan_data, filepath)."""
+        path = self.lookup(plan_data, export_format)
+        if path:
+            return path
+        
+        path = self.path_for(plan_data, export_format)
+        os.makedirs(self.export_dir, exist_ok=True)
+        # Render to a private temp name so concurrent renders never expose a partial file
+        tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        try:
+            render(plan_data, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        
+        self.maybe_sweep()
+        return path
+    
+    def invalidate_plan(self, plan_id: str) -> int:
+        """Delete every cached artifact of a plan. Returns the number of files removed."""
+        removed = 0
+        marker = f"_{plan_id}_"
+        for entry in self._scan():
+            if marker in entry.name and self._remove(entry.path, entry.stat().st_size):
+                removed += 1
+        return removed
+    
+    def maybe_sweep(self) -> None:
+        """Run sweep() if the sweep interval has elapsed."""
+        with self._lock:
+            if time.time() - self._last_sweep < self.sweep_interval:
+                return
+            self._last_sweep = time.time()
+        self.sweep()
+    
+    def sweep(self) -> int:
+        """Evict expired artifacts, then the least recently used until under quota."""
+        now = time.time()
+        files = []
+        for entry in self._scan():
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        
+        removed = 0
+        total_bytes = 0
+        remaining = []
+        for mtime, size, path in files:
+            if self.max_age_seconds and now - mtime > self.max_age_seconds:
+                if self._remove(path, size):
+                    removed += 1
+            else:
+                remaining.append((mtime, size, path))
+                total_bytes += size
+        
+        remaining.sort()
+        files = len(remaining)
+        for mtime, size, path in remaining:
+            if total_bytes <= self.max_bytes:
+                break
+            if self._remove(path, size):
+                removed += 1
+                files -= 1
+                total_bytes -= size
+        with self._lock:
+            self.files = files
+            self.bytes = total_bytes
+            self.swept_at = now
+        
+        if removed:
+            logger.info(f"Export cache sweep removed {removed} files")
+        return removed
+    
+    def stats(self) -> Dict[str, Any]:
+        """Report hit/miss counters, eviction totals and disk usage as of the last sweep."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "files": self.files,
+                "bytes": self.bytes,
+                "swept_at": self.swept_at,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "files_evicted": self.files_evicted,
+                "bytes_reclaimed": self.bytes_reclaimed
+            }
+    
+    def _scan(self):
+        try:
+            return [entry for entry in os.scandir(self.export_dir)
+                    if entry.is_file() and not entry.name.endswith('.tmp')]
+        except FileNotFoundError:
+            return []
+    
+    def _remove(self, path: str, size: int) -> bool:
+        try:
+            os.remove(path)
+        except OSError:
+            return False
+        with self._lock:
+            self.files_evicted += 1
+            self.bytes_reclaimed += size
+        return True
@@ -0,0 +1,181 @@
+import os
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS export_jobs (
+    job_id TEXT PRIMARY KEY,
+    plan_id TEXT,
+    format TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    finished_at REAL,
+    file_path TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_export_jobs_created ON export_jobs (created_at);
+"""
+INSERT_JOB = "INSERT INTO export_jobs (job_id, plan_id, format, status, created_at) VALUES (?, ?, ?, 'queued', ?)"
+SELECT_JOB = ("SELECT job_id, plan_id, format, status, created_at, finished_at, file_path, error "
+              "FROM export_jobs WHERE job_id = ?")
+MARK_RUNNING = "UPDATE export_jobs SET status = 'running' WHERE job_id = ? AND status = 'queued'"
+FINISH_JOB = "UPDATE export_jobs SET status = ?, finished_at = ?, file_path = ?, error = ? WHERE job_id = ?"
+# Unfinished jobs past the TTL belong to a worker that died
+PRUNE_JOBS = "DELETE FROM export_jobs WHERE COALESCE(finished_at, created_at) < ?"
+COUNT_JOBS = "SELECT COUNT(*) FROM export_jobs"
+JOB_FIELDS = ("job_id", "plan_id", "format", "status", "created_at", "finished_at", "file_path", "error")
+
+class ExportQueueFull(Exception):
+    """Raised when the export queue has reached its pending-job limit."""
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def _render_export(job_id: str, db_path: str, export_format: str, plan_data: Dict[str, Any]) -> str:
+    """Render a plan inside a worker process and return the generated file path."""
+    from services.export_cache import ExportCache
+    try:
+        conn = _connect(db_path)
+        with conn:
+            conn.execute(MARK_RUNNING, (job_id,))
+        conn.close()
+    except sqlite3.Error as e:
+        logger.warning(f"Could not mark export job {job_id} running: {e}")
+    if export_format == 'pdf':
+        from services.pdf_generator import PDFGenerator
+        render = PDFGenerator().generate_plan_pdf
+    else:
+        from services.excel_generator import ExcelGenerator
+        render = ExcelGenerator().generate_plan_excel
+    return ExportCache().get_or_render(plan_data, export_format, render)
+
+class ExportQueue:
+    """Background PDF/Excel rendering on a process pool.
+
+    Job state lives in a SQLite table shared by every worker process, so a
+    job submitted to one gunicorn worker can be polled through any other.
+    The pool starts its processes with forkserver (spawn where that is not
+    available) rather than forking this multi-threaded process.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 job_ttl_seconds: Optional[int] = None, db_path: Optional[str] = None,
+                 on_complete: Optional[Callable[[str, str, float], None]] = None):
+        self.max_workers = max_workers or int(os.getenv('EXPORT_WORKERS', min(4, os.cpu_count() or 1)))
+        self.max_pending = max_pending or int(os.getenv('EXPORT_MAX_PENDING', 32))
+        self.job_ttl_seconds = job_ttl_seconds or int(os.getenv('EXPORT_JOB_TTL', 3600))
+        self.db_path = db_path or os.getenv('EXPORT_JOBS_DB_PATH', os.path.join('data', 'export_jobs.db'))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Jobs this process submitted, with their futures; status is read from the shared table
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Called with (format, status, seconds from submit to finish) for every finished job
+        self.on_complete = on_complete
+        
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().executescript(SCHEMA)
+    
+    def submit(self, export_format: str, plan_data: Dict[str, Any]) -> str:
+        """Queue a render job and return its job ID."""
+        conn = self._connection()
+        with self._lock:
+            self._prune(conn)
+            if self._pending_count() >= self.max_pending:
+                raise ExportQueueFull(f"Export queue is full ({self.max_pending} pending jobs)")
+            
+            if self._executor is None:
+                start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context(start_method))
+            
+            job_id = str(uuid.uuid4())
+            created_at = time.time()
+            with conn:
+                conn.execute(INSERT_JOB, (job_id, plan_data.get('plan_id'), export_format, created_at))
+            future = self._executor.submit(_render_export, job_id, self.db_path, export_format, plan_data)
+            self._jobs[job_id] = {"future": future, "format": export_format, "created_at": created_at,
+                                  "finished_at": None}
+        
+        future.add_done_callback(lambda f, job_id=job_id: self._on_done(job_id, f))
+        return job_id
+    
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the public status of a job, or None if it is unknown."""
+        row = self._connection().execute(SELECT_JOB, (job_id,)).fetchone()
+        return dict(zip(JOB_FIELDS, row)) if row else None
+    
+    def future(self, job_id: str) -> Optional[Future]:
+        """Return the Future (resolving to the file path) of a job submitted by this process."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job["future"] if job else None
+    
+    def stats(self) -> Dict[str, Any]:
+        """Report queue depth and limits."""
+        jobs = self._connection().execute(COUNT_JOBS).fetchone()[0]
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending_count(),
+                "jobs": jobs
+            }
+    
+    def shutdown(self) -> None:
+        """Stop the worker pool, waiting for running jobs."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+    
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._local.conn = _connect(self.db_path)
+            self._local.pid = os.getpid()
+        return conn
+    
+    def _on_done(self, job_id: str, future: Future) -> None:
+        finished_at = time.time()
+        file_path, error = None, None
+        try:
+            file_path = future.result()
+            status = "done"
+        except Exception as e:
+            logger.error(f"Export job {job_id} failed: {e}")
+            error = str(e)
+            status = "failed"
+        conn = self._connection()
+        with conn:
+            conn.execute(FINISH_JOB, (status, finished_at, file_path, error, job_id))
+        with self._lock:
+            job = self._jobs[job_id]
+            job["finished_at"] = finished_at
+            export_format, elapsed = job["format"], finished_at - job["created_at"]
+        if self.on_complete is not None:
+            self.on_complete(export_format, status, elapsed)
+    
+    def _pending_count(self) -> int:
+        return sum(1 for job in self._jobs.values() if job["finished_at"] is None)
+    
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        cutoff = time.time() - self.job_ttl_seconds
+        with conn:
+            conn.execute(PRUNE_JOBS, (cutoff,))
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["finished_at"] is not None and job["finished_at"] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
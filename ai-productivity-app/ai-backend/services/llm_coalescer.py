@@ -0,0 +1,90 @@
+import os
+import json
+import hashlib
+import logging
+from contextlib import asynccontextmanager, nullcontext
+from typing import Any, AsyncContextManager, Callable, ContextManager, Dict, Hashable, List
+from services.llm_scheduler import LLMWaitTimeout
+from services.single_flight import AsyncSingleFlight, SingleFlight
+
+logger = logging.getLogger(__name__)
+
+WAIT_TIMEOUT_RETRY_AFTER = 5  # Seconds; the shared call keeps running, so a retry often finds its result cached
+
+@asynccontextmanager
+async def _no_guard():
+    yield
+
+class CoalescingLLM:
+    """Share one upstream call between concurrent identical invoke() calls.
+
+    Wraps a LangChain chat model. Calls with the same message list (and the
+    same keyword arguments) that overlap in time run once; every caller gets
+    the same result or exception. invoke() and ainvoke() coalesce separately.
+    A caller that waits longer than wait_timeout for a shared call gets
+    LLMWaitTimeout, which routes answer with 503 and Retry-After.
+    Other attributes (stream, astream, batch, ...) are passed through to the
+    wrapped model unchanged.
+    """
+
+    def __init__(self, llm, wait_timeout: float = None):
+        self.llm = llm
+        self.wait_timeout = wait_timeout if wait_timeout is not None else float(os.getenv('LLM_COALESCE_WAIT_TIMEOUT', 120))
+        self._flight = SingleFlight()
+        self._aflight = AsyncSingleFlight()
+    
+    def invoke(self, messages: List, **kwargs) -> Any:
+        return self.invoke_guarded(messages, nullcontext, **kwargs)
+    
+    def invoke_guarded(self, messages: List, guard: Callable[[], ContextManager], scope: Hashable = None,
+                       **kwargs) -> Any:
+        """Like invoke(), but the call that goes upstream runs inside guard().
+
+        Callers that join an in-flight call never enter the guard, so an
+        admission slot is only taken once per upstream request. Only calls
+        with the same scope (the admission priority) are coalesced.
+        """
+        key = self._key(messages, kwargs, scope)
+        
+        def call():
+            with guard():
+                return self.llm.invoke(messages, **kwargs)
+        
+        # A waiter that times out leaves without cancelling the shared call
+        try:
+            return self._flight.do(key, call, timeout=self.wait_timeout)
+        except TimeoutError:
+            raise LLMWaitTimeout("LLM is responding slowly, please retry shortly", WAIT_TIMEOUT_RETRY_AFTER) from None
+    
+    async def ainvoke(self, messages: List, **kwargs) -> Any:
+        return await self.ainvoke_guarded(messages, _no_guard, **kwargs)
+    
+    async def ainvoke_guarded(self, messages: List, guard: Callable[[], AsyncContextManager], scope: Hashable = None,
+                              **kwargs) -> Any:
+        """Async invoke_guarded(); guard() is an async context manager."""
+        key = self._key(messages, kwargs, scope)
+        
+        async def call():
+            async with guard():
+                return await self.llm.ainvoke(messages, **kwargs)
+        
+        try:
+            return await self._aflight.do(key, call, timeout=self.wait_timeout)
+        except TimeoutError:
+            raise LLMWaitTimeout("LLM is responding slowly, please retry shortly", WAIT_TIMEOUT_RETRY_AFTER) from None
+    
+    def stats(self) -> Dict[str, int]:
+        """Report in-flight, executed and coalesced call counts."""
+        sync_stats = self._flight.stats()
+        async_stats = self._aflight.stats()
+        return {name: sync_stats[name] + async_stats[name] for name in sync_stats}
+    
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+    
+    @staticmethod
+    def _key(messages: List, kwargs: Dict[str, Any], scope: Hashable = None) -> str:
+        parts = [(getattr(message, 'type', type(message).__name__), getattr(message, 'content', message))
+                 for message in messages]
+        raw = json.dumps([parts, kwargs, scope], sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
@@ -0,0 +1,390 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Route label of the request making an LLM call; the web apps set it per request.
+# Calls made off-request (summaries, catalogue warming) keep the default.
+current_route: contextvars.ContextVar = contextvars.ContextVar("llm_hedge_route", default="background")
+
+OUTCOMES = ("primary_won", "backup_won", "over_budget", "no_capacity")
+KINDS = ("invoke", "stream")
+
+_END = object()  # First "chunk" of a stream that produced nothing
+
+def parse_budgets(spec: str) -> Dict[str, float]:
+    """Parse per-route hedge budgets: "route=fraction,route=fraction"."""
+    budgets = {}
+    for item in spec.split(','):
+        route, _, fraction = item.strip().rpartition('=')
+        if route.strip():
+            budgets[route.strip()] = float(fraction)
+    return budgets
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def _first_success(futures: List[Future]) -> Future:
+    # First future to finish without an exception, or the last one to fail
+    pending = set(futures)
+    while True:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        succeeded = [future for future in done if future.exception() is None]
+        if succeeded or not pending:
+            return (succeeded or list(done))[0]
+
+async def _afirst_success(tasks: List[asyncio.Task]) -> asyncio.Task:
+    pending = set(tasks)
+    while True:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        succeeded = [task for task in done if task.exception() is None]
+        if succeeded or not pending:
+            return (succeeded or list(done))[0]
+
+async def _anext(chunks: AsyncIterator) -> Any:
+    try:
+        return await chunks.__anext__()
+    except StopAsyncIteration:
+        return _END
+
+def _discard_result(task: asyncio.Task) -> None:
+    # A losing task that failed should not log "exception was never retrieved"
+    if not task.cancelled():
+        task.exception()
+
+class _Route:
+    def __init__(self, window: int):
+        self.latencies = {kind: deque(maxlen=window) for kind in KINDS}
+        self.tokens = 0.0
+        self.calls = 0
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+
+class HedgedLLM:
+    """Send a backup request when an LLM call runs into the latency tail.
+
+    Wraps a LangChain chat model. Once a call has run longer than the given
+    percentile of recent latencies for its route (time to first chunk for
+    streams), the same request goes to backup, a smaller and faster model or
+    the primary itself, and whichever answers first is used. The other call
+    is cancelled: async calls are cancelled and streams closed, while a sync
+    invoke() cannot be interrupted, so its result is dropped when it arrives.
+
+    Each call earns its route budget hedge tokens and a hedge spends one, so
+    hedges are capped at that fraction of a route's calls (plus a small
+    burst). With a scheduler, a hedge also needs a batch-priority slot and
+    rate token from LLMScheduler.try_acquire(), held until the backup call
+    ends, so hedges never queue, never take the interactive reserve and stay
+    within the provider quota. on_hedge(route, outcome) reports each hedge
+    as primary_won or backup_won, and each slow call that could not hedge as
+    over_budget (no budget) or no_capacity (no free slot or rate token).
+    """
+
+    def __init__(self, primary, backup=None, percentile: Optional[float] = None, budget: Optional[float] = None,
+                 scheduler=None, on_hedge: Optional[Callable[[str, str], None]] = None):
+        self.primary = primary
+        self.backup = backup if backup is not None else primary
+        self.scheduler = scheduler
+        self.enabled = os.getenv('LLM_HEDGE_ENABLED', 'True').lower() == 'true'
+        self.percentile = percentile if percentile is not None else float(os.getenv('LLM_HEDGE_PERCENTILE', 0.95))
+        self.budget = budget if budget is not None else float(os.getenv('LLM_HEDGE_BUDGET', 0.1))
+        # Off-request work is never urgent enough to pay for a hedge by default
+        self.route_budgets = parse_budgets(os.getenv('LLM_HEDGE_ROUTE_BUDGETS', 'background=0'))
+        self.burst = float(os.getenv('LLM_HEDGE_BURST', 5))
+        self.window = int(os.getenv('LLM_HEDGE_WINDOW', 200))
+        self.min_samples = int(os.getenv('LLM_HEDGE_MIN_SAMPLES', 20))
+        self.min_delay = float(os.getenv('LLM_HEDGE_MIN_DELAY', 0.1))
+        self.on_hedge = on_hedge
+        self._routes: Dict[str, _Route] = {}
+        self._lock = threading.Lock()
+        # Runs the primary and backup of sync calls that may hedge, so the caller can leave with the winner
+        self._executor = ThreadPoolExecutor(max_workers=int(os.getenv('LLM_HEDGE_THREADS', 64)),
+                                            thread_name_prefix="llm-hedge")
+    
+    def invoke(self, messages: List, **kwargs) -> Any:
+        if not self.enabled:
+            return self.primary.invoke(messages, **kwargs)
+        route, delay = self._start("invoke")
+        started = time.perf_counter()
+        if delay is None:
+            result = self.primary.invoke(messages, **kwargs)
+            self._finish(route, "invoke", time.perf_counter() - started)
+            return result
+        
+        primary = self._submit(self._timed, route, "invoke", lambda: self.primary.invoke(messages, **kwargs))
+        if wait([primary], timeout=delay).done:
+            return primary.result()
+        release = self._take(route)
+        if release is None:
+            return primary.result()
+        
+        backup = self._submit(self.backup.invoke, messages, **kwargs)
+        # A losing sync backup runs to completion, so it keeps its slot until then
+        backup.add_done_callback(lambda _: release())
+        winner = _first_success([primary, backup])
+        self._record(route, "primary_won" if winner is primary else "backup_won")
+        (backup if winner is primary else primary).cancel()
+        return winner.result()
+    
+    async def ainvoke(self, messages: List, **kwargs) -> Any:
+        if not self.enabled:
+            return await self.primary.ainvoke(messages, **kwargs)
+        route, delay = self._start("invoke")
+        started = time.perf_counter()
+        if delay is None:
+            result = await self.primary.ainvoke(messages, **kwargs)
+            self._finish(route, "invoke", time.perf_counter() - started)
+            return result
+        
+        primary = asyncio.ensure_future(self._atimed(route, "invoke", self.primary.ainvoke(messages, **kwargs)))
+        backup = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            release = None if done else self._take(route)
+            if release is None:
+                return await primary
+            backup = asyncio.ensure_future(self.backup.ainvoke(messages, **kwargs))
+            backup.add_done_callback(lambda _: release())
+            winner = await _afirst_success([primary, backup])
+            self._record(route, "primary_won" if winner is primary else "backup_won")
+            return winner.result()
+        finally:
+            # Cancels the loser, or both calls if the caller was cancelled
+            self._cancel(primary, backup)
+    
+    def stream(self, messages: List, **kwargs) -> Iterator:
+        if not self.enabled:
+            yield from self.primary.stream(messages, **kwargs)
+            return
+        route, delay = self._start("stream")
+        started = time.perf_counter()
+        chunks = iter(self.primary.stream(messages, **kwargs))
+        release = None
+        try:
+            if delay is None:
+                first = next(chunks, _END)
+                self._finish(route, "stream", time.perf_counter() - started)
+            else:
+                chunks, first, release = self._first_chunk(route, chunks, delay, messages, kwargs)
+            if first is not _END:
+                yield first
+                yield from chunks
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+            if release is not None:
+                release()
+    
+    async def astream(self, messages: List, **kwargs) -> AsyncIterator:
+        if not self.enabled:
+            async for chunk in self.primary.astream(messages, **kwargs):
+                yield chunk
+            return
+        route, delay = self._start("stream")
+        started = time.perf_counter()
+        chunks = self.primary.astream(messages, **kwargs).__aiter__()
+        release = None
+        try:
+            if delay is None:
+                first = await _anext(chunks)
+                self._finish(route, "stream", time.perf_counter() - started)
+            else:
+                chunks, first, release = await self._afirst_chunk(route, chunks, delay, messages, kwargs)
+            if first is not _END:
+                yield first
+                async for chunk in chunks:
+                    yield chunk
+        finally:
+            aclose = getattr(chunks, 'aclose', None)
+            if aclose is not None:
+                await aclose()
+            if release is not None:
+                release()
+    
+    def delays(self) -> Dict[Tuple[str, str], float]:
+        """Current hedge delay in seconds, keyed by (route, kind), for routes with enough samples."""
+        with self._lock:
+            samples = {(name, kind): list(latencies) for name, route in self._routes.items()
+                       for kind, latencies in route.latencies.items() if len(latencies) >= self.min_samples}
+        return {key: max(self.min_delay, percentile(values, self.percentile)) for key, values in samples.items()}
+    
+    def stats(self) -> Dict[str, Any]:
+        """Report per-route calls, hedge outcomes, remaining budget and hedge delays."""
+        delays = self.delays()
+        with self._lock:
+            routes = {
+                name: {
+                    "calls": route.calls,
+                    "hedges": route.outcomes["primary_won"] + route.outcomes["backup_won"],
+                    **route.outcomes,
+                    "budget": self.route_budgets.get(name, self.budget),
+                    "budget_tokens": round(route.tokens, 2),
+                    "delay_ms": {kind: round(delays[(name, kind)] * 1000, 1) for kind in KINDS
+                                 if (name, kind) in delays}
+                }
+                for name, route in self._routes.items()
+            }
+        return {
+            "enabled": self.enabled,
+            "percentile": self.percentile,
+            "separate_backup": self.backup is not self.primary,
+            "routes": routes
+        }
+    
+    def __getattr__(self, name):
+        return getattr(self.primary, name)
+    
+    def _start(self, kind: str) -> Tuple[str, Optional[float]]:
+        # Count the call, earn budget and return the hedge delay (None when hedging is not possible)
+        name = current_route.get()
+        with self._lock:
+            route = self._routes.get(name)
+            if route is None:
+                route = self._routes[name] = _Route(self.window)
+            route.calls += 1
+            route.tokens = min(self.burst, route.tokens + self.route_budgets.get(name, self.budget))
+            latencies = route.latencies[kind]
+            if len(latencies) < self.min_samples:
+                return name, None
+            if route.tokens < 1:
+                # The call runs inline; _finish() counts it if it turns out slow
+                return name, None
+            values = list(latencies)
+        return name, max(self.min_delay, percentile(values, self.percentile))
+    
+    def _take(self, name: str) -> Optional[Callable[[], None]]:
+        # Spend a budget token and admit the backup; returns the call that frees its slot, or None
+        with self._lock:
+            route = self._routes[name]
+            if route.tokens < 1:
+                outcome = "over_budget"
+            elif self.scheduler is None:
+                route.tokens -= 1
+                return lambda: None
+            else:
+                lease = self.scheduler.try_acquire("batch")
+                if lease is not None:
+                    route.tokens -= 1
+                    return lease.release
+                outcome = "no_capacity"
+        self._record(name, outcome)
+        return None
+    
+    def _observe(self, name: str, kind: str, seconds: float) -> None:
+        with self._lock:
+            self._routes[name].latencies[kind].append(seconds)
+    
+    def _finish(self, name: str, kind: str, seconds: float) -> None:
+        # An unhedged call: record its latency and whether it would have been hedged
+        with self._lock:
+            route = self._routes[name]
+            latencies = route.latencies[kind]
+            slow = len(latencies) >= self.min_samples and seconds > max(
+                self.min_delay, percentile(list(latencies), self.percentile))
+            latencies.append(seconds)
+        if slow:
+            self._record(name, "over_budget")
+    
+    def _record(self, name: str, outcome: str) -> None:
+        with self._lock:
+            self._routes[name].outcomes[outcome] += 1
+        if self.on_hedge is not None:
+            try:
+                self.on_hedge(name, outcome)
+            except Exception as e:
+                logger.warning(f"LLM hedge callback failed: {e}")
+    
+    def _submit(self, fn: Callable, *args, **kwargs) -> Future:
+        # Worker threads see the caller's context variables (route label, LangChain callbacks)
+        return self._executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+    
+    def _timed(self, name: str, kind: str, call: Callable[[], Any]) -> Any:
+        # Primary latencies feed the percentile even when the primary loses a hedge
+        started = time.perf_counter()
+        result = call()
+        self._observe(name, kind, time.perf_counter() - started)
+        return result
+    
+    async def _atimed(self, name: str, kind: str, call) -> Any:
+        started = time.perf_counter()
+        try:
+            result = await call
+        except asyncio.CancelledError:
+            # A cancelled primary was at least this slow; keep the sample so the percentile isn't biased low
+            self._observe(name, kind, time.perf_counter() - started)
+            raise
+        self._observe(name, kind, time.perf_counter() - started)
+        return result
+    
+    @staticmethod
+    def _cancel(*tasks) -> None:
+        for task in tasks:
+            if task is not None and not task.done():
+                task.add_done_callback(_discard_result)
+                task.cancel()
+            elif task is not None:
+                _discard_result(task)
+    
+    def _first_chunk(self, name: str, chunks: Iterator, delay: float, messages: List,
+                     kwargs: Dict[str, Any]) -> Tuple[Iterator, Any, Optional[Callable[[], None]]]:
+        # Race the primary's first chunk against a backup stream started after delay. Also returns
+        # the release for the backup's slot when the caller goes on with the backup stream.
+        primary = self._submit(self._timed, name, "stream", lambda: next(chunks, _END))
+        if wait([primary], timeout=delay).done:
+            return chunks, primary.result(), None
+        release = self._take(name)
+        if release is None:
+            return chunks, primary.result(), None
+        
+        backup_chunks = iter(self.backup.stream(messages, **kwargs))
+        backup = self._submit(next, backup_chunks, _END)
+        winner = _first_success([primary, backup])
+        self._record(name, "primary_won" if winner is primary else "backup_won")
+        # A generator can't be closed while another thread is inside next(); close it once its first chunk is in
+        if winner is primary:
+            backup.add_done_callback(lambda _: (getattr(backup_chunks, 'close', lambda: None)(), release()))
+            return chunks, primary.result(), None
+        primary.add_done_callback(lambda _: getattr(chunks, 'close', lambda: None)())
+        if backup.exception() is not None:
+            release()
+        return backup_chunks, backup.result(), release
+    
+    async def _afirst_chunk(self, name: str, chunks: AsyncIterator, delay: float, messages: List,
+                            kwargs: Dict[str, Any]) -> Tuple[AsyncIterator, Any, Optional[Callable[[], None]]]:
+        primary = asyncio.ensure_future(self._atimed(name, "stream", _anext(chunks)))
+        backup = None
+        release = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            release = None if done else self._take(name)
+            if release is None:
+                return chunks, await primary, None
+            backup_chunks = self.backup.astream(messages, **kwargs).__aiter__()
+            backup = asyncio.ensure_future(_anext(backup_chunks))
+            winner = await _afirst_success([primary, backup])
+            self._record(name, "primary_won" if winner is primary else "backup_won")
+            loser, loser_chunks = (backup, backup_chunks) if winner is primary else (primary, chunks)
+            if loser.done():
+                await loser_chunks.aclose()
+            if winner is primary:
+                return chunks, primary.result(), None
+            first, handed_off = backup.result(), release
+            release = None  # The caller releases the slot when it closes the backup stream
+            return backup_chunks, first, handed_off
+        finally:
+            # Cancelling a pending __anext__() finishes that generator; wait so it is no longer
+            # running when the caller closes it
+            pending = [task for task in (primary, backup) if task is not None and not task.done()]
+            self._cancel(primary, backup)
+            if pending:
+                await asyncio.wait(pending)
+            if release is not None:
+                release()
@@ -0,0 +1,344 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+from langchain_core.runnables import RunnableLambda
+
+logger = logging.getLogger(__name__)
+
+# Lower number is served first
+PRIORITIES = {"interactive": 0, "standard": 1, "batch": 2}
+
+class SchedulerBusy(Exception):
+    """Raised when an LLM call cannot be admitted; carries a Retry-After hint in seconds."""
+
+    status = 429
+    
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class LLMWaitTimeout(SchedulerBusy):
+    """Raised when a caller gives up waiting for a shared in-flight LLM call."""
+
+    status = 503
+
+class TokenBucket:
+    """Token-bucket rate limiter refilled continuously at rate_per_second."""
+
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate_per_second = rate_per_second
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+    
+    def try_take(self) -> float:
+        """Take a token. Returns 0 on success, otherwise seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate_per_second
+
+class Lease:
+    """An admitted LLM call slot. release() is idempotent."""
+
+    def __init__(self, scheduler: "LLMScheduler", priority: int):
+        self._scheduler = scheduler
+        self.priority = priority
+        self._released = False
+        self._lock = threading.Lock()
+    
+    def release(self) -> None:
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._scheduler._release(self)
+
+class _Ticket:
+    def __init__(self, priority: int, user_key: str, wake: Optional[Callable[[], None]] = None):
+        self.priority = priority
+        self.user_key = user_key
+        self.granted = False
+        self.enqueued_at = time.monotonic()
+        # Async waiters are woken through their event loop rather than the condition
+        self.wake = wake
+
+class LLMScheduler:
+    """Admission control for LLM calls.
+
+    Enforces a global concurrency cap and a token-bucket rate limit matched to
+    the provider quota. Waiting calls are served by priority class
+    (interactive, standard, batch) and round-robin across users within a
+    class. A few slots are held back for interactive calls so background
+    work never occupies all of them. When a class's queue is full, or a call
+    waits longer than its class allows, SchedulerBusy is raised so the route
+    can answer 429 with Retry-After. Threads and coroutines (aacquire) share
+    the same queues and limits.
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None, rate_per_minute: Optional[float] = None,
+                 burst: Optional[int] = None, max_queue_depth: Optional[int] = None,
+                 interactive_reserve: Optional[int] = None,
+                 on_admit: Optional[Callable[[str, float], None]] = None):
+        self.max_concurrency = max_concurrency or int(os.getenv('LLM_MAX_CONCURRENCY', 8))
+        self.rate_per_minute = rate_per_minute or float(os.getenv('LLM_RATE_PER_MINUTE', 30))
+        self.max_queue_depth = max_queue_depth or int(os.getenv('LLM_MAX_QUEUE_DEPTH', 32))
+        reserve = interactive_reserve if interactive_reserve is not None else int(os.getenv('LLM_INTERACTIVE_RESERVE', 2))
+        self.interactive_reserve = min(reserve, self.max_concurrency - 1)
+        self.max_wait = {
+            PRIORITIES["interactive"]: float(os.getenv('LLM_MAX_QUEUE_WAIT', 20)),
+            PRIORITIES["standard"]: float(os.getenv('LLM_MAX_QUEUE_WAIT', 20)),
+            PRIORITIES["batch"]: float(os.getenv('LLM_BATCH_MAX_QUEUE_WAIT', 600))
+        }
+        self._bucket = TokenBucket(self.rate_per_minute / 60.0, burst or int(os.getenv('LLM_RATE_BURST', 5)))
+        self._cond = threading.Condition()
+        # priority -> user -> FIFO of tickets; user order gives round-robin
+        self._queues: Dict[int, "OrderedDict[str, deque]"] = {p: OrderedDict() for p in PRIORITIES.values()}
+        self._depth = {p: 0 for p in PRIORITIES.values()}
+        self._active = {p: 0 for p in PRIORITIES.values()}
+        self._next_token_in = 0.0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait_seconds = 0.0
+        # Called with (priority, seconds waited) for every admitted call
+        self.on_admit = on_admit
+    
+    def acquire(self, priority: str = "interactive", user_id: Optional[str] = None) -> Lease:
+        """Block until the call is admitted and return its Lease, or raise SchedulerBusy."""
+        level = PRIORITIES.get(priority, PRIORITIES["standard"])
+        with self._cond:
+            if self._depth[level] >= self.max_queue_depth:
+                self.rejected += 1
+                raise SchedulerBusy("LLM queue is full, please retry shortly", self._retry_after(level))
+            
+            ticket = _Ticket(level, str(user_id or "anonymous"))
+            self._queues[level].setdefault(ticket.user_key, deque()).append(ticket)
+            self._depth[level] += 1
+            deadline = ticket.enqueued_at + self.max_wait[level]
+            
+            while True:
+                self._dispatch()
+                if ticket.granted:
+                    waited = time.monotonic() - ticket.enqueued_at
+                    self.total_wait_seconds += waited
+                    break
+                
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._remove(ticket)
+                    self.timed_out += 1
+                    raise SchedulerBusy("LLM capacity exhausted, please retry shortly", self._retry_after(level))
+                wait = remaining if self._next_token_in <= 0 else min(remaining, self._next_token_in)
+                self._cond.wait(wait)
+        
+        return self._admitted(priority, level, waited)
+    
+    async def aacquire(self, priority: str = "interactive", user_id: Optional[str] = None) -> Lease:
+        """acquire() for coroutines: waits on the event loop instead of blocking a thread."""
+        level = PRIORITIES.get(priority, PRIORITIES["standard"])
+        loop = asyncio.get_running_loop()
+        granted = asyncio.Event()
+        with self._cond:
+            if self._depth[level] >= self.max_queue_depth:
+                self.rejected += 1
+                raise SchedulerBusy("LLM queue is full, please retry shortly", self._retry_after(level))
+            
+            ticket = _Ticket(level, str(user_id or "anonymous"), wake=lambda: loop.call_soon_threadsafe(granted.set))
+            self._queues[level].setdefault(ticket.user_key, deque()).append(ticket)
+            self._depth[level] += 1
+            deadline = ticket.enqueued_at + self.max_wait[level]
+        
+        try:
+            while True:
+                with self._cond:
+                    self._dispatch()
+                    if ticket.granted:
+                        waited = time.monotonic() - ticket.enqueued_at
+                        self.total_wait_seconds += waited
+                        break
+                    
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._remove(ticket)
+                        self.timed_out += 1
+                        raise SchedulerBusy("LLM capacity exhausted, please retry shortly", self._retry_after(level))
+                    wait = remaining if self._next_token_in <= 0 else min(remaining, self._next_token_in)
+                    granted.clear()
+                try:
+                    await asyncio.wait_for(granted.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            # The caller went away while queued; give back whatever it holds
+            with self._cond:
+                if ticket.granted:
+                    self._active[level] -= 1
+                    self._dispatch()
+                    self._cond.notify_all()
+                else:
+                    self._remove(ticket)
+            raise
+        
+        return self._admitted(priority, level, waited)
+    
+    def try_acquire(self, priority: str = "batch") -> Optional[Lease]:
+        """Admit a call only if a slot and a rate token are free now and no call is waiting; never queues.
+
+        For optional work such as hedged requests. Returns None instead of
+        raising when the call would have to wait.
+        """
+        level = PRIORITIES.get(priority, PRIORITIES["standard"])
+        with self._cond:
+            if any(self._depth.values()) or sum(self._active.values()) >= self.max_concurrency:
+                return None
+            background_active = sum(n for p, n in self._active.items() if p != PRIORITIES["interactive"])
+            if level != PRIORITIES["interactive"] and background_active >= self.max_concurrency - self.interactive_reserve:
+                return None
+            if self._bucket.try_take() > 0:
+                return None
+            self._active[level] += 1
+            self.admitted += 1
+        return Lease(self, level)
+    
+    @contextmanager
+    def slot(self, priority: str = "interactive", user_id: Optional[str] = None) -> Iterator[Lease]:
+        """Context manager holding an admitted slot for the duration of the block."""
+        lease = self.acquire(priority, user_id)
+        try:
+            yield lease
+        finally:
+            lease.release()
+    
+    @asynccontextmanager
+    async def aslot(self, priority: str = "interactive", user_id: Optional[str] = None) -> AsyncIterator[Lease]:
+        """Async context manager holding an admitted slot for the duration of the block."""
+        lease = await self.aacquire(priority, user_id)
+        try:
+            yield lease
+        finally:
+            lease.release()
+    
+    def invoke(self, runnable, messages: List, priority: str = "interactive",
+               user_id: Optional[str] = None, **kwargs) -> Any:
+        """Invoke runnable once admitted.
+
+        Runnables that coalesce identical calls expose invoke_guarded(); only
+        the call that actually goes upstream then takes a slot, and callers
+        joining it do not queue. Calls only join others of the same priority,
+        so an interactive caller never waits behind a queued batch call.
+        """
+        invoke_guarded = getattr(runnable, 'invoke_guarded', None)
+        if invoke_guarded is not None:
+            return invoke_guarded(messages, lambda: self.slot(priority, user_id), scope=priority, **kwargs)
+        with self.slot(priority, user_id):
+            return runnable.invoke(messages, **kwargs)
+    
+    async def ainvoke(self, runnable, messages: List, priority: str = "interactive",
+                      user_id: Optional[str] = None, **kwargs) -> Any:
+        """Async invoke(): admission waits and the call itself run on the event loop."""
+        ainvoke_guarded = getattr(runnable, 'ainvoke_guarded', None)
+        if ainvoke_guarded is not None:
+            return await ainvoke_guarded(messages, lambda: self.aslot(priority, user_id), scope=priority, **kwargs)
+        async with self.aslot(priority, user_id):
+            return await runnable.ainvoke(messages, **kwargs)
+    
+    def as_runnable(self, runnable, priority: str = "batch", **kwargs) -> RunnableLambda:
+        """Wrap runnable for LangChain batch APIs.
+
+        Inputs are {"messages": [...], "user_id": ...} dicts; each element is
+        admitted separately, so batch fan-out obeys the same limits. kwargs
+        are passed to every call.
+        """
+        return RunnableLambda(lambda item: self.invoke(runnable, item["messages"], priority, item.get("user_id"),
+                                                       **kwargs))
+    
+    def stats(self) -> Dict[str, Any]:
+        """Report queue depth, active calls and admission counters."""
+        names = {level: name for name, level in PRIORITIES.items()}
+        with self._cond:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "rate_per_minute": self.rate_per_minute,
+                "active": {names[p]: n for p, n in self._active.items()},
+                "queued": {names[p]: n for p, n in self._depth.items()},
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "avg_wait_ms": round(self.total_wait_seconds / self.admitted * 1000, 1) if self.admitted else 0.0
+            }
+    
+    def in_flight(self) -> int:
+        with self._cond:
+            return sum(self._active.values())
+    
+    def _admitted(self, priority: str, level: int, waited: float) -> Lease:
+        lease = Lease(self, level)
+        if self.on_admit is not None:
+            self.on_admit(priority if priority in PRIORITIES else "standard", waited)
+        return lease
+    
+    def _release(self, lease: Lease) -> None:
+        with self._cond:
+            self._active[lease.priority] -= 1
+            self._dispatch()
+            self._cond.notify_all()
+    
+    def _dispatch(self) -> None:
+        """Grant waiting tickets while capacity and rate allow. Caller holds the lock."""
+        granted = False
+        self._next_token_in = 0.0
+        while sum(self._active.values()) < self.max_concurrency:
+            ticket = self._next_ticket()
+            if ticket is None:
+                break
+            wait = self._bucket.try_take()
+            if wait > 0:
+                self._next_token_in = wait
+                break
+            self._remove(ticket)
+            # Round-robin: a user who still has calls waiting goes to the back
+            users = self._queues[ticket.priority]
+            if ticket.user_key in users:
+                users.move_to_end(ticket.user_key)
+            ticket.granted = True
+            self._active[ticket.priority] += 1
+            self.admitted += 1
+            granted = True
+            if ticket.wake is not None:
+                ticket.wake()
+        if granted:
+            self._cond.notify_all()
+    
+    def _next_ticket(self) -> Optional[_Ticket]:
+        background_active = sum(n for p, n in self._active.items() if p != PRIORITIES["interactive"])
+        for level in sorted(self._queues):
+            users = self._queues[level]
+            if not users:
+                continue
+            if level != PRIORITIES["interactive"] and background_active >= self.max_concurrency - self.interactive_reserve:
+                return None
+            return users[next(iter(users))][0]
+        return None
+    
+    def _remove(self, ticket: _Ticket) -> None:
+        users = self._queues[ticket.priority]
+        queue = users.get(ticket.user_key)
+        if queue is None or ticket not in queue:
+            return
+        queue.remove(ticket)
+        if not queue:
+            del users[ticket.user_key]
+        self._depth[ticket.priority] -= 1
+    
+    def _retry_after(self, level: int) -> int:
+        queued = sum(n for p, n in self._depth.items() if p <= level)
+        return max(1, int(queued * 60 / self.rate_per_minute / max(1, self.max_concurrency)) + 1)
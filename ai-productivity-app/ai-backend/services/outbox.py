@@ -0,0 +1,331 @@
+import os
+import json
+import math
+import time
+import uuid
+import asyncio
+import sqlite3
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    idempotency_key TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_next_attempt ON outbox (next_attempt_at);
+"""
+INSERT_MESSAGE = "INSERT INTO outbox (path, payload, enqueued_at, idempotency_key, next_attempt_at) VALUES (?, ?, ?, ?, ?)"
+SELECT_DUE = "SELECT id, path, payload, enqueued_at, attempts, idempotency_key FROM outbox WHERE next_attempt_at <= ? ORDER BY id LIMIT ?"
+DELETE_MESSAGE = "DELETE FROM outbox WHERE id = ?"
+RESCHEDULE_MESSAGE = "UPDATE outbox SET attempts = ?, next_attempt_at = ? WHERE id = ?"
+LEASE_MESSAGE = "UPDATE outbox SET next_attempt_at = ? WHERE id = ?"
+COUNT_MESSAGES = "SELECT COUNT(*) FROM outbox"
+NEXT_DUE = "SELECT MIN(next_attempt_at) FROM outbox"
+
+class NotificationOutbox:
+    """Durable, non-blocking delivery of notifications to the Node.js server.
+
+    Messages are written to a local SQLite queue on the request path and
+    delivered by a background worker over a pooled keep-alive session. Each
+    wake-up drains up to batch_size due messages; failures are retried with
+    exponential backoff until max_attempts. Under an event loop, run_async()
+    replaces the worker thread with a task using an httpx.AsyncClient.
+
+    Delivery is at-least-once: a claimed batch is leased for as long as its
+    posts can take, and every post carries an Idempotency-Key header that
+    the Node.js server de-duplicates on, so a redelivery after a crash or an
+    expired lease does not repeat its side effects.
+    """
+
+    def __init__(self, base_url: Optional[str] = None, db_path: Optional[str] = None,
+                 batch_size: Optional[int] = None, max_attempts: Optional[int] = None,
+                 timeout: Optional[float] = None, session: Optional[requests.Session] = None,
+                 on_delivery: Optional[Callable[[float], None]] = None):
+        self.base_url = (base_url or os.getenv('NODE_SERVER_URL', 'http://localhost:5000')).rstrip('/')
+        self.db_path = db_path or os.getenv('OUTBOX_DB_PATH', os.path.join('data', 'outbox.db'))
+        self.batch_size = batch_size or int(os.getenv('OUTBOX_BATCH_SIZE', 20))
+        self.max_attempts = max_attempts or int(os.getenv('OUTBOX_MAX_ATTEMPTS', 8))
+        self.timeout = timeout or float(os.getenv('OUTBOX_TIMEOUT', 5))
+        self.base_backoff = 1.0
+        self.max_backoff = 300.0
+        self.pool_size = int(os.getenv('OUTBOX_POOL_SIZE', 4))
+        self.session = session or self._create_session()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.delivered = 0
+        self.failed_attempts = 0
+        self.dropped = 0
+        self.last_delivery_latency_ms: Optional[float] = None
+        self._latency_total_ms = 0.0
+        # Called with the enqueue-to-delivery latency in seconds
+        self.on_delivery = on_delivery
+        self._async_wake: Optional[Callable[[], None]] = None
+        
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        if "idempotency_key" not in {row[1] for row in conn.execute("PRAGMA table_info(outbox)")}:
+            try:
+                conn.execute("ALTER TABLE outbox ADD COLUMN idempotency_key TEXT")
+            except sqlite3.OperationalError:
+                pass  # Another worker added it first
+    
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+    
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+    
+    def enqueue(self, path: str, payload: Dict[str, Any]) -> None:
+        """Durably queue a JSON POST to path and wake the delivery worker."""
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute(INSERT_MESSAGE, (path, json.dumps(payload, default=str), now, uuid.uuid4().hex, now))
+        if self._async_wake is not None:
+            self._async_wake()
+            return
+        self.start()
+        self._wake.set()
+    
+    def start(self) -> None:
+        """Start the background delivery worker if it is not running in this process."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="notification-outbox", daemon=True)
+            self._thread.start()
+    
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the worker after its current batch."""
+        self._stop.set()
+        self._wake.set()
+        if self._async_wake is not None:
+            self._async_wake()
+        if self._thread is not None:
+            self._thread.join(timeout)
+    
+    def flush(self) -> int:
+        """Deliver every due message now, in the calling thread. Returns the number delivered."""
+        total = 0
+        while True:
+            delivered, attempted = self._deliver_batch()
+            total += delivered
+            if attempted < self.batch_size or delivered == 0:
+                return total
+    
+    def stats(self) -> Dict[str, Any]:
+        """Report queue depth, delivery counters and latency."""
+        depth = self._connection().execute(COUNT_MESSAGES).fetchone()[0]
+        with self._lock:
+            return {
+                "queue_depth": depth,
+                "delivered": self.delivered,
+                "failed_attempts": self.failed_attempts,
+                "dropped": self.dropped,
+                "last_delivery_latency_ms": self.last_delivery_latency_ms,
+                "avg_delivery_latency_ms": round(self._latency_total_ms / self.delivered, 1) if self.delivered else None
+            }
+    
+    async def run_async(self, client=None) -> None:
+        """Deliver from the running event loop until stop() or cancellation.
+
+        Stops the worker thread first. Due messages in a batch are posted
+        concurrently over one pooled httpx.AsyncClient. SQLite claims and
+        updates run in the default executor.
+        """
+        import httpx
+        
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+        self.stop()
+        self._stop.clear()
+        self._async_wake = lambda: loop.call_soon_threadsafe(wake.set)
+        owns_client = client is None
+        if owns_client:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            client = httpx.AsyncClient(timeout=self.timeout, limits=limits)
+        try:
+            while not self._stop.is_set():
+                try:
+                    delivered, attempted = await self._adeliver_batch(client)
+                except Exception as e:
+                    logger.error(f"Outbox delivery loop error: {e}")
+                    delivered, attempted = 0, 0
+                
+                if attempted == self.batch_size and delivered:
+                    continue  # More may be due right away
+                try:
+                    await asyncio.wait_for(wake.wait(), self._seconds_until_next_due())
+                except asyncio.TimeoutError:
+                    pass
+                wake.clear()
+        finally:
+            self._async_wake = None
+            if owns_client:
+                await client.aclose()
+    
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                delivered, attempted = self._deliver_batch()
+            except Exception as e:
+                logger.error(f"Outbox delivery loop error: {e}")
+                delivered, attempted = 0, 0
+            
+            if attempted == self.batch_size and delivered:
+                continue  # More may be due right away
+            self._wake.wait(self._seconds_until_next_due())
+            self._wake.clear()
+    
+    def _seconds_until_next_due(self) -> float:
+        next_due = self._connection().execute(NEXT_DUE).fetchone()[0]
+        if next_due is None:
+            return 60.0
+        return min(60.0, max(0.05, next_due - time.time()))
+    
+    def _claim_due(self, conn: sqlite3.Connection, concurrency: int = 1) -> List[tuple]:
+        """Lease due messages so other worker processes sharing the queue skip them.
+
+        The lease covers the whole batch: one post can take a connect plus a
+        read timeout, and concurrency posts run at a time.
+        """
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(SELECT_DUE, (now, self.batch_size)).fetchall()
+            rounds = math.ceil(len(rows) / concurrency)
+            lease_until = now + rounds * (self.timeout * 2 + 1)
+            conn.executemany(LEASE_MESSAGE, [(lease_until, row[0]) for row in rows])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return rows
+    
+    def _deliver_batch(self):
+        conn = self._connection()
+        rows = self._claim_due(conn)
+        delivered = 0
+        for message_id, path, payload, enqueued_at, attempts, key in rows:
+            if self._post(path, payload, key):
+                with conn:
+                    conn.execute(DELETE_MESSAGE, (message_id,))
+                self._record_delivery(enqueued_at)
+                delivered += 1
+            else:
+                self._reschedule(conn, message_id, attempts + 1)
+        return delivered, len(rows)
+    
+    async def _adeliver_batch(self, client):
+        loop = asyncio.get_running_loop()
+        rows = await loop.run_in_executor(None, lambda: self._claim_due(self._connection(), self.pool_size))
+        if not rows:
+            return 0, 0
+        results = await asyncio.gather(*(self._apost(client, path, payload, key) for _, path, payload, _, _, key in rows))
+        
+        def settle():
+            conn = self._connection()
+            for (message_id, _, _, enqueued_at, attempts, _), ok in zip(rows, results):
+                if ok:
+                    with conn:
+                        conn.execute(DELETE_MESSAGE, (message_id,))
+                    self._record_delivery(enqueued_at)
+                else:
+                    self._reschedule(conn, message_id, attempts + 1)
+        
+        await loop.run_in_executor(None, settle)
+        return sum(1 for ok in results if ok), len(rows)
+    
+    async def _apost(self, client, path: str, payload: str, key: Optional[str]) -> bool:
+        import httpx
+        
+        try:
+            response = await client.post(
+                f"{self.base_url}{path}",
+                content=payload.encode('utf-8'),
+                headers=self._headers(key)
+            )
+            if response.status_code < 500:
+                if response.status_code >= 400:
+                    logger.warning(f"Node.js server rejected {path}: HTTP {response.status_code}")
+                return True
+            logger.warning(f"Node.js server error for {path}: HTTP {response.status_code}")
+        except httpx.HTTPError as e:
+            logger.warning(f"Failed to notify Node.js server: {e}")
+        return False
+    
+    @staticmethod
+    def _headers(key: Optional[str]) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if key:  # Messages queued before keys were added have none
+            headers["Idempotency-Key"] = key
+        return headers
+    
+    def _post(self, path: str, payload: str, key: Optional[str]) -> bool:
+        try:
+            response = self.session.post(
+                f"{self.base_url}{path}",
+                # bytes lets http.client send headers and body in one segment
+                data=payload.encode('utf-8'),
+                headers=self._headers(key),
+                timeout=self.timeout
+            )
+            if response.status_code < 500:
+                if response.status_code >= 400:
+                    logger.warning(f"Node.js server rejected {path}: HTTP {response.status_code}")
+                return True
+            logger.warning(f"Node.js server error for {path}: HTTP {response.status_code}")
+        except requests.RequestException as e:
+            logger.warning(f"Failed to notify Node.js server: {e}")
+        return False
+    
+    def _reschedule(self, conn: sqlite3.Connection, message_id: int, attempts: int) -> None:
+        with self._lock:
+            self.failed_attempts += 1
+        with conn:
+            if attempts >= self.max_attempts:
+                conn.execute(DELETE_MESSAGE, (message_id,))
+                with self._lock:
+                    self.dropped += 1
+                logger.error(f"Dropping outbox message {message_id} after {attempts} attempts")
+                return
+            backoff = min(self.max_backoff, self.base_backoff * (2 ** (attempts - 1)))
+            conn.execute(RESCHEDULE_MESSAGE, (attempts, time.time() + backoff, message_id))
+    
+    def _record_delivery(self, enqueued_at: float) -> None:
+        latency_ms = round((time.time() - enqueued_at) * 1000, 1)
+        with self._lock:
+            self.delivered += 1
+            self.last_delivery_latency_ms = latency_ms
+            self._latency_total_ms += latency_ms
+        if self.on_delivery is not None:
+            self.on_delivery(latency_ms / 1000)
@@ -28,14 +28,17 @@ class PDFGenerator:
             textColor=colors.darkblue
         )
     
-    def generate_plan_pdf(self, plan_data):
+    def generate_plan_pdf(self, plan_data, output=None):
         """Generate PDF for action plan."""
         try:
-            # Create exports directory if it doesn't exist
-            os.makedirs('exports', exist_ok=True)
-            
-            filename = f"action_plan_{plan_data.get('plan_id', 'unknown')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-            filepath = os.path.join('exports', filename)
+            # output may be a path or a writable binary file object
+            filepath = output
+            if not filepath:
+                # Create exports directory if it doesn't exist
+                os.makedirs('exports', exist_ok=True)
+                
+                filename = f"action_plan_{plan_data.get('plan_id', 'unknown')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+                filepath = os.path.join('exports', filename)
             
             doc = SimpleDocTemplate(filepath, pagesize=A4)
             story = []
@@ -170,7 +173,8 @@ class PDFGenerator:
             # Build PDF
             doc.build(story)
             
-            logger.info(f"PDF generated successfully: {filepath}")
+            if isinstance(filepath, str):
+                logger.info(f"PDF generated successfully: {filepath}")
             return filepath
             
         except Exception as e:
@@ -0,0 +1,135 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+from services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+class PlanLookup:
+    """Read-through plan lookup: the plan store first, then MongoDB.
+
+    Plans loaded from the database are promoted into the plan store. IDs that
+    exist nowhere are remembered for a short TTL, and concurrent misses on the
+    same ID share a single database query. A new plan can still be in the
+    database service's write buffer (and in another worker's plan store), so
+    an ID is only remembered as missing once a second miss comes more than
+    two flush intervals after the first.
+    """
+
+    def __init__(self, plan_store, db_service, negative_ttl_seconds: Optional[float] = None,
+                 max_negative_entries: int = 10000):
+        self.plan_store = plan_store
+        self.db_service = db_service
+        self.negative_ttl_seconds = negative_ttl_seconds if negative_ttl_seconds is not None else float(os.getenv('PLAN_NEGATIVE_CACHE_TTL', 10))
+        self.max_negative_entries = max_negative_entries
+        self._missing: "OrderedDict[str, float]" = OrderedDict()
+        # plan_id -> time of a first miss not yet confirmed by a later one
+        self._first_misses: "OrderedDict[str, float]" = OrderedDict()
+        self.confirm_after_seconds = 2 * float(getattr(db_service, 'flush_interval', 0))
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self.store_hits = 0
+        self.db_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.db_errors = 0
+    
+    def get(self, plan_id: str, fields: Optional[Iterable[str]] = None,
+            fresh: bool = False) -> Optional[Dict[str, Any]]:
+        """Return a plan, or only the requested top-level fields of it, or None if it does not exist.
+
+        fresh=True bypasses the plan store's per-process read cache.
+        """
+        plan_data = self.plan_store.get(plan_id, fresh=fresh)
+        if plan_data is not None:
+            self._count('store_hits')
+            return self._project(plan_data, fields)
+        
+        if self._is_known_missing(plan_id):
+            self._count('negative_hits')
+            return None
+        
+        field_key = tuple(sorted(fields)) if fields else None
+        plan_data = self._flight.do((plan_id, field_key), lambda: self._load(plan_id, field_key))
+        return plan_data
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "store_hits": self.store_hits,
+                "db_hits": self.db_hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "db_errors": self.db_errors,
+                "negative_entries": len(self._missing),
+                "unconfirmed_misses": len(self._first_misses),
+                "coalesced_db_reads": self._flight.coalesced
+            }
+    
+    def _load(self, plan_id: str, fields: Optional[tuple]) -> Optional[Dict[str, Any]]:
+        # Never return Mongo's ObjectId; it is not JSON serializable
+        projection = {field: 1 for field in fields} if fields else {}
+        projection["_id"] = 0
+        
+        try:
+            plan_data = self.db_service.get_event_plan(plan_id, projection=projection, raise_errors=True)
+        except Exception as e:
+            # A failed read says nothing about whether the plan exists, so it is not negative-cached
+            logger.error(f"Failed to retrieve event plan {plan_id}: {e}")
+            self._count('db_errors')
+            return None
+        if plan_data is None:
+            self._count('misses')
+            self._remember_missing(plan_id)
+            return None
+        
+        self._count('db_hits')
+        with self._lock:
+            self._first_misses.pop(plan_id, None)
+        if not fields:
+            # Only complete documents are promoted; projections would poison the store
+            self.plan_store.put(plan_id, plan_data)
+        return plan_data
+    
+    def _is_known_missing(self, plan_id: str) -> bool:
+        with self._lock:
+            expires_at = self._missing.get(plan_id)
+            if expires_at is None:
+                return False
+            if expires_at < time.time():
+                del self._missing[plan_id]
+                return False
+            return True
+    
+    def _remember_missing(self, plan_id: str) -> None:
+        if self.negative_ttl_seconds <= 0:
+            return
+        now = time.time()
+        with self._lock:
+            if self.confirm_after_seconds > 0:
+                first_miss = self._first_misses.get(plan_id)
+                if first_miss is None:
+                    self._first_misses[plan_id] = now
+                    while len(self._first_misses) > self.max_negative_entries:
+                        self._first_misses.popitem(last=False)
+                    return
+                if now - first_miss < self.confirm_after_seconds:
+                    return
+                del self._first_misses[plan_id]
+            self._missing[plan_id] = now + self.negative_ttl_seconds
+            self._missing.move_to_end(plan_id)
+            while len(self._missing) > self.max_negative_entries:
+                self._missing.popitem(last=False)
+    
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+    
+    @staticmethod
+    def _project(plan_data: Dict[str, Any], fields: Optional[Iterable[str]]) -> Dict[str, Any]:
+        if not fields:
+            return plan_data
+        return {field: plan_data[field] for field in fields if field in plan_data}
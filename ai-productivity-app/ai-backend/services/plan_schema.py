@@ -0,0 +1,275 @@
+import re
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Type
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from services.plan_stream_parser import parse_json_response
+
+logger = logging.getLogger(__name__)
+
+_FENCE_PATTERN = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+_TRAILING_COMMA_PATTERN = re.compile(r",\s*([}\]])")
+
+class _LenientModel(BaseModel):
+    # Models often write amounts and durations as bare numbers
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+class PlanTask(_LenientModel):
+    task: str
+    assignee: str = ""
+
+class PlanCard(_LenientModel):
+    id: str = ""
+    title: str
+    description: str = ""
+    category: str = Field("", description="planning|execution|logistics|marketing|finance")
+    priority: str = Field("", description="high|medium|low")
+    timeline: str = ""
+    budget_estimate: str = Field("", description="In ₹ with Indian number formatting")
+    tasks: List[PlanTask] = []
+    resources: List[str] = []
+    dependencies: List[str] = []
+
+class PlanPhase(_LenientModel):
+    phase: str
+    duration: str = ""
+    key_activities: List[str] = []
+
+class PlanTimeline(_LenientModel):
+    total_duration: str = ""
+    phases: List[PlanPhase] = []
+
+class BudgetLine(_LenientModel):
+    category: str
+    amount: str = ""
+    percentage: float = 0
+    
+    @field_validator('percentage', mode='before')
+    @classmethod
+    def strip_percent_sign(cls, value):
+        return value.strip().rstrip('%') if isinstance(value, str) else value
+
+class BudgetSummary(_LenientModel):
+    total_estimate: str = ""
+    breakdown: List[BudgetLine] = []
+
+class TeamRole(_LenientModel):
+    role: str
+    responsibilities: List[str] = []
+    skills_required: List[str] = []
+
+class RiskFactor(_LenientModel):
+    risk: str
+    impact: str = Field("", description="high|medium|low")
+    mitigation: str = ""
+
+class ActionPlan(_LenientModel):
+    title: str
+    overview: str = ""
+    cards: List[PlanCard] = Field(..., min_length=1, description="5-8 actionable cards")
+    timeline: PlanTimeline = PlanTimeline()
+    budget_summary: BudgetSummary = BudgetSummary()
+    team_roles: List[TeamRole] = []
+    success_metrics: List[str] = []
+    risk_factors: List[RiskFactor] = []
+
+class ActionPlanResponse(_LenientModel):
+    """Return the generated event action plan."""
+    action_plan: ActionPlan
+
+class SuggestedRole(_LenientModel):
+    title: str
+    priority: str = Field("", description="high|medium|low")
+    responsibilities: List[str] = []
+    skills: List[str] = []
+    experience: str = Field("", description="Recommended experience level")
+    time_commitment: str = ""
+
+class RoleSuggestions(_LenientModel):
+    """Return the suggested team roles, most essential first."""
+    roles: List[SuggestedRole] = Field(..., min_length=1)
+
+class CardSection(_LenientModel):
+    """Return the revised action card."""
+    card: PlanCard
+
+class TimelineSection(_LenientModel):
+    """Return the revised timeline."""
+    timeline: PlanTimeline
+
+class BudgetSection(_LenientModel):
+    """Return the revised budget summary."""
+    budget_summary: BudgetSummary
+
+class RiskSection(_LenientModel):
+    """Return the revised risk factors."""
+    risk_factors: List[RiskFactor] = Field(..., min_length=1)
+
+class StructuredOutputError(ValueError):
+    """LLM output that could not be parsed or repaired into the expected schema."""
+
+    def __init__(self, message: str, text: str):
+        super().__init__(message)
+        self.text = text
+
+def _strip_defaults(node: Any) -> Any:
+    # Defaults only matter to local validation; leaving them out keeps the tool schema small
+    if isinstance(node, dict):
+        return {key: _strip_defaults(value) for key, value in node.items() if key != "default"}
+    if isinstance(node, list):
+        return [_strip_defaults(value) for value in node]
+    return node
+
+def tool_kwargs(schema: Type[BaseModel]) -> Dict[str, Any]:
+    """Model call kwargs that force a single tool call whose arguments follow schema."""
+    return {
+        "tools": [_strip_defaults(convert_to_openai_tool(schema))],
+        "tool_choice": {"type": "function", "function": {"name": schema.__name__}}
+    }
+
+PLAN_TOOL = tool_kwargs(ActionPlanResponse)
+ROLE_TOOL = tool_kwargs(RoleSuggestions)
+
+def response_text(message) -> str:
+    """JSON text of a model reply: the tool call's arguments if it made one, else its content."""
+    for call in getattr(message, 'tool_calls', None) or []:
+        return json.dumps(call["args"], ensure_ascii=False)
+    # Arguments that failed to parse are kept raw so they can still be repaired
+    for call in getattr(message, 'invalid_tool_calls', None) or []:
+        if call.get("args"):
+            return call["args"]
+    return message.content
+
+def failed_generation(error: Exception) -> Optional[str]:
+    """Raw output the provider rejected as malformed tool arguments (Groq's tool_use_failed), if any."""
+    body = getattr(error, 'body', None)
+    if isinstance(body, dict):
+        details = body.get("error", body)
+        if isinstance(details, dict) and isinstance(details.get("failed_generation"), str):
+            return details["failed_generation"]
+    return None
+
+def invoke_text(invoke: Callable[[List], Any], messages: List) -> str:
+    """Call the model and return its reply's JSON text, keeping rejected tool output for repair."""
+    try:
+        return response_text(invoke(messages))
+    except Exception as e:
+        text = failed_generation(e)
+        if text is None:
+            raise
+        return text
+
+async def ainvoke_text(ainvoke: Callable[[List], Awaitable[Any]], messages: List) -> str:
+    """Async invoke_text()."""
+    try:
+        return response_text(await ainvoke(messages))
+    except Exception as e:
+        text = failed_generation(e)
+        if text is None:
+            raise
+        return text
+
+def chunk_text(chunk) -> str:
+    """Text carried by a streamed chunk: tool-call argument fragments, else content."""
+    fragments = [call.get("args") or "" for call in getattr(chunk, 'tool_call_chunks', None) or []]
+    return "".join(fragments) or chunk.content
+
+def repair_json(text: str) -> str:
+    """Best-effort fix for common LLM JSON faults: code fences, trailing commas and truncation."""
+    text = _FENCE_PATTERN.sub("", text.strip())
+    start = min((index for index in (text.find('{'), text.find('[')) if index != -1), default=-1)
+    if start == -1:
+        return text
+    text = _TRAILING_COMMA_PATTERN.sub(r"\1", text[start:])
+    
+    # Close whatever a truncated response left open
+    closers = []
+    in_string = escape = False
+    for char in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            closers.append('}' if char == '{' else ']')
+        elif char in '}]' and closers:
+            closers.pop()
+    if in_string:
+        text += '"'
+    text = re.sub(r'[,:]\s*$', "", text.rstrip())
+    if closers and closers[-1] == '}':
+        # A dangling key with no value ({"a": 1, "b") cannot be completed; drop it
+        text = re.sub(r',\s*"[^"]*"\s*$', "", text)
+    return _TRAILING_COMMA_PATTERN.sub(r"\1", text + "".join(reversed(closers)))
+
+def parse_structured(text: str, schema: Type[BaseModel]) -> Dict[str, Any]:
+    """Parse LLM text into schema, repairing it if needed. Raises StructuredOutputError."""
+    error = None
+    # parse_json_response can settle on an inner object of broken JSON, so the repaired
+    # text is tried too before giving up
+    for parse in (parse_json_response, lambda raw: json.loads(repair_json(raw))):
+        try:
+            value = parse(text)
+        except json.JSONDecodeError as e:
+            error = error or StructuredOutputError(f"Response is not valid JSON: {e}", text)
+            continue
+        
+        # Accept the payload without its single wrapper key ({"cards": ...} or a bare role list)
+        wrapper = next(iter(schema.model_fields))
+        if len(schema.model_fields) == 1 and not (isinstance(value, dict) and wrapper in value):
+            value = {wrapper: value}
+        
+        try:
+            return schema.model_validate(value).model_dump()
+        except ValidationError as e:
+            error = error or StructuredOutputError(f"Response does not match {schema.__name__}: {e}", text)
+    raise error
+
+def _retry_messages(messages: List, text: str, error: StructuredOutputError, schema: Type[BaseModel]) -> List:
+    return messages + [
+        AIMessage(content=text),
+        HumanMessage(content=f"That output was invalid ({str(error).splitlines()[0]}). "
+                             f"Respond again with the complete, corrected {schema.__name__}.")
+    ]
+
+def complete_structured(schema: Type[BaseModel], messages: List, invoke: Callable[[List], Any],
+                        retries: int = 1, text: Optional[str] = None) -> Dict[str, Any]:
+    """Parse a model reply into schema, re-asking the model with the error up to retries times.
+
+    invoke(messages) returns a chat message. Pass text to validate a reply
+    that was already received (a stream or a cache entry) before calling the
+    model again.
+    """
+    for attempt in range(retries + 1):
+        if text is None:
+            text = invoke_text(invoke, messages)
+        try:
+            return parse_structured(text, schema)
+        except StructuredOutputError as e:
+            if attempt == retries:
+                raise
+            logger.warning(f"Retrying malformed {schema.__name__} output: {str(e).splitlines()[0]}")
+            messages = _retry_messages(messages, text, e, schema)
+            text = None
+
+async def acomplete_structured(schema: Type[BaseModel], messages: List, ainvoke: Callable[[List], Awaitable[Any]],
+                               retries: int = 1, text: Optional[str] = None) -> Dict[str, Any]:
+    """Async complete_structured(); ainvoke(messages) is a coroutine function."""
+    for attempt in range(retries + 1):
+        if text is None:
+            text = await ainvoke_text(ainvoke, messages)
+        try:
+            return parse_structured(text, schema)
+        except StructuredOutputError as e:
+            if attempt == retries:
+                raise
+            logger.warning(f"Retrying malformed {schema.__name__} output: {str(e).splitlines()[0]}")
+            messages = _retry_messages(messages, text, e, schema)
+            text = None
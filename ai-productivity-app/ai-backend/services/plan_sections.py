@@ -0,0 +1,113 @@
+import copy
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Type
+from pydantic import BaseModel
+from services.plan_schema import BudgetSection, CardSection, RiskSection, TimelineSection, tool_kwargs
+
+# Plan-level sections that can be regenerated; any other section name is a card id
+SECTION_SCHEMAS: Dict[str, Type[BaseModel]] = {
+    "timeline": TimelineSection,
+    "budget_summary": BudgetSection,
+    "risk_factors": RiskSection
+}
+SECTION_TOOLS = {schema: tool_kwargs(schema) for schema in (CardSection, *SECTION_SCHEMAS.values())}
+
+class SectionNotFound(KeyError):
+    """The plan has no section (or card) with the requested name."""
+
+def action_plan_of(plan_data: Dict[str, Any]) -> Dict[str, Any]:
+    """The action plan inside a stored plan document."""
+    return (plan_data.get("ai_response") or {}).get("action_plan") or {}
+
+def available_sections(action_plan: Dict[str, Any]) -> List[str]:
+    """Section names that can be regenerated: the plan-level sections, then card ids."""
+    card_ids = [card.get("id") for card in action_plan.get("cards") or [] if isinstance(card, dict) and card.get("id")]
+    return list(SECTION_SCHEMAS) + card_ids
+
+def section_schema(section: str) -> Type[BaseModel]:
+    """Schema a regenerated section must match."""
+    return SECTION_SCHEMAS.get(section, CardSection)
+
+def get_section(action_plan: Dict[str, Any], section: str) -> Any:
+    """Current value of a section. Raises SectionNotFound."""
+    if section in SECTION_SCHEMAS:
+        return action_plan.get(section)
+    for card in action_plan.get("cards") or []:
+        if isinstance(card, dict) and card.get("id") == section:
+            return card
+    raise SectionNotFound(section)
+
+def plan_outline(action_plan: Dict[str, Any], section: str, overview_chars: int = 300) -> str:
+    """Compact summary of the plan apart from section, as context for regenerating it."""
+    lines = [f"Title: {action_plan.get('title', '')}"]
+    overview = " ".join(str(action_plan.get("overview", "")).split())
+    if overview:
+        lines.append(f"Overview: {overview[:overview_chars]}")
+
+    cards = [card for card in action_plan.get("cards") or [] if isinstance(card, dict)]
+    if cards:
+        lines.append("Cards:")
+        for card in cards:
+            if card.get("id") == section:
+                continue
+            details = ", ".join(str(card[field]) for field in ("category", "priority", "timeline", "budget_estimate")
+                                if card.get(field))
+            lines.append(f"- {card.get('id', '')}: {card.get('title', '')}" + (f" ({details})" if details else ""))
+
+    if section != "timeline":
+        timeline = action_plan.get("timeline") or {}
+        phases = [phase.get("phase", "") for phase in timeline.get("phases") or [] if isinstance(phase, dict)]
+        if timeline.get("total_duration") or phases:
+            lines.append(f"Timeline: {timeline.get('total_duration', '')}; phases: {', '.join(phases)}")
+    if section != "budget_summary":
+        budget = action_plan.get("budget_summary") or {}
+        if budget.get("total_estimate"):
+            lines.append(f"Total budget: {budget['total_estimate']}")
+    if section != "risk_factors":
+        risks = [risk.get("risk", "") for risk in action_plan.get("risk_factors") or [] if isinstance(risk, dict)]
+        if risks:
+            lines.append(f"Risks: {'; '.join(risks)}")
+    return "\n".join(lines)
+
+def section_json(value: Any) -> str:
+    """Compact JSON of a section for the prompt."""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+def merge_section(plan_data: Dict[str, Any], section: str, value: Any, instruction: str,
+                  max_revisions: int = 10) -> Dict[str, Any]:
+    """New version of a stored plan with section replaced by value.
+
+    The replaced value is kept in the plan's revisions (newest last, at most
+    max_revisions) so an edit can be inspected or undone. Raises SectionNotFound.
+    """
+    updated = copy.deepcopy(plan_data)
+    action_plan = action_plan_of(updated)
+    previous = get_section(action_plan, section)
+
+    if section in SECTION_SCHEMAS:
+        action_plan[section] = value
+    else:
+        # The card keeps its id so dependencies and client references stay valid
+        value = {**value, "id": section}
+        action_plan["cards"] = [value if isinstance(card, dict) and card.get("id") == section else card
+                                for card in action_plan["cards"]]
+
+    version = int(plan_data.get("version", 1)) + 1
+    now = datetime.now().isoformat()
+    revisions = list(updated.get("revisions") or [])
+    revisions.append({
+        "version": version,
+        "section": section,
+        "instruction": instruction,
+        "previous": previous,
+        "updated_at": now
+    })
+    updated["revisions"] = revisions[-max_revisions:] if max_revisions > 0 else []
+    updated["version"] = version
+    updated["updated_at"] = now
+    return updated
+
+def stored_version(plan_data: Optional[Dict[str, Any]]) -> int:
+    """Version of a stored plan; plans that were never edited are version 1."""
+    return int((plan_data or {}).get("version", 1))
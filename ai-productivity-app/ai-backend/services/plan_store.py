@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import zlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class PlanStore:
+    """Bounded in-memory plan store.
+
+    Plans are kept as zlib-compressed JSON blobs under a byte budget with LRU
+    and TTL eviction. A small number of recently used plans are also kept
+    decoded so repeated reads (generate -> export -> get) skip decompression.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, ttl_seconds: Optional[int] = None,
+                 hot_entries: Optional[int] = None, compression_level: int = 6):
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv('PLAN_STORE_MAX_BYTES', 64 * 1024 * 1024))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.getenv('PLAN_STORE_TTL', 7 * 24 * 3600))
+        self.hot_entries = hot_entries if hot_entries is not None else int(os.getenv('PLAN_STORE_HOT_ENTRIES', 32))
+        self.compression_level = compression_level
+        self._blobs: "OrderedDict[str, tuple]" = OrderedDict()  # plan_id -> (stored_at, raw_size, blob)
+        self._hot: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Striped per-plan locks for put_if_version(); reads never take them
+        self._version_locks = [threading.Lock() for _ in range(64)]
+        self._stored_bytes = 0
+        self._raw_bytes = 0
+        self._last_sweep = 0.0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def put(self, plan_id: str, plan_data: Dict[str, Any]) -> None:
+        """Store (or replace) a plan."""
+        raw = json.dumps(plan_data, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+        blob = zlib.compress(raw, self.compression_level)
+        
+        with self._lock:
+            self._discard(plan_id)
+            self._blobs[plan_id] = (time.time(), len(raw), blob)
+            self._stored_bytes += len(blob)
+            self._raw_bytes += len(raw)
+            self._remember_hot(plan_id, plan_data)
+            self._enforce_budget()
+    
+    def put_if_version(self, plan_id: str, plan_data: Dict[str, Any], expected_version: int) -> bool:
+        """Replace a plan only if the stored copy is still at expected_version (or is gone). Returns True if stored."""
+        with self._version_locks[hash(plan_id) % len(self._version_locks)]:
+            current = self.get(plan_id)
+            if current is not None and int(current.get('version', 1)) != expected_version:
+                return False
+            self.put(plan_id, plan_data)
+            return True
+    
+    def get(self, plan_id: str, fresh: bool = False) -> Optional[Dict[str, Any]]:
+        """Return a plan by ID, or None if it is unknown or expired.
+
+        fresh is accepted for parity with SQLitePlanStore; this store is the only copy.
+        """
+        with self._lock:
+            entry = self._blobs.get(plan_id)
+            if entry is None:
+                return None
+            
+            stored_at, _, blob = entry
+            if self.ttl_seconds and time.time() - stored_at > self.ttl_seconds:
+                self._discard(plan_id)
+                self.expirations += 1
+                return None
+            
+            self._blobs.move_to_end(plan_id)
+            plan_data = self._hot.get(plan_id)
+            if plan_data is not None:
+                self._hot.move_to_end(plan_id)
+                return plan_data
+        
+        plan_data = json.loads(zlib.decompress(blob).decode('utf-8'))
+        with self._lock:
+            if plan_id in self._blobs:
+                self._remember_hot(plan_id, plan_data)
+        return plan_data
+    
+    def delete(self, plan_id: str) -> bool:
+        """Remove a plan. Returns True if it was present."""
+        with self._lock:
+            return self._discard(plan_id)
+    
+    def __contains__(self, plan_id: str) -> bool:
+        return self.get(plan_id) is not None
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._blobs)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Report entry counts and memory footprint."""
+        with self._lock:
+            return {
+                "backend": "memory",
+                "entries": len(self._blobs),
+                "hot_entries": len(self._hot),
+                "stored_bytes": self._stored_bytes,
+                "raw_bytes": self._raw_bytes,
+                "max_bytes": self.max_bytes,
+                "compression_ratio": round(self._raw_bytes / self._stored_bytes, 2) if self._stored_bytes else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+    
+    def _remember_hot(self, plan_id: str, plan_data: Dict[str, Any]) -> None:
+        if self.hot_entries <= 0:
+            return
+        self._hot[plan_id] = plan_data
+        self._hot.move_to_end(plan_id)
+        while len(self._hot) > self.hot_entries:
+            self._hot.popitem(last=False)
+    
+    def _discard(self, plan_id: str) -> bool:
+        self._hot.pop(plan_id, None)
+        entry = self._blobs.pop(plan_id, None)
+        if entry is None:
+            return False
+        self._stored_bytes -= len(entry[2])
+        self._raw_bytes -= entry[1]
+        return True
+    
+    def _enforce_budget(self) -> None:
+        now = time.time()
+        if self.ttl_seconds and now - self._last_sweep > 60:
+            # Entries are in LRU order, not insertion order, so scan for expired ones
+            self._last_sweep = now
+            expired = [pid for pid, (stored_at, _, _) in self._blobs.items() if now - stored_at > self.ttl_seconds]
+            for plan_id in expired:
+                self._discard(plan_id)
+                self.expirations += 1
+        
+        while self._stored_bytes > self.max_bytes and len(self._blobs) > 1:
+            plan_id = next(iter(self._blobs))
+            self._discard(plan_id)
+            self.evictions += 1
+            logger.info(f"Evicted plan {plan_id} from plan store")
+
+def create_plan_store():
+    """Create the plan store selected by PLAN_STORE_BACKEND (memory or sqlite)."""
+    backend = os.getenv('PLAN_STORE_BACKEND', 'memory').lower()
+    if backend == 'sqlite':
+        from services.sqlite_plan_store import SQLitePlanStore
+        return SQLitePlanStore()
+    if backend != 'memory':
+        logger.warning(f"Unknown PLAN_STORE_BACKEND '{backend}', using in-memory store")
+    return PlanStore()
@@ -0,0 +1,127 @@
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+_FENCE_PATTERN = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+
+def parse_json_response(text: str) -> Any:
+    """Parse a JSON object from an LLM response, tolerating code fences and surrounding prose.
+
+    Raises json.JSONDecodeError if no JSON object can be found.
+    """
+    stripped = text.strip()
+    try:
+        return json.loads(stripped)
+    except json.JSONDecodeError:
+        pass
+    
+    candidates = [match.group(1) for match in _FENCE_PATTERN.finditer(stripped)] + [stripped]
+    decoder = json.JSONDecoder()
+    for candidate in candidates:
+        start = candidate.find('{')
+        while start != -1:
+            try:
+                value, _ = decoder.raw_decode(candidate, start)
+                return value
+            except json.JSONDecodeError:
+                start = candidate.find('{', start + 1)
+    raise json.JSONDecodeError("No JSON object found in response", text, 0)
+
+class IncrementalCardParser:
+    """Pull complete entries of a JSON array (by default "cards") out of a token stream.
+
+    Feed chunks as they arrive; each call returns the array items whose closing
+    brace has been seen. Text before the first '{' (prose, code fences) is ignored.
+    """
+
+    def __init__(self, array_key: str = "cards"):
+        self.array_key = array_key
+        self._text = ""
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        self._last_string_end = -1
+        self._awaiting_array = False
+        self._array_depth: Optional[int] = None
+        self._item_start: Optional[int] = None
+        self.done = False
+        self.items_emitted = 0
+    
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return self._text
+    
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume a chunk and return any array items completed by it."""
+        self._text += chunk
+        items = []
+        if self.done:
+            return items
+        
+        text = self._text
+        while self._pos < len(text):
+            pos = self._pos
+            char = text[pos]
+            self._pos += 1
+            
+            if not self._started:
+                if char == '{':
+                    self._started = True
+                    self._depth = 1
+                continue
+            
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._item_start is None:
+                        self._last_string = text[self._string_start:pos]
+                        self._last_string_end = pos
+                continue
+            
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos + 1
+                self._awaiting_array = False
+            elif char == ':':
+                self._awaiting_array = (self._last_string == self.array_key and
+                                        self._array_depth is None and
+                                        not text[self._last_string_end + 1:pos].strip())
+            elif char in '{[':
+                if self._awaiting_array and char == '[':
+                    self._array_depth = self._depth + 1
+                elif self._array_depth is not None and self._depth == self._array_depth and char == '{':
+                    self._item_start = pos
+                self._awaiting_array = False
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._item_start is not None and self._depth == self._array_depth and char == '}':
+                    item = self._decode(text[self._item_start:pos + 1])
+                    self._item_start = None
+                    if item is not None:
+                        items.append(item)
+                        self.items_emitted += 1
+                elif self._array_depth is not None and self._depth == self._array_depth - 1:
+                    self.done = True
+                    break
+            elif not char.isspace():
+                self._awaiting_array = False
+        
+        return items
+    
+    @staticmethod
+    def _decode(fragment: str) -> Optional[Dict[str, Any]]:
+        try:
+            item = json.loads(fragment)
+        except json.JSONDecodeError:
+            return None
+        return item if isinstance(item, dict) else None
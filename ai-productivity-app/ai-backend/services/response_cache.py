@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """Content-keyed LLM response cache with TTL, LRU eviction and an optional disk tier."""
+
+    def __init__(self, ttl_seconds: Optional[int] = None, max_entries: Optional[int] = None,
+                 disk_dir: Optional[str] = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.getenv('LLM_CACHE_TTL', 3600))
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('LLM_CACHE_MAX_ENTRIES', 256))
+        self.disk_dir = disk_dir if disk_dir is not None else os.getenv('LLM_CACHE_DIR', '')
+        self.enabled = os.getenv('LLM_CACHE_ENABLED', 'True').lower() == 'true'
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+    
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """Build a cache key from whitespace-normalized prompt parts."""
+        normalized = "\x1f".join(" ".join(str(part).split()) for part in parts)
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss."""
+        if not self.enabled:
+            return None
+        
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+        
+        value = self._read_disk(key, now)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self.hits += 1
+        self._remember(key, value, now + self.ttl_seconds)
+        return value
+    
+    def set(self, key: str, value: Any) -> None:
+        """Store a value under key in memory and, if configured, on disk."""
+        if not self.enabled:
+            return
+        
+        expires_at = time.time() + self.ttl_seconds
+        self._remember(key, value, expires_at)
+        self._write_disk(key, value, expires_at)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+    
+    def _remember(self, key: str, value: Any, expires_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+    
+    def _read_disk(self, key: str, now: float) -> Optional[Any]:
+        if not self.disk_dir:
+            return None
+        
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                entry = json.load(file)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Failed to read cache entry {key}: {e}")
+            return None
+        
+        if entry.get("expires_at", 0) <= now:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return entry.get("value")
+    
+    def _write_disk(self, key: str, value: Any, expires_at: float) -> None:
+        if not self.disk_dir:
+            return
+        
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump({"expires_at": expires_at, "value": value}, file, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to write cache entry {key}: {e}")
@@ -0,0 +1,317 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from services.single_flight import SingleFlight
+from services.llm_scheduler import LLMWaitTimeout
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single development process, so no cross-process lock is needed
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Upper bound of each team-size bucket; suggestions are generated for the bound
+TEAM_SIZE_BUCKETS = (3, 6, 10, 15, 25, 50, 100)
+EVENT_SCALES = ("small", "medium", "large")
+# Channel event types (server/models/Channel.js) plus the API default
+DEFAULT_EVENT_TYPES = "hackathon,wedding,conference,workshop,meeting,festival,other,general"
+WAIT_TIMEOUT_RETRY_AFTER = 5  # Seconds; the shared fill keeps running and stores its result for the retry
+
+def team_size_bucket(team_size: Any) -> int:
+    """Bucket a requested team size; unparseable sizes fall back to the default of 5."""
+    try:
+        size = max(1, int(team_size))
+    except (TypeError, ValueError):
+        size = 5
+    return next((bound for bound in TEAM_SIZE_BUCKETS if size <= bound), TEAM_SIZE_BUCKETS[-1])
+
+class RoleCatalogue:
+    """Role suggestions precomputed per (event type, team-size bucket, event scale).
+
+    The input space of suggest-roles is small, so answers are kept in memory
+    and on disk and served without an LLM call. The file is shared by every
+    worker process: saves merge with what is on disk (newest entry per key)
+    under a file lock and replace it atomically. A missing key is filled on
+    first request, with concurrent requests sharing one
+    generate(event_type, team_size, event_scale, priority) call for at most
+    wait_timeout seconds before getting LLMWaitTimeout.
+    A stale entry is still served while a background refresh replaces it.
+    warm() fills or refreshes the configured event types and the most
+    requested keys, at startup and on an interval when enabled.
+    """
+
+    def __init__(self, generate: Optional[Callable[[str, int, str, str], List[Dict[str, Any]]]] = None,
+                 path: Optional[str] = None, ttl_seconds: Optional[int] = None, max_entries: Optional[int] = None):
+        self.generate = generate
+        self.enabled = os.getenv('ROLE_CATALOGUE_ENABLED', 'True').lower() == 'true'
+        self.path = path if path is not None else os.getenv('ROLE_CATALOGUE_PATH', os.path.join('data', 'role_catalogue.json'))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.getenv('ROLE_CATALOGUE_TTL', 7 * 24 * 3600))
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('ROLE_CATALOGUE_MAX_ENTRIES', 2000))
+        self.wait_timeout = float(os.getenv('ROLE_CATALOGUE_WAIT_TIMEOUT', 120))
+        self.warm_on_start = os.getenv('ROLE_CATALOGUE_WARM_ON_START', 'False').lower() == 'true'
+        self.warm_interval = float(os.getenv('ROLE_CATALOGUE_WARM_INTERVAL', 0))  # Seconds; 0 disables
+        self.warm_event_types = [event_type.strip() for event_type in
+                                 os.getenv('ROLE_CATALOGUE_WARM_EVENT_TYPES', DEFAULT_EVENT_TYPES).split(',')
+                                 if event_type.strip()]
+        self.warm_top_keys = int(os.getenv('ROLE_CATALOGUE_WARM_TOP_KEYS', 50))
+        # key -> {"roles": [...], "updated_at": epoch seconds}, least recently used first
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._requests: Counter = Counter()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._executor = ThreadPoolExecutor(max_workers=int(os.getenv('ROLE_CATALOGUE_WORKERS', 2)),
+                                            thread_name_prefix="role-catalogue")
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self._load()
+    
+    @staticmethod
+    def key(event_type: Any, team_size: Any, event_scale: Any) -> str:
+        """Catalogue key: normalized event type, team-size bucket and event scale."""
+        normalized_type = " ".join(str(event_type or 'general').lower().split())[:64] or 'general'
+        normalized_scale = " ".join(str(event_scale or 'medium').lower().split())[:16] or 'medium'
+        return f"{normalized_type}|{team_size_bucket(team_size)}|{normalized_scale}"
+    
+    @staticmethod
+    def parse_key(key: str) -> Tuple[str, int, str]:
+        """Inverse of key(): (event_type, team_size, event_scale) to generate the entry with."""
+        event_type, bucket, event_scale = key.rsplit('|', 2)
+        return event_type, int(bucket), event_scale
+    
+    def get(self, event_type: Any, team_size: Any, event_scale: Any) -> Optional[List[Dict[str, Any]]]:
+        """Return cached roles, refreshing a stale entry in the background, or None on a miss."""
+        if not self.enabled:
+            return None
+        
+        key = self.key(event_type, team_size, event_scale)
+        with self._lock:
+            self._requests[key] += 1
+            if len(self._requests) > 4 * self.max_entries:
+                # Event types are free text; keep request counts only for the popular keys
+                self._requests = Counter(dict(self._requests.most_common(self.max_entries)))
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            stale = time.time() - entry["updated_at"] > self.ttl_seconds
+            if stale:
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+        if stale:
+            self.refresh(key)
+        return entry["roles"]
+    
+    def get_or_generate(self, event_type: Any, team_size: Any, event_scale: Any,
+                        priority: str = "interactive") -> Tuple[List[Dict[str, Any]], bool]:
+        """Return (roles, from_catalogue), generating and storing the entry on a miss."""
+        if not self.enabled:
+            return self.generate(event_type, team_size, event_scale, priority), False
+        roles = self.get(event_type, team_size, event_scale)
+        if roles is not None:
+            return roles, True
+        
+        key = self.key(event_type, team_size, event_scale)
+        try:
+            return self._flight.do(key, lambda: self._fill(key, priority), timeout=self.wait_timeout), False
+        except TimeoutError:
+            raise LLMWaitTimeout("Role suggestions are taking longer than usual, please retry shortly",
+                                 WAIT_TIMEOUT_RETRY_AFTER) from None
+    
+    def put(self, event_type: Any, team_size: Any, event_scale: Any, roles: List[Dict[str, Any]]) -> None:
+        """Store roles generated outside the catalogue (e.g. by an async route)."""
+        if self.enabled:
+            self._store(self.key(event_type, team_size, event_scale), roles)
+    
+    def refresh(self, key: str) -> bool:
+        """Regenerate an entry in the background unless a refresh is already running. Returns True if queued."""
+        if self.generate is None:
+            return False
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+        self._executor.submit(self._refresh, key)
+        return True
+    
+    def warm(self, keys: Optional[Iterable[str]] = None) -> int:
+        """Queue background fills for missing or stale keys (default: warm_keys()). Returns the number queued."""
+        if not self.enabled:
+            return 0
+        now = time.time()
+        queued = 0
+        for key in (keys if keys is not None else self.warm_keys()):
+            with self._lock:
+                entry = self._entries.get(key)
+                fresh = entry is not None and now - entry["updated_at"] <= self.ttl_seconds
+            if not fresh and self.refresh(key):
+                queued += 1
+        return queued
+    
+    def warm_keys(self) -> List[str]:
+        """Configured event types at every size bucket and scale, then the most requested keys."""
+        keys = [self.key(event_type, bucket, scale) for event_type in self.warm_event_types
+                for bucket in TEAM_SIZE_BUCKETS for scale in EVENT_SCALES]
+        with self._lock:
+            popular = [key for key, _ in self._requests.most_common(self.warm_top_keys)]
+        return list(dict.fromkeys(keys + popular))
+    
+    def start(self) -> None:
+        """Start warming at startup and/or on an interval, if configured."""
+        if not self.enabled or not (self.warm_on_start or self.warm_interval > 0):
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="role-catalogue-warmer", daemon=True)
+        self._thread.start()
+    
+    def stop(self) -> None:
+        """Stop the warmer and background refreshes."""
+        self._stop.set()
+        self._executor.shutdown(wait=False)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Report catalogue size, hit counters and refresh activity."""
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "refreshing": len(self._refreshing),
+                "refreshes": self.refreshes,
+                "refresh_failures": self.refresh_failures,
+                "hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0
+            }
+    
+    def _run(self) -> None:
+        if self.warm_on_start:
+            logger.info(f"Warming role catalogue: {self.warm()} entries queued")
+        while self.warm_interval > 0 and not self._stop.wait(self.warm_interval):
+            try:
+                queued = self.warm()
+                if queued:
+                    logger.info(f"Refreshing role catalogue: {queued} entries queued")
+            except Exception as e:
+                logger.error(f"Role catalogue warmer error: {e}")
+    
+    def _fill(self, key: str, priority: str) -> List[Dict[str, Any]]:
+        event_type, team_size, event_scale = self.parse_key(key)
+        roles = self.generate(event_type, team_size, event_scale, priority)
+        self._store(key, roles)
+        return roles
+    
+    def _refresh(self, key: str) -> None:
+        try:
+            # Background work runs at the lowest priority so it never delays live requests
+            self._fill(key, "batch")
+            with self._lock:
+                self.refreshes += 1
+        except Exception as e:
+            logger.warning(f"Failed to refresh role suggestions for {key}: {e}")
+            with self._lock:
+                self.refresh_failures += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+    
+    def _store(self, key: str, roles: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._entries[key] = {"roles": roles, "updated_at": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._save()
+    
+    def _load(self) -> None:
+        if not self.enabled or not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            entries = sorted(data.get("entries", {}).items(), key=lambda item: item[1].get("last_used", 0))
+            for key, entry in entries[-self.max_entries:]:
+                self._entries[key] = {"roles": entry["roles"], "updated_at": float(entry["updated_at"])}
+            self._requests.update(data.get("requests", {}))
+            logger.info(f"Loaded {len(self._entries)} role catalogue entries from {self.path}")
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable role catalogue {self.path}: {e}")
+    
+    def _save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            entries = OrderedDict((key, dict(entry)) for key, entry in self._entries.items())
+            requests = dict(self._requests.most_common(self.warm_top_keys))
+        
+        with self._save_lock:
+            tmp_path = f"{self.path}.{os.getpid()}-{threading.get_ident()}.tmp"
+            lock_file = None
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                if fcntl is not None:
+                    # Serializes read-merge-replace across worker processes sharing the file
+                    lock_file = open(f"{self.path}.lock", 'a')
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                data = self._merge_with_disk(entries, requests)
+                with open(tmp_path, 'w', encoding='utf-8') as file:
+                    json.dump(data, file, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning(f"Failed to save role catalogue: {e}")
+            finally:
+                if lock_file is not None:
+                    lock_file.close()  # Releases the flock
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+    
+    def _merge_with_disk(self, entries: "OrderedDict[str, Dict[str, Any]]",
+                         requests: Dict[str, int]) -> Dict[str, Any]:
+        """Combine this process's entries with the file's, keeping the newer entry per key."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                on_disk = json.load(file)
+        except (OSError, ValueError):
+            on_disk = {}
+        disk_entries = sorted(on_disk.get("entries", {}).items(), key=lambda item: item[1].get("last_used", 0))
+        
+        # Entries only another worker has rank as least recently used here
+        merged: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        for key, entry in disk_entries:
+            if key not in entries:
+                merged[key] = {"roles": entry["roles"], "updated_at": float(entry["updated_at"])}
+        for key, entry in entries.items():
+            disk_entry = on_disk.get("entries", {}).get(key)
+            if disk_entry is not None and float(disk_entry["updated_at"]) > entry["updated_at"]:
+                entry = {"roles": disk_entry["roles"], "updated_at": float(disk_entry["updated_at"])}
+            merged[key] = entry
+        while len(merged) > self.max_entries:
+            merged.popitem(last=False)
+        
+        merged_requests = Counter(on_disk.get("requests", {}))
+        for key, count in requests.items():
+            merged_requests[key] = max(merged_requests[key], count)
+        # Position in the LRU order survives restarts as a last_used rank
+        return {
+            "entries": {key: {**entry, "last_used": rank} for rank, (key, entry) in enumerate(merged.items())},
+            "requests": dict(merged_requests.most_common(self.warm_top_keys))
+        }
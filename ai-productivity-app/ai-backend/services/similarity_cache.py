@@ -0,0 +1,203 @@
+import os
+import re
+import json
+import math
+import time
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+", re.UNICODE)
+
+# Function words carry no meaning for "is this the same question"
+STOP_WORDS = frozenset("""
+a an and are as at be by can could do does for from how i in is it me my of on or our please
+should so the this to we what when where which who why will with would you your
+""".split())
+
+MAX_CANDIDATES = 32  # Entries fully scored per lookup
+
+class SimilarityCache:
+    """Answer cache that matches near-duplicate questions by TF-IDF cosine similarity.
+
+    Entries are partitioned by scope (event type, AI context and any
+    conversation context in the prompt), and only questions in the same
+    scope are compared. Each scope keeps an inverted index; a lookup fully
+    scores only the few entries sharing the most words with the question. IDF weights come from the scope's own entries. Size
+    is bounded by LRU eviction across all scopes, and each entry has a TTL.
+    """
+
+    def __init__(self, threshold: Optional[float] = None, ttl_seconds: Optional[int] = None,
+                 max_entries: Optional[int] = None):
+        self.threshold = threshold if threshold is not None else float(os.getenv('CHAT_SIMILARITY_THRESHOLD', 0.8))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.getenv('CHAT_SIMILARITY_CACHE_TTL', 3600))
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('CHAT_SIMILARITY_CACHE_MAX_ENTRIES', 1024))
+        self.enabled = os.getenv('CHAT_SIMILARITY_CACHE_ENABLED', 'False').lower() == 'true'
+        # entry id -> (scope, term counts, value, expires_at), oldest first
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        # scope -> term -> entry ids containing the term
+        self._postings: Dict[str, Dict[str, Set[int]]] = {}
+        self._scope_sizes: Counter = Counter()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    @staticmethod
+    def make_scope(event_type: str, ai_context: Any, conversation: str = "") -> str:
+        """Build a scope key from the event type, the normalized AI context and any conversation context.
+
+        conversation is whatever earlier turns or history the prompt carries;
+        questions asked with none share a scope across conversations.
+        """
+        context = json.dumps(ai_context or {}, sort_keys=True, ensure_ascii=False, default=str)
+        normalized = "\x1f".join((" ".join(str(event_type).lower().split()), " ".join(context.split()), conversation))
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def terms(text: str) -> Counter:
+        """Return word and character-trigram counts of a question, without stop words."""
+        counts = Counter()
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            if token in STOP_WORDS:
+                continue
+            counts[token] += 1
+            # Trigrams let "need"/"needed" and "fest"/"festival" partially match
+            padded = f" {token} "
+            for start in range(len(padded) - 2):
+                counts["#" + padded[start:start + 3]] += 1
+        return counts
+    
+    def get(self, scope: str, text: str) -> Optional[Tuple[Any, float]]:
+        """Return (value, similarity) for the closest cached question at or above the threshold."""
+        if not self.enabled:
+            return None
+        
+        query = self.terms(text)
+        if not query:
+            return None
+        
+        now = time.time()
+        with self._lock:
+            best_id, best_score = self._best_match(scope, query, now)
+            if best_id is None or best_score < self.threshold:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id][2], best_score
+    
+    def set(self, scope: str, text: str, value: Any) -> None:
+        """Cache the answer to a question, replacing an entry with the same terms."""
+        if not self.enabled:
+            return
+        
+        counts = self.terms(text)
+        if not counts:
+            return
+        
+        with self._lock:
+            postings = self._postings.setdefault(scope, {})
+            first_term = next(iter(counts))
+            for entry_id in list(postings.get(first_term, ())):
+                if self._entries[entry_id][1] == counts:
+                    self._remove(entry_id)
+            
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (scope, counts, value, time.time() + self.ttl_seconds)
+            self._scope_sizes[scope] += 1
+            postings = self._postings.setdefault(scope, {})
+            for term in counts:
+                postings.setdefault(term, set()).add(entry_id)
+            
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+    
+    def clear(self) -> None:
+        """Drop every cached answer."""
+        with self._lock:
+            self._entries.clear()
+            self._postings.clear()
+            self._scope_sizes.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "scopes": len(self._postings),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+    
+    def _best_match(self, scope: str, query: Counter, now: float) -> Tuple[Optional[int], float]:
+        postings = self._postings.get(scope)
+        if not postings:
+            return None, 0.0
+        
+        # Score only the entries sharing the most whole words with the question;
+        # trigram postings are too broad to prune with
+        overlap = Counter()
+        for term in query:
+            if not term.startswith("#"):
+                overlap.update(postings.get(term, ()))
+        
+        candidates = []
+        for entry_id, _ in overlap.most_common(MAX_CANDIDATES):
+            if self._entries[entry_id][3] <= now:
+                self._remove(entry_id)
+                self.expirations += 1
+            else:
+                candidates.append(entry_id)
+        if not candidates:
+            return None, 0.0
+        postings = self._postings.get(scope, {})
+        
+        # Smoothed IDF over this scope's entries, computed at query time as entries come and go
+        size = self._scope_sizes[scope]
+        idf = {}
+        
+        def weight(term: str, count: int) -> float:
+            if term not in idf:
+                idf[term] = math.log((1 + size) / (1 + len(postings.get(term, ())))) + 1
+            return count * idf[term]
+        
+        query_weights = {term: weight(term, count) for term, count in query.items()}
+        query_norm = math.sqrt(sum(value * value for value in query_weights.values()))
+        
+        best_id, best_score = None, 0.0
+        for entry_id in candidates:
+            counts = self._entries[entry_id][1]
+            entry_weights = {term: weight(term, count) for term, count in counts.items()}
+            entry_norm = math.sqrt(sum(value * value for value in entry_weights.values()))
+            dot = sum(value * entry_weights.get(term, 0.0) for term, value in query_weights.items())
+            score = dot / (query_norm * entry_norm)
+            if score > best_score:
+                best_id, best_score = entry_id, score
+        return best_id, best_score
+    
+    def _remove(self, entry_id: int) -> None:
+        scope, counts, _, _ = self._entries.pop(entry_id)
+        postings = self._postings[scope]
+        for term in counts:
+            ids = postings.get(term)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del postings[term]
+        self._scope_sizes[scope] -= 1
+        if self._scope_sizes[scope] <= 0:
+            del self._scope_sizes[scope]
+            del self._postings[scope]
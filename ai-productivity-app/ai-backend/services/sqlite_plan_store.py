@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+from services.plan_store import PlanStore
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plans (
+    plan_id TEXT PRIMARY KEY,
+    channel_id TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_plans_channel_id ON plans (channel_id, created_at DESC);
+"""
+
+# Parameterized statements are compiled once per connection and reused from
+# sqlite3's statement cache.
+UPSERT_PLAN = """
+INSERT INTO plans (plan_id, channel_id, created_at, updated_at, version, data) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(plan_id) DO UPDATE SET channel_id = excluded.channel_id,
+    updated_at = excluded.updated_at, version = excluded.version, data = excluded.data
+"""
+# Compare-and-set: the row changes only if no other worker has saved a newer version
+UPDATE_PLAN_IF_VERSION = "UPDATE plans SET updated_at = ?, version = ?, data = ? WHERE plan_id = ? AND version = ?"
+INSERT_PLAN_IF_ABSENT = """
+INSERT INTO plans (plan_id, channel_id, created_at, updated_at, version, data) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(plan_id) DO NOTHING
+"""
+SELECT_PLAN = "SELECT data FROM plans WHERE plan_id = ?"
+SELECT_CHANNEL_PLANS = "SELECT data FROM plans WHERE channel_id = ? ORDER BY created_at DESC LIMIT ?"
+DELETE_PLAN = "DELETE FROM plans WHERE plan_id = ?"
+COUNT_PLANS = "SELECT COUNT(*) FROM plans"
+
+class SQLitePlanStore:
+    """Plan store shared by all worker processes through a local SQLite database in WAL mode.
+
+    Each process keeps a small in-memory PlanStore as a read cache in front of
+    the database, so hot plans are served without touching SQLite.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, read_cache: Optional[PlanStore] = None):
+        self.db_path = db_path or os.getenv('PLAN_STORE_SQLITE_PATH', os.path.join('data', 'plans.db'))
+        self.read_cache = read_cache if read_cache is not None else PlanStore(
+            max_bytes=int(os.getenv('PLAN_STORE_CACHE_BYTES', 8 * 1024 * 1024)),
+            ttl_seconds=int(os.getenv('PLAN_STORE_CACHE_TTL', 300))
+        )
+        self._local = threading.local()
+        self.cache_hits = 0
+        self.db_reads = 0
+        
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        if "version" not in {row[1] for row in conn.execute("PRAGMA table_info(plans)")}:
+            try:
+                conn.execute("ALTER TABLE plans ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+            except sqlite3.OperationalError:
+                pass  # Another worker added it first
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, reopening it after a fork."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10, cached_statements=32)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+    
+    def put(self, plan_id: str, plan_data: Dict[str, Any]) -> None:
+        """Store (or replace) a plan."""
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute(UPSERT_PLAN, (plan_id, plan_data.get('channel_id'), now, now, int(plan_data.get('version', 1)),
+                                       self._encode(plan_data)))
+        self.read_cache.put(plan_id, plan_data)
+    
+    def put_if_version(self, plan_id: str, plan_data: Dict[str, Any], expected_version: int) -> bool:
+        """Replace a plan only if the stored copy is still at expected_version (or is gone).
+
+        Returns False if another worker saved a different version first; the
+        read cache is then dropped so the next read sees that version.
+        """
+        now = time.time()
+        version = int(plan_data.get('version', 1))
+        blob = self._encode(plan_data)
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(UPDATE_PLAN_IF_VERSION, (now, version, blob, plan_id, expected_version))
+            if cursor.rowcount == 0:
+                cursor = conn.execute(INSERT_PLAN_IF_ABSENT, (plan_id, plan_data.get('channel_id'), now, now, version, blob))
+        if cursor.rowcount == 0:
+            self.read_cache.delete(plan_id)
+            return False
+        self.read_cache.put(plan_id, plan_data)
+        return True
+    
+    def get(self, plan_id: str, fresh: bool = False) -> Optional[Dict[str, Any]]:
+        """Return a plan by ID, or None if no worker has stored it.
+
+        Other workers' writes reach the read cache only when it expires;
+        fresh=True reads the database and refreshes the cached copy.
+        """
+        plan_data = None if fresh else self.read_cache.get(plan_id)
+        if plan_data is not None:
+            self.cache_hits += 1
+            return plan_data
+        
+        self.db_reads += 1
+        try:
+            row = self._connection().execute(SELECT_PLAN, (plan_id,)).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to read plan {plan_id} from SQLite: {e}")
+            return None
+        if row is None:
+            self.read_cache.delete(plan_id)
+            return None
+        
+        plan_data = json.loads(zlib.decompress(row[0]).decode('utf-8'))
+        self.read_cache.put(plan_id, plan_data)
+        return plan_data
+    
+    @staticmethod
+    def _encode(plan_data: Dict[str, Any]) -> bytes:
+        return zlib.compress(json.dumps(plan_data, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8'))
+    
+    def get_channel_plans(self, channel_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Return the most recent plans for a channel."""
+        rows = self._connection().execute(SELECT_CHANNEL_PLANS, (channel_id, limit)).fetchall()
+        return [json.loads(zlib.decompress(row[0]).decode('utf-8')) for row in rows]
+    
+    def delete(self, plan_id: str) -> bool:
+        """Remove a plan. Returns True if it was present."""
+        self.read_cache.delete(plan_id)
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(DELETE_PLAN, (plan_id,))
+        return cursor.rowcount > 0
+    
+    def __contains__(self, plan_id: str) -> bool:
+        return self.get(plan_id) is not None
+    
+    def __len__(self) -> int:
+        return self._connection().execute(COUNT_PLANS).fetchone()[0]
+    
+    def stats(self) -> Dict[str, Any]:
+        """Report entry counts, database size and read-cache effectiveness."""
+        try:
+            db_bytes = os.path.getsize(self.db_path)
+        except OSError:
+            db_bytes = 0
+        return {
+            "backend": "sqlite",
+            "entries": len(self),
+            "db_path": self.db_path,
+            "db_bytes": db_bytes,
+            "cache_hits": self.cache_hits,
+            "db_reads": self.db_reads,
+            "read_cache": self.read_cache.stats()
+        }
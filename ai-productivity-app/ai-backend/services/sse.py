@@ -0,0 +1,27 @@
+import json
+from typing import Any, Optional
+
+
+def sse_event(data: Any, event: Optional[str] = None) -> str:
+    """Format a payload as a single Server-Sent Events frame."""
+    frame = ""
+    if event:
+        frame += f"event: {event}\n"
+    payload = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+    for line in payload.splitlines() or [""]:
+        frame += f"data: {line}\n"
+    return frame + "\n"
+
+
+def wants_stream(req, data: Optional[dict] = None) -> bool:
+    """Return True when the client asked for a streamed (SSE) response."""
+    flag = req.args.get('stream', '')
+    if not flag and data:
+        flag = str(data.get('stream', ''))
+    return flag.lower() in ('1', 'true', 'yes')
+
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
@@ -0,0 +1,126 @@
+"""Delivery and retry tests for the notification outbox against the stub Node.js server.
+
+Run from ai-backend/:
+    python -m pytest tests
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_node_server import start_stub_server
+from services.outbox import NotificationOutbox
+
+
+class OutboxDeliveryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def make_outbox(self, server, **kwargs) -> NotificationOutbox:
+        outbox = NotificationOutbox(base_url=server.url, db_path=os.path.join(self.tmp.name, 'outbox.db'),
+                                    timeout=2, **kwargs)
+        outbox.base_backoff = 0.0  # Retry on the next pass
+        self.addCleanup(outbox.stop)
+        self.addCleanup(server.shutdown)
+        return outbox
+
+    def enqueue(self, outbox: NotificationOutbox, count: int) -> None:
+        # Queue without waking the background worker, so each test drives delivery itself
+        conn = outbox._connection()
+        for n in range(count):
+            now = time.time()
+            with conn:
+                conn.execute("INSERT INTO outbox (path, payload, enqueued_at, idempotency_key, next_attempt_at) "
+                             "VALUES (?, ?, ?, ?, ?)", ('/api/ai/store-plan', f'{{"plan_id": "{n}"}}', now, f'key-{n}', now))
+
+    def test_delivers_and_drains_queue(self):
+        server = start_stub_server()
+        outbox = self.make_outbox(server)
+        self.enqueue(outbox, 3)
+
+        self.assertEqual(outbox.flush(), 3)
+        self.assertEqual(server.received, 3)
+        self.assertEqual(server.keys, {'key-0', 'key-1', 'key-2'})
+        self.assertEqual(outbox.stats()["queue_depth"], 0)
+
+    def test_retries_server_errors_with_the_same_key(self):
+        server = start_stub_server(fail_first=2)
+        outbox = self.make_outbox(server)
+        self.enqueue(outbox, 1)
+
+        self.assertEqual(outbox.flush(), 0)
+        self.assertEqual(outbox.flush(), 0)
+        self.assertEqual(outbox.flush(), 1)
+        self.assertEqual(server.received, 1)
+        self.assertEqual(server.keys, {'key-0'})
+        stats = outbox.stats()
+        self.assertEqual(stats["failed_attempts"], 2)
+        self.assertEqual(stats["queue_depth"], 0)
+
+    def test_drops_after_max_attempts(self):
+        server = start_stub_server(status=503)
+        outbox = self.make_outbox(server, max_attempts=2)
+        self.enqueue(outbox, 1)
+
+        outbox.flush()
+        outbox.flush()
+        stats = outbox.stats()
+        self.assertEqual(stats["dropped"], 1)
+        self.assertEqual(stats["queue_depth"], 0)
+
+    def test_lease_covers_the_whole_batch(self):
+        server = start_stub_server()
+        outbox = self.make_outbox(server, batch_size=20)
+        self.enqueue(outbox, 20)
+
+        claimed_at = time.time()
+        rows = outbox._claim_due(outbox._connection())
+        self.assertEqual(len(rows), 20)
+        lease = outbox._connection().execute("SELECT MIN(next_attempt_at) FROM outbox").fetchone()[0]
+        self.assertGreaterEqual(lease - claimed_at, 20 * outbox.timeout)
+        self.assertEqual(outbox._claim_due(outbox._connection()), [])
+
+    def test_redelivery_after_expired_lease_is_deduplicated(self):
+        server = start_stub_server()
+        outbox = self.make_outbox(server)
+        self.enqueue(outbox, 1)
+
+        # Another worker claims the row, posts it, and stalls past its lease before deleting it
+        conn = outbox._connection()
+        _, path, payload, _, _, key = outbox._claim_due(conn)[0]
+        self.assertTrue(outbox._post(path, payload, key))
+        with conn:
+            conn.execute("UPDATE outbox SET next_attempt_at = ?", (time.time(),))
+
+        self.assertEqual(outbox.flush(), 1)
+        self.assertEqual(server.received, 1)
+        self.assertEqual(server.duplicates, 1)
+
+    def test_async_delivery(self):
+        server = start_stub_server(fail_first=1)
+        outbox = self.make_outbox(server)
+        self.enqueue(outbox, 4)
+
+        async def deliver():
+            import httpx
+
+            async with httpx.AsyncClient(timeout=outbox.timeout) as client:
+                first = await outbox._adeliver_batch(client)
+                second = await outbox._adeliver_batch(client)
+            return first, second
+
+        first, second = asyncio.run(deliver())
+        self.assertEqual(first, (3, 4))
+        self.assertEqual(second, (1, 1))
+        self.assertEqual(server.received, 4)
+        self.assertEqual(server.duplicates, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -29,7 +29,8 @@ const messageSchema = new mongoose.Schema({
       ref: 'Task'
     },
     actionType: String,
-    aiContext: Object
+    aiContext: Object,
+    idempotencyKey: String
   },
   reactions: [{
     user: {
@@ -52,4 +53,7 @@ const messageSchema = new mongoose.Schema({
   timestamps: true
 });
 
+// Retried deliveries from the Python backend's outbox reuse their key
+messageSchema.index({ 'metadata.idempotencyKey': 1 }, { unique: true, sparse: true });
+
 export default mongoose.model('Message', messageSchema);
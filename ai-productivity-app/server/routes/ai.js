@@ -154,6 +154,7 @@ router.post('/task-suggestions', auth.verifyToken, async (req, res) => {
 router.post('/store-plan', async (req, res) => {
   try {
     const planData = req.body;
+    const idempotencyKey = req.get('Idempotency-Key');
     
     // Create AI message in the channel
     if (planData.channel_id) {
@@ -167,11 +168,17 @@ router.post('/store-plan', async (req, res) => {
             type: 'action-plan', 
             planId: planData.plan_id,
             userRequest: planData.user_request
-          }
+          },
+          idempotencyKey
         }
       });
 
-      await aiMessage.save();
+      try {
+        await aiMessage.save();
+      } catch (error) {
+        // A redelivery of a message we already stored
+        if (error.code !== 11000 || !idempotencyKey) throw error;
+      }
     }
     
     res.json({ success: true, message: 'Plan stored successfully' });